@@ -1,14 +1,16 @@
 from flask import render_template, request, Flask, Blueprint
-import joblib
-import pickle
 import numpy as np
 import os
+from startup import resource
 
 alzhimer_bp = Blueprint('alzhimer', __name__, 
                        template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
-# Load the trained Alzheimer's model
-model = joblib.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alz.pkl'))
+# Load the trained Alzheimer's model (lazily, see startup.py)
+@resource('alzhimer.model')
+def model():
+    import joblib
+    return joblib.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alz.pkl'))
 
 @alzhimer_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -37,7 +39,7 @@ def index():
             features_array = np.array(features).reshape(1, -1)
             
             # Make prediction
-            prediction = model.predict(features_array)[0]
+            prediction = model.get().predict(features_array)[0]
             prediction = 'High Risk of Alzheimer\'s' if prediction == 1 else 'Low Risk of Alzheimer\'s'
         
         except KeyError as e:
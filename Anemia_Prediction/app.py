@@ -1,17 +1,23 @@
 from flask import render_template, request, Blueprint
-import joblib
 import numpy as np
 import os
+from startup import resource
 
 # Setup blueprint
 anemia_bp = Blueprint('anemia', __name__, 
                       template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
-# Load model, scaler, encoder
+# Load model, scaler, encoder (lazily, see startup.py)
 model_path = os.path.dirname(os.path.abspath(__file__))
-model = joblib.load(os.path.join(model_path, 'models/anemia_model.pkl'))
-scaler = joblib.load(os.path.join(model_path, 'models/anemia_scaler.pkl'))
-label_encoder = joblib.load(os.path.join(model_path, 'models/anemia_label_encoder.pkl'))
+
+@resource('anemia.model')
+def artifacts():
+    import joblib
+    return {
+        'model': joblib.load(os.path.join(model_path, 'models/anemia_model.pkl')),
+        'scaler': joblib.load(os.path.join(model_path, 'models/anemia_scaler.pkl')),
+        'label_encoder': joblib.load(os.path.join(model_path, 'models/anemia_label_encoder.pkl'))
+    }
 
 @anemia_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -30,11 +36,12 @@ def index():
 
             # Combine features
             features = np.array([[gender_encoded, hemoglobin, mchc, mcv, mch]])
-            features_scaled = scaler.transform(features)
+            loaded = artifacts.get()
+            features_scaled = loaded['scaler'].transform(features)
 
             # Predict
-            result_encoded = model.predict(features_scaled)[0]
-            label = label_encoder.inverse_transform([result_encoded])[0]
+            result_encoded = loaded['model'].predict(features_scaled)[0]
+            label = loaded['label_encoder'].inverse_transform([result_encoded])[0]
             prediction = "High Risk of Anemia" if label.lower() == 'anemia' else "Normal"
 
         except KeyError as e:
@@ -2,14 +2,18 @@ from flask import render_template, request, Blueprint
 import pickle
 import numpy as np
 import os
+from startup import resource
 
 asthma_bp = Blueprint('asthma', __name__, 
                       template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
-# Load the trained model
+# Load the trained model (lazily, see startup.py)
 model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asthma_model.pkl')
-with open(model_path, 'rb') as file:
-    model = pickle.load(file)
+
+@resource('asthma.model')
+def model():
+    with open(model_path, 'rb') as file:
+        return pickle.load(file)
 
 @asthma_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -36,7 +40,7 @@ def index():
 
             # Predict
             features_array = np.array(features).reshape(1, -1)
-            result = model.predict(features_array)[0]
+            result = model.get().predict(features_array)[0]
             prediction = 'High Risk of Asthma' if result == 1 else 'Low Risk of Asthma'
 
         except KeyError as e:
@@ -2,13 +2,16 @@ from flask import render_template, request, Blueprint
 import pickle
 import numpy as np
 import os
+from startup import resource
 
 heart_bp = Blueprint('heart', __name__, 
                     template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
-# Load the trained heart disease model
-with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model.pkl'), 'rb') as file:
-    model = pickle.load(file)
+# Load the trained heart disease model (lazily, see startup.py)
+@resource('heart.model')
+def model():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model.pkl'), 'rb') as file:
+        return pickle.load(file)
 
 @heart_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -36,7 +39,7 @@ def index():
             features_array = np.array(features).reshape(1, -1)
             
             # Make prediction
-            prediction = model.predict(features_array)[0]
+            prediction = model.get().predict(features_array)[0]
             prediction = 'High Risk of Heart Disease' if prediction == 1 else 'Low Risk of Heart Disease'
         except KeyError as e:
             prediction = f"Error: Missing required field - {str(e)}"
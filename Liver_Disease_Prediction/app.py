@@ -2,16 +2,20 @@ from flask import render_template, request, Blueprint
 import pickle
 import numpy as np
 import os
+from startup import resource
 
 liver_bp = Blueprint('liver', __name__, 
                     template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
-# Load the trained liver disease model and scaler
-with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model3.pkl'), 'rb') as file:
-    model = pickle.load(file)
-    
-with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scaler.pkl'), 'rb') as file:
-    scaler = pickle.load(file)
+# Load the trained liver disease model and scaler (lazily, see startup.py)
+@resource('liver.model')
+def artifacts():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model3.pkl'), 'rb') as file:
+        model = pickle.load(file)
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scaler.pkl'), 'rb') as file:
+        scaler = pickle.load(file)
+    return model, scaler
 
 @liver_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -34,6 +38,7 @@ def index():
             
             # Convert to NumPy array, reshape and scale
             features_array = np.array(features).reshape(1, -1)
+            model, scaler = artifacts.get()
             features_scaled = scaler.transform(features_array)
             
             # Make prediction (model outputs 1 for disease, 0 for no disease)
@@ -1,19 +1,24 @@
 from flask import render_template, request, Blueprint
-import joblib
 import numpy as np
 import os
+from startup import resource
 
 # Define the PCOS blueprint
 pcos_bp = Blueprint('pcos', __name__,
                     template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
-# Load the trained model and scaler
+# Load the trained model and scaler (lazily, see startup.py)
 model_path = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(model_path, 'pcos_model.pkl'), 'rb') as file:
-    model = joblib.load(file)
 
-with open(os.path.join(model_path, 'pcos_scaler.pkl'), 'rb') as file:
-    scaler = joblib.load(file)
+@resource('pcos.model')
+def artifacts():
+    import joblib
+    with open(os.path.join(model_path, 'pcos_model.pkl'), 'rb') as file:
+        model = joblib.load(file)
+
+    with open(os.path.join(model_path, 'pcos_scaler.pkl'), 'rb') as file:
+        scaler = joblib.load(file)
+    return model, scaler
 
 @pcos_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -30,6 +35,7 @@ def index():
             ]
 
             # Scale features
+            model, scaler = artifacts.get()
             scaled_features = scaler.transform([features])
 
             # Predict
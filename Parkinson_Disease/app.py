@@ -2,9 +2,7 @@ from flask import render_template, request, Blueprint
 import pickle
 import numpy as np
 import os
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
+from startup import resource
 
 parkinsons_bp = Blueprint('parkinsons', __name__, 
                          template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
@@ -27,11 +25,14 @@ required_features = [
 model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model1.pkl')
 scaler_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scaler.pkl')
 
-with open(model_path, 'rb') as file:
-    model = pickle.load(file)
+@resource('parkinsons.model')
+def artifacts():
+    with open(model_path, 'rb') as file:
+        model = pickle.load(file)
 
-with open(scaler_path, 'rb') as file:
-    scaler = pickle.load(file)
+    with open(scaler_path, 'rb') as file:
+        scaler = pickle.load(file)
+    return model, scaler
 
 @parkinsons_bp.route('/', methods=['GET', 'POST'])
 def index():
@@ -62,6 +63,7 @@ def index():
             
             # Create feature array and apply scaling
             features_array = np.array(features).reshape(1, -1)
+            model, scaler = artifacts.get()
             features_scaled = scaler.transform(features_array)
             
             # Make prediction
@@ -1,12 +1,25 @@
 from flask import render_template, request, Blueprint
-import joblib
 import os
 import numpy as np
 import pickle
+from startup import resource
 
 stroke_bp = Blueprint('stroke', __name__, 
                      template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
 
+# Load scaler and model once (lazily, see startup.py) instead of on every request
+@resource('stroke.model')
+def artifacts():
+    import joblib
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    scaler_path = os.path.join(current_dir, 'models', 'scaler.pkl')
+    model_path = os.path.join(current_dir, 'models', 'dt.sav')
+
+    with open(scaler_path, 'rb') as scaler_file:
+        scaler = pickle.load(scaler_file)
+    model = joblib.load(model_path)
+    return model, scaler
+
 @stroke_bp.route("/")
 def index():
     return render_template("risk.html")
@@ -32,18 +45,9 @@ def result():
             work_type, Residence_type, avg_glucose_level, bmi, smoking_status
         ]).reshape(1, -1)
 
-        # Load scaler and model using relative paths
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        scaler_path = os.path.join(current_dir, 'models', 'scaler.pkl')
-        model_path = os.path.join(current_dir, 'models', 'dt.sav')
-
-        # Load and apply scaler
-        with open(scaler_path, 'rb') as scaler_file:
-            scaler = pickle.load(scaler_file)
+        # Apply scaler and model
+        model, scaler = artifacts.get()
         features_scaled = scaler.transform(features)
-
-        # Load and apply model
-        model = joblib.load(model_path)
         prediction = model.predict(features_scaled)[0]
 
         # Return appropriate template based on prediction
@@ -1,9 +1,8 @@
 from flask import Flask, request, jsonify, render_template, redirect, url_for, make_response
 import json
 import pickle
-import pandas as pd
 from collections import Counter
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, create_access_token, unset_jwt_cookies
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, unset_jwt_cookies
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from models import db, User
 from routes.users import users
@@ -11,14 +10,31 @@ from routes.doctors import doctors
 from routes.chatbot import chatbot
 from auth import auth
 from extensions import db, migrate, bcrypt
+from startup import resource
+import startup
+import jobs
+import unit_of_work
+import conversation_cache
+import query_plans
+import archive
+import message_entities
+import symptom_trends
+import export
+import doctor_directory
+import availability
+import question_feed
+import consultation_router
+import identity
+import passwords
+import report_pdfs
 
 import os
-import openai
 
 # Initialize Flask App
 app = Flask(__name__, static_folder="static")
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(BASE_DIR, 'database.db')}"
+# Main database; DATABASE_URL points the app (e.g. the tests) at another one
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'database.db')}")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = '165355e390430405826e55bb78d646706a6b66d9749eefd5acd06abb568ddcf7'
 app.config['JWT_SECRET_KEY'] = '165355e390430405826e55bb78d646706a6b66d9749eefd5acd06abb568ddcf7'
@@ -26,55 +42,79 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600  # Token expires in 1 hour
 app.config['JWT_TOKEN_LOCATION'] = ['cookies']  # Store tokens in cookies
 app.config['JWT_COOKIE_CSRF_PROTECT'] = False 
 app.config['JWT_ACCESS_COOKIE_NAME'] = 'access_token'
+# Load the models and NLP resources in the background at startup (STARTUP_WARM_UP=0 turns it off)
+app.config['STARTUP_WARM_UP'] = os.environ.get('STARTUP_WARM_UP', '1').lower() not in ('0', 'false', 'no')
+# Seconds /api/send waits for the LLM before answering with the rule-based fallback (0 disables)
+app.config['CHAT_LLM_DEADLINE'] = float(os.environ.get('CHAT_LLM_DEADLINE', 1.5))
+# Durable queue for post-response work (enrichment, analytics, summaries)
+app.config['JOB_QUEUE_PATH'] = os.environ.get('JOB_QUEUE_PATH', os.path.join(BASE_DIR, 'jobs.db'))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+# Per-process cache of active conversations; context changes are written back every flush interval
+app.config['CONVERSATION_CACHE_SIZE'] = int(os.environ.get('CONVERSATION_CACHE_SIZE', 512))
+app.config['CONVERSATION_CACHE_TTL'] = int(os.environ.get('CONVERSATION_CACHE_TTL', 1800))
+app.config['CONVERSATION_FLUSH_INTERVAL'] = float(os.environ.get('CONVERSATION_FLUSH_INTERVAL', 1.0))
+# Cold storage for idle conversations (`flask archive-chats`)
+app.config['CHAT_ARCHIVE_DIR'] = os.environ.get('CHAT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+app.config['CHAT_ARCHIVE_IDLE_DAYS'] = int(os.environ.get('CHAT_ARCHIVE_IDLE_DAYS', 180))
+# Seconds other processes may show a stale doctor list (this process drops it on every doctor change)
+app.config['DOCTOR_DIRECTORY_TTL'] = int(os.environ.get('DOCTOR_DIRECTORY_TTL', 300))
+# Appointment slot grid: slot length, daily working hours, working weekdays (0 = Monday)
+app.config['APPOINTMENT_SLOT_MINUTES'] = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', 30))
+app.config['APPOINTMENT_HOURS'] = os.environ.get('APPOINTMENT_HOURS', '09:00-17:00')
+app.config['APPOINTMENT_DAYS'] = os.environ.get('APPOINTMENT_DAYS', '0,1,2,3,4,5')
+# Live question feed: relay file shared by the app processes, its poll interval (0 = single process)
+# and how long reconnecting dashboards can replay missed events
+app.config['QUESTION_FEED_PATH'] = os.environ.get('QUESTION_FEED_PATH')
+app.config['QUESTION_FEED_RELAY_INTERVAL'] = float(os.environ.get('QUESTION_FEED_RELAY_INTERVAL', 1.0))
+app.config['QUESTION_FEED_RETENTION'] = int(os.environ.get('QUESTION_FEED_RETENTION', 3600))
+app.config['QUESTION_FEED_KEEPALIVE'] = int(os.environ.get('QUESTION_FEED_KEEPALIVE', 15))
+# Open consultations a doctor is assigned before new ones wait in the queue
+app.config['CONSULTATION_MAX_OPEN'] = int(os.environ.get('CONSULTATION_MAX_OPEN', 10))
+# Seconds a doctor stays in the consultation rotation without any activity, and how often
+# consultations still waiting are routed again and idle doctors expired (0 = never)
+app.config['CONSULTATION_AVAILABILITY_TTL'] = int(os.environ.get('CONSULTATION_AVAILABILITY_TTL', 1800))
+app.config['CONSULTATION_SWEEP_INTERVAL'] = float(os.environ.get('CONSULTATION_SWEEP_INTERVAL', 30))
+# Seconds a signed identity token is trusted before the user is looked up again
+app.config['IDENTITY_TTL'] = int(os.environ.get('IDENTITY_TTL', 300))
+# bcrypt cost for new hashes (older ones are re-hashed at login), the threads hashing passwords,
+# how many operations may wait for them and for how many seconds before a request gets a 503
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+# Rendered medical report PDFs, one file per report version
+app.config['MEDICAL_REPORT_DIR'] = os.environ.get('MEDICAL_REPORT_DIR', os.path.join(BASE_DIR, 'report_cache'))
 
 # Initialize extensions
 db.init_app(app)
 migrate.init_app(app, db)
 bcrypt.init_app(app)
+# Password hashing on its own bounded thread pool
+passwords.init_app(app)
 jwt = JWTManager(app)
+# Per-request database time and query count in a Server-Timing header
+unit_of_work.init_app(app)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Load the saved ML model and related data
-try:
-    with open('model.pkl', 'rb') as f:
-        knn_model = pickle.load(f)
-        cv = pickle.load(f)
-        new_cv = pickle.load(f)
-        df_idf = pickle.load(f)
-        data = pickle.load(f)
-        all_symptoms = pickle.load(f)
-        input_symptoms = pickle.load(f)
-        input_age = pickle.load(f)
-        input_gender = pickle.load(f)
-        top_diseases = pickle.load(f)
-        indices = pickle.load(f)
-        distances = pickle.load(f)
-        k = pickle.load(f)
-        cols = pickle.load(f)
-        df = pickle.load(f)
-        docs = pickle.load(f)
-        word_count_vector = pickle.load(f)
-        tfidf_transformer = pickle.load(f)
-        new_word_count_vector = pickle.load(f)
-        new_tfidf_transformer = pickle.load(f)
-        input_vector = pickle.load(f)
-except Exception as e:
-    print(f"Error loading ML model: {e}")
-
-# Load OpenAI API key from file
-try:
-    with open('openai_api_key.txt', 'r') as f:
-        openai.api_key = f.read().strip()
-except:
-    print("WARNING: OpenAI API key not found or invalid")
+# current_user and the JWT routes' user come from signed claims, not a users query
+identity.init_app(app, login_manager, jwt)
+
+# The saved ML model and related data, in the order they were pickled
+SYMPTOM_MODEL_FIELDS = [
+    'knn_model', 'cv', 'new_cv', 'df_idf', 'data', 'all_symptoms', 'input_symptoms',
+    'input_age', 'input_gender', 'top_diseases', 'indices', 'distances', 'k', 'cols',
+    'df', 'docs', 'word_count_vector', 'tfidf_transformer', 'new_word_count_vector',
+    'new_tfidf_transformer', 'input_vector'
+]
+
+@resource('symptom.model')
+def symptom_model():
+    with open(os.path.join(BASE_DIR, 'model.pkl'), 'rb') as f:
+        return {field: pickle.load(f) for field in SYMPTOM_MODEL_FIELDS}
 
 # Register Blueprints
 app.register_blueprint(auth, url_prefix="/auth")
@@ -82,6 +122,31 @@ app.register_blueprint(users, url_prefix="/users")
 app.register_blueprint(doctors, url_prefix="/doctors")
 app.register_blueprint(chatbot, url_prefix="/api")
 
+# Readiness endpoint, startup report and parallel warm-up of declared resources
+startup.init_app(app)
+
+# Background workers for jobs enqueued by the chat routes
+jobs.init_app(app)
+
+# Write-behind flusher for the conversation state cache
+conversation_cache.init_app(app)
+
+# `flask check-query-plans`: EXPLAIN QUERY PLAN for the hot queries
+query_plans.init_app(app)
+
+# Monthly archive of idle conversations, read back by the history endpoints
+archive.init_app(app)
+
+# `flask backfill-entities`: normalized entity rows for existing messages
+message_entities.init_app(app)
+symptom_trends.init_app(app)
+export.init_app(app)
+doctor_directory.init_app(app)
+availability.init_app(app)
+question_feed.init_app(app)
+consultation_router.init_app(app)
+report_pdfs.init_app(app)
+
 
 @app.route('/')
 def index():
@@ -100,7 +165,9 @@ def login_page():
         
         user = User.query.filter_by(email=email).first()
         if user and user.check_password(password):
-            access_token = create_access_token(identity={'id': user.id, 'role': user.role})
+            if user.rehash_password(password):
+                db.session.commit()
+            access_token = identity.access_token(user)
             
             # Secure Token Storage (HTTP-only cookie)
             response = make_response(redirect(url_for('users.dashboard') if user.role == 'user' else url_for('doctors.doctor_dashboard')))
@@ -128,7 +195,7 @@ def signup_page():
         db.session.add(new_user)
         db.session.commit()
 
-        access_token = create_access_token(identity={'id': new_user.id, 'role': new_user.role})
+        access_token = identity.access_token(new_user)
         response = make_response(redirect(url_for('login_page')))
         response.set_cookie('access_token', access_token, httponly=True)
 
@@ -194,6 +261,10 @@ def predict():
     rejected_symptoms = req_data['rejected_symptoms']
 
     try:
+        model = symptom_model.get()
+        knn_model, cv, tfidf_transformer = model['knn_model'], model['cv'], model['tfidf_transformer']
+        df, cols, data = model['df'], model['cols'], model['data']
+
         k = 5 if len(input_symptoms) < 3 else (3 if len(input_symptoms) < 5 else (2 if len(input_symptoms) < 7 else 1))
 
         docs = []
@@ -221,6 +292,9 @@ def predict():
 
         sorted_symptoms = sorted(Counter(all_symptoms), key=Counter(all_symptoms).get)
 
+        # Symptom trend rollups by age group, updated off the request path
+        symptom_trends.enqueue_prediction(input_age, input_symptoms)
+
         return jsonify({'top_diseases': top_diseases, 'top_symptoms': sorted_symptoms})
 
     except Exception as e:
@@ -271,11 +345,14 @@ if __name__ == "__main__":
                 }
             ]
             
-            for doctor_data in test_doctors:
+            # Hash all seeded passwords in parallel on the password pool
+            hashes = passwords.hasher.hash_many([doctor_data["password"] for doctor_data in test_doctors] + ["password123"])
+
+            for doctor_data, password_hash in zip(test_doctors, hashes):
                 doctor = User(
                     username=doctor_data["username"],
                     email=doctor_data["email"],
-                    password=doctor_data["password"],
+                    password_hash=password_hash,
                     role=doctor_data["role"],
                     specialization=doctor_data["specialization"]
                 )
@@ -285,7 +362,7 @@ if __name__ == "__main__":
             test_patient = User(
                 username="Rahul",
                 email="patient@example.com",
-                password="password123",
+                password_hash=hashes[-1],
                 role="patient"
             )
             
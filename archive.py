@@ -0,0 +1,315 @@
+"""
+Cold storage for idle chat conversations.
+
+Conversations idle for longer than CHAT_ARCHIVE_IDLE_DAYS have their messages
+moved out of the live database into monthly SQLite files under
+CHAT_ARCHIVE_DIR (the month the conversation started in), each message stored
+as zlib-compressed JSON. The Conversation row stays behind as a stub with
+`archived_at` / `archive_path`, and history pages continue into the archive
+once the live messages run out. Legacy chat_history rows older than the
+threshold are archived into the same files.
+
+`flask archive-chats` works in small batches. Each conversation is written
+and committed to its archive file first and only then removed from the live
+database, in one short transaction that is skipped if the conversation saw
+new activity meanwhile. An interrupted run just resumes, and live requests
+never wait on a long write lock.
+"""
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, exists, text, update
+
+from extensions import db
+from models import ChatHistory, ChatMessage, Conversation
+from pagination import decode_cursor, encode_cursor, keyset_page
+
+# Fixed width, so timestamps compare correctly as strings inside the archive
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        conversation_id TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        payload BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_messages_conversation_created ON messages (conversation_id, created_at);
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        payload BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_chat_history_user_created ON chat_history (user_id, created_at);
+"""
+
+
+def _timestamp(value):
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _pack(record):
+    return zlib.compress(json.dumps(record, default=str).encode('utf-8'))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class ArchiveStore:
+    """Directory of monthly archive files"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._local = threading.local()
+
+    def file_for(self, moment):
+        return f"chat-{moment:%Y-%m}.db"
+
+    def _connection(self, name):
+        # sqlite3 connections can't be shared across threads
+        connections = self._local.__dict__.setdefault('connections', {})
+        conn = connections.get(name)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, name), timeout=5)
+            conn.executescript(SCHEMA)
+            connections[name] = conn
+        return conn
+
+    def write_messages(self, name, records):
+        """Store (id, conversation_id, created_at, payload) rows; rewriting the same ids is harmless"""
+        conn = self._connection(name)
+        conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", records)
+        conn.commit()
+
+    def write_chat_history(self, name, records):
+        conn = self._connection(name)
+        conn.executemany("INSERT OR REPLACE INTO chat_history VALUES (?, ?, ?, ?)", records)
+        conn.commit()
+
+    def messages_page(self, name, conversation_id, before=None, limit=50):
+        """Newest-first archived messages before the (created_at, id) key; returns (messages, has_more)"""
+        sql = "SELECT payload FROM messages WHERE conversation_id = ?"
+        params = [conversation_id]
+        if before is not None:
+            sql += " AND (created_at, id) < (?, ?)"
+            params += [_timestamp(before[0]), before[1]]
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = [_unpack(payload) for (payload,) in self._connection(name).execute(sql, params)]
+        return rows[:limit], len(rows) > limit
+
+    def files(self):
+        """Names of the monthly archive files, oldest first"""
+        return sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.directory, 'chat-*.db')))
+
+    def scan(self, name, table, after_id=0, limit=500, since=None, until=None, **equals):
+        """
+        Up to `limit` records of `table` ('messages' or 'chat_history') in id
+        order after `after_id`, optionally in [since, until) and matching the
+        given column values. Returns [(id, record)].
+        """
+        if table not in ('messages', 'chat_history'):
+            raise ValueError(f"Unknown archive table: {table}")
+        sql = f"SELECT id, payload FROM {table} WHERE id > ?"
+        params = [after_id]
+        for column, value in equals.items():
+            sql += f" AND {column} = ?"
+            params.append(value)
+        if since is not None:
+            sql += " AND created_at >= ?"
+            params.append(_timestamp(since))
+        if until is not None:
+            sql += " AND created_at < ?"
+            params.append(_timestamp(until))
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return [(row_id, _unpack(payload)) for row_id, payload in self._connection(name).execute(sql, params)]
+
+    def chat_history(self, user_id):
+        """Archived chat_history rows of a user from every monthly file, newest first"""
+        records = []
+        for name in reversed(self.files()):
+            rows = self._connection(name).execute(
+                "SELECT payload FROM chat_history WHERE user_id = ? ORDER BY created_at DESC, id DESC", (user_id,)
+            )
+            for (payload,) in rows:
+                record = _unpack(payload)
+                record['created_at'] = datetime.fromisoformat(record['created_at'])
+                records.append(record)
+        return records
+
+
+def store():
+    return current_app.extensions['chat_archive']
+
+
+# -------------------------------
+# 🔹 Reads
+# -------------------------------
+def history_page(conversation, cursor=None, limit=50):
+    """
+    Newest-first page of a conversation's messages as dicts, continuing into
+    the archive once the live messages run out. Returns (messages, next_cursor).
+    """
+    live, next_cursor = keyset_page(
+        ChatMessage.query.filter_by(conversation_id=conversation.conversation_id),
+        ChatMessage.created_at, ChatMessage.id, cursor=cursor, limit=limit
+    )
+    messages = [message.to_dict() for message in live]
+    if next_cursor is not None or not conversation.archive_path:
+        return messages, next_cursor
+
+    # Archived messages are all older than the live ones
+    if live:
+        before = (live[-1].created_at, live[-1].id)
+    else:
+        before = decode_cursor(cursor) if cursor else None
+    older, has_more = store().messages_page(conversation.archive_path, conversation.conversation_id,
+                                            before, limit - len(messages))
+    messages += older
+    if not has_more:
+        return messages, None
+    last = messages[-1]
+    return messages, encode_cursor(datetime.fromisoformat(last['created_at']), last['id'])
+
+
+def archived_chat_history(user_id):
+    return store().chat_history(user_id)
+
+
+# -------------------------------
+# 🔹 Archiving
+# -------------------------------
+def archive_conversation(archive, conversation):
+    """
+    Move one conversation's live messages to its archive file. `conversation`
+    is a row with id, conversation_id, created_at, version and archive_path.
+    Returns the number of messages moved (0 if it changed meanwhile).
+    """
+    messages = ChatMessage.query.filter_by(
+        conversation_id=conversation.conversation_id
+    ).order_by(ChatMessage.id.asc()).all()
+    records = [(m.id, m.conversation_id, _timestamp(m.created_at), _pack(m.to_dict())) for m in messages]
+    # End the read transaction; nothing in the live database is locked while the archive is written
+    db.session.rollback()
+    if not records:
+        return 0
+
+    name = conversation.archive_path or archive.file_for(conversation.created_at)
+    archive.write_messages(name, records)
+
+    # Only if nobody wrote to the conversation since it was read (the version check)
+    stubbed = db.session.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id, Conversation.version == conversation.version)
+        # Archiving isn't activity: keep last_updated, which onupdate would otherwise bump
+        .values(archived_at=datetime.utcnow(), archive_path=name, version=Conversation.version + 1,
+                last_updated=Conversation.last_updated)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not stubbed:
+        db.session.rollback()
+        return 0
+    db.session.execute(
+        delete(ChatMessage)
+        .where(ChatMessage.conversation_id == conversation.conversation_id, ChatMessage.id <= records[-1][0])
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(records)
+
+
+def archive_chat_history(archive, cutoff, limit=500):
+    """Move the oldest chat_history rows from before `cutoff`; returns how many moved"""
+    rows = ChatHistory.query.filter(ChatHistory.created_at < cutoff).order_by(ChatHistory.id.asc()).limit(limit).all()
+    by_file = defaultdict(list)
+    for row in rows:
+        by_file[archive.file_for(row.created_at)].append(
+            (row.id, row.user_id, _timestamp(row.created_at), _pack(row.to_dict()))
+        )
+    ids = [row.id for row in rows]
+    db.session.rollback()
+    if not ids:
+        return 0
+
+    for name, records in by_file.items():
+        archive.write_chat_history(name, records)
+    db.session.execute(delete(ChatHistory).where(ChatHistory.id.in_(ids)).execution_options(synchronize_session=False))
+    db.session.commit()
+    return len(ids)
+
+
+def archive_idle(archive, idle_days, batch_size=20, pause=0.05, max_batches=None, log=print):
+    """Archive every conversation idle for `idle_days`, then old chat_history rows"""
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+    totals = Counter()
+    has_messages = exists().where(ChatMessage.conversation_id == Conversation.conversation_id)
+    after_id = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        batch = db.session.query(
+            Conversation.id, Conversation.conversation_id, Conversation.created_at,
+            Conversation.version, Conversation.archive_path
+        ).filter(
+            Conversation.id > after_id, Conversation.last_updated < cutoff, has_messages
+        ).order_by(Conversation.id.asc()).limit(batch_size).all()
+        db.session.rollback()
+        if not batch:
+            break
+
+        for conversation in batch:
+            moved = archive_conversation(archive, conversation)
+            totals['conversations' if moved else 'skipped'] += 1
+            totals['messages'] += moved
+            after_id = conversation.id
+        batches += 1
+        log(f"Archived {totals['conversations']} conversation(s), {totals['messages']} message(s)")
+        # Let live writers in between batches
+        time.sleep(pause)
+
+    while max_batches is None or batches < max_batches:
+        moved = archive_chat_history(archive, cutoff, limit=batch_size * 25)
+        if not moved:
+            break
+        totals['chat_history'] += moved
+        batches += 1
+        time.sleep(pause)
+
+    return totals
+
+
+def init_app(app):
+    """Open the archive directory and register `flask archive-chats`"""
+    archive = ArchiveStore(app.config['CHAT_ARCHIVE_DIR'])
+    app.extensions['chat_archive'] = archive
+
+    @app.cli.command('archive-chats')
+    @click.option('--idle-days', type=int, default=None, help='Archive conversations idle for this many days.')
+    @click.option('--batch-size', type=int, default=20, help='Conversations per batch.')
+    @click.option('--max-batches', type=int, default=None, help='Stop after this many batches (resume later).')
+    @click.option('--vacuum', is_flag=True, help='VACUUM the live database afterwards (locks it; run off-peak).')
+    def archive_chats_command(idle_days, batch_size, max_batches, vacuum):
+        """Move idle conversations and old chat history into the monthly archive."""
+        idle_days = idle_days if idle_days is not None else app.config['CHAT_ARCHIVE_IDLE_DAYS']
+        totals = archive_idle(archive, idle_days, batch_size=batch_size, max_batches=max_batches, log=click.echo)
+        click.echo(json.dumps(dict(totals)))
+        if vacuum:
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text('VACUUM'))
+            click.echo('Vacuumed the live database')
+
+    return archive
@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, make_response, flash
-from flask_jwt_extended import create_access_token, jwt_required, unset_jwt_cookies, get_jwt_identity
+from flask_jwt_extended import jwt_required, unset_jwt_cookies, get_jwt_identity
 from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User, bcrypt
+from models import db, User
+import passwords
+from passwords import PasswordBusy
+import identity
+from identity import IdentityUser
 
 auth = Blueprint("auth", __name__)
 
@@ -25,21 +29,24 @@ def register():
             return render_template('signup.html', error="Email already exists")
 
         # Create new user
-        new_user = User(
-            username=data['username'],
-            email=data['email'],
-            password=data['password'],
-            role=role,
-            specialization=specialization
-        )
+        try:
+            new_user = User(
+                username=data['username'],
+                email=data['email'],
+                password=data['password'],
+                role=role,
+                specialization=specialization
+            )
+        except PasswordBusy:
+            return render_template('signup.html', error="Too many sign-ups right now. Please try again in a moment."), 503
         db.session.add(new_user)
         db.session.commit()
 
         # Log in the new user
-        login_user(new_user)
+        login_user(IdentityUser.from_user(new_user))
         
         # Also create JWT token
-        access_token = create_access_token(identity={'id': new_user.id, 'role': new_user.role})
+        access_token = identity.access_token(new_user)
         response = make_response(redirect(url_for('users.dashboard' if role == 'patient' else 'doctors.dashboard')))
         response.set_cookie('access_token', access_token, httponly=True)
         
@@ -66,11 +73,15 @@ def login():
             user = User.query.filter_by(email=email, role=role).first()
             
             if user and user.check_password(password):
-                # Log in the user with Flask-Login
-                login_user(user)
+                # Hashes from before a BCRYPT_LOG_ROUNDS change are upgraded as users log in
+                if user.rehash_password(password):
+                    db.session.commit()
+
+                # Log in the user with Flask-Login; the session keeps the signed claims
+                login_user(IdentityUser.from_user(user))
                 
                 # Create JWT token
-                access_token = create_access_token(identity={'id': user.id, 'role': user.role})
+                access_token = identity.access_token(user)
                 
                 # Create response with appropriate redirect
                 response = make_response(redirect(url_for('users.dashboard' if role == 'patient' else 'doctors.dashboard')))
@@ -78,6 +89,8 @@ def login():
                 return response
 
             return render_template('login.html', error="Invalid credentials")
+        except PasswordBusy:
+            return render_template('login.html', error="Too many sign-ins right now. Please try again in a moment."), 503
         except Exception as e:
             print(f"Login error: {str(e)}")
             return render_template('login.html', error="An error occurred during login. Please try again.")
@@ -100,7 +113,7 @@ def logout():
 @auth.route('/profile')
 @login_required
 def profile():
-    return render_template('profile.html', user=current_user)
+    return render_template('profile.html', user=current_user.record)
 
 @auth.route('/update_profile', methods=['POST'])
 @login_required
@@ -118,16 +131,18 @@ def update_profile():
         flash('Email already in use by another account', 'danger')
         return redirect(url_for('auth.profile'))
     
-    current_user.username = username
-    current_user.email = email
+    user = current_user.record
+    user.username = username
+    user.email = email
     
     # Update specialization if doctor
-    if current_user.role == 'doctor':
+    if user.role == 'doctor':
         specialization = request.form.get('specialization')
         if specialization:
-            current_user.specialization = specialization
+            user.specialization = specialization
     
     db.session.commit()
+    identity.refresh(user)
     flash('Profile updated successfully', 'success')
     return redirect(url_for('auth.profile'))
 
@@ -154,8 +169,18 @@ def change_password():
         flash('Password must be at least 8 characters long', 'danger')
         return redirect(url_for('auth.profile'))
     
-    current_user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+    user = current_user.record
+    user.set_password(new_password)
     db.session.commit()
+    # Other sessions of this user are logged out; this one gets a new token
+    identity.refresh(user)
     
     flash('Password updated successfully', 'success')
     return redirect(url_for('auth.profile'))
+
+
+@auth.route('/password-metrics')
+@login_required
+def password_metrics():
+    """bcrypt cost, pool size and per-operation queue wait and hash time"""
+    return jsonify(passwords.hasher.stats())
@@ -0,0 +1,166 @@
+"""
+Slot-based appointment availability.
+
+A doctor's working hours (APPOINTMENT_HOURS on APPOINTMENT_DAYS) are cut into
+fixed slots of APPOINTMENT_SLOT_MINUTES. Every slot has an integer key, the
+minutes from 2000-01-01 to its start, and every pending or confirmed
+appointment stores the key of the slot it falls in (an appointment off the
+grid gets the slot containing it). Keys don't depend on the slot length, so
+they stay valid when APPOINTMENT_SLOT_MINUTES changes; slots of the new length
+that start where old ones did still collide in the index, but an overlap of
+differently aligned slots (a 60 minute slot at 9:00 over a 30 minute booking
+at 9:30) is not caught by it. A unique (doctor_id, slot_key) index makes the
+database reject a second booking of the same slot, so two patients racing
+for it can't both win; cancelling an appointment clears its key and frees
+the slot.
+
+Free-slot searches read the doctors from the cached doctor directory and the
+booked keys one day at a time into per-doctor sorted lists, so a search for
+the next few slots across a whole specialization touches only the first
+day(s) of bookings, however many doctors there are.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from doctor_directory import directory
+from extensions import db
+from models import Appointment
+
+EPOCH = datetime(2000, 1, 1)
+MAX_SEARCH_DAYS = 90
+
+
+def _parse_hours(value):
+    """'09:00-17:00' -> (time(9), time(17))"""
+    start, end = (datetime.strptime(part.strip(), '%H:%M').time() for part in value.split('-'))
+    if end <= start:
+        raise ValueError(f"Invalid working hours: {value}")
+    return start, end
+
+
+class SlotCalendar:
+    """Working-hours slot grid shared by all doctors"""
+
+    def __init__(self, slot_minutes=30, hours='09:00-17:00', days='0,1,2,3,4,5'):
+        self.slot_minutes = slot_minutes
+        self.slot = timedelta(minutes=slot_minutes)
+        self.opens, self.closes = _parse_hours(hours)
+        self.days = {int(day) for day in str(days).split(',') if day.strip()}
+
+    def key(self, moment):
+        """Key of the slot containing `moment`: minutes from EPOCH to the slot's start"""
+        minutes = int((moment - EPOCH).total_seconds() // 60)
+        return minutes - minutes % self.slot_minutes
+
+    def start(self, key):
+        return EPOCH + timedelta(minutes=key)
+
+    def is_bookable(self, moment):
+        """Whether `moment` is the start of a working slot"""
+        return (
+            moment == self.start(self.key(moment))
+            and moment.weekday() in self.days
+            and self.opens <= moment.time()
+            and (moment + self.slot).time() <= self.closes
+            and (moment + self.slot).date() == moment.date()
+        )
+
+    def day_keys(self, day, after=None):
+        """Keys of the working slots of `day` that start at or after `after`"""
+        if day.weekday() not in self.days:
+            return range(0)
+        first = self.key(datetime.combine(day, self.opens) + self.slot - timedelta(microseconds=1))
+        last = self.key(datetime.combine(day, self.closes)) - self.slot_minutes
+        if after is not None:
+            first = max(first, self.key(after - timedelta(microseconds=1)) + self.slot_minutes)
+        return range(first, last + 1, self.slot_minutes)
+
+
+def calendar():
+    return current_app.extensions['slot_calendar']
+
+
+# -------------------------------
+# 🔹 Booked-slot index
+# -------------------------------
+def booked_index(doctor_ids, first_key, last_key):
+    """{doctor_id: sorted booked keys} for keys in [first_key, last_key]"""
+    index = {doctor_id: [] for doctor_id in doctor_ids}
+    if not index:
+        return index
+    rows = db.session.query(Appointment.doctor_id, Appointment.slot_key).filter(
+        Appointment.doctor_id.in_(list(index)),
+        Appointment.slot_key.between(first_key, last_key)
+    ).order_by(Appointment.doctor_id, Appointment.slot_key)
+    for doctor_id, key in rows:
+        index[doctor_id].append(key)
+    return index
+
+
+def _is_booked(keys, key):
+    i = bisect_left(keys, key)
+    return i < len(keys) and keys[i] == key
+
+
+def next_free_slots(doctors, limit=10, after=None, days=30):
+    """
+    The `limit` earliest free slots of `doctors` (directory entries) after
+    `after` (default: now), earliest first and by doctor within a slot.
+    """
+    grid = calendar()
+    after = after or datetime.now()
+    days = min(max(days, 1), MAX_SEARCH_DAYS)
+    doctors = sorted(doctors, key=lambda doctor: doctor['id'])
+    slots = []
+
+    for offset in range(days):
+        keys = grid.day_keys(after.date() + timedelta(days=offset), after=after)
+        if not keys or not doctors:
+            continue
+        booked = booked_index([doctor['id'] for doctor in doctors], keys[0], keys[-1])
+        for key in keys:
+            start = grid.start(key)
+            for doctor in doctors:
+                if not _is_booked(booked[doctor['id']], key):
+                    slots.append({
+                        'start': start.isoformat(),
+                        'end': (start + grid.slot).isoformat(),
+                        'doctor_id': doctor['id'],
+                        'doctor': doctor['username'],
+                        'specialization': doctor['specialization']
+                    })
+                    if len(slots) >= limit:
+                        return slots
+    return slots
+
+
+def free_slots_for_specialization(specialization, limit=10, after=None, days=30):
+    return next_free_slots(directory.doctors(specialization), limit=limit, after=after, days=days)
+
+
+def free_slots_for_doctor(doctor_id, limit=10, after=None, days=30):
+    doctors = [doctor for doctor in directory.doctors() if doctor['id'] == doctor_id]
+    return next_free_slots(doctors, limit=limit, after=after, days=days)
+
+
+# -------------------------------
+# 🔹 Booking
+# -------------------------------
+def assign_slot(appointment):
+    """Set the slot key of a pending/confirmed appointment (None once cancelled)"""
+    if appointment.status == 'cancelled':
+        appointment.slot_key = None
+    else:
+        appointment.slot_key = calendar().key(appointment.appointment_date)
+    return appointment.slot_key
+
+
+def init_app(app):
+    app.extensions['slot_calendar'] = SlotCalendar(
+        slot_minutes=app.config['APPOINTMENT_SLOT_MINUTES'],
+        hours=app.config['APPOINTMENT_HOURS'],
+        days=app.config['APPOINTMENT_DAYS']
+    )
+    return app.extensions['slot_calendar']
@@ -1,37 +1,107 @@
 import json
+import os
 import re
-import nltk
-import spacy
-from langdetect import detect
-from textblob import TextBlob
-import openai
 import random
 from datetime import datetime
 
-# Download necessary NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from fallback_engine import FallbackEngine
+from llm_client import DEFAULT_BASE_URL, CircuitBreaker, LLMClient, LLMError
+from response_cache import ResponseCache, make_key
+from retrieval import Retriever, snippet
+from startup import BASE_DIR, nltk_data, resource
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
 
-# Try to load spaCy models
-try:
-    nlp_en = spacy.load("en_core_web_sm")
-except:
-    # If model is not available, use a simple tokenizer
-    nlp_en = None
+# Heavy NLP/LLM dependencies are declared as startup resources so importing
+# this module stays cheap; they load during warm-up or on first use.
+@resource('spacy.en_core_web_sm')
+def load_spacy():
+    try:
+        import spacy
+        return spacy.load("en_core_web_sm")
+    except Exception:
+        # If model is not available, use a simple tokenizer
+        return None
 
-# Load OpenAI API key
-try:
-    with open('openai_api_key.txt', 'r') as f:
-        openai.api_key = f.read().strip()
-except:
-    print("WARNING: OpenAI API key not found or invalid")
+
+@resource('llm.client')
+def load_llm_client():
+    # Load OpenAI API key
+    api_key = os.environ.get('OPENAI_API_KEY')
+    try:
+        with open(os.path.join(BASE_DIR, 'openai_api_key.txt'), 'r') as f:
+            api_key = f.read().strip() or api_key
+    except Exception:
+        if not api_key:
+            print("WARNING: OpenAI API key not found or invalid")
+    
+    return LLMClient(
+        api_key=api_key,
+        base_url=os.environ.get('LLM_BASE_URL', DEFAULT_BASE_URL),
+        model=os.environ.get('LLM_MODEL', 'gpt-3.5-turbo'),
+        timeout=float(os.environ.get('LLM_TIMEOUT', 10)),
+        max_retries=int(os.environ.get('LLM_MAX_RETRIES', 2)),
+        pool_size=int(os.environ.get('LLM_POOL_SIZE', 10)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.environ.get('LLM_BREAKER_RESET', 30))
+        )
+    )
+
+
+@resource('llm.cache')
+def load_response_cache():
+    return ResponseCache(
+        os.environ.get('LLM_CACHE_PATH', os.path.join(BASE_DIR, 'llm_cache.db')),
+        max_entries=int(os.environ.get('LLM_CACHE_SIZE', 1024)),
+        ttl=float(os.environ.get('LLM_CACHE_TTL', 86400)),
+        purge_every=int(os.environ.get('LLM_CACHE_PURGE_EVERY', 500))
+    )
+
+
+@resource('chat.fallback')
+def load_fallback_engine():
+    return FallbackEngine.from_files(
+        os.path.join(BASE_DIR, 'NewData', 'FallbackResponses.json'),
+        diseases_path=os.path.join(BASE_DIR, 'static', 'wholeData.json'),
+        herbs_path=os.path.join(BASE_DIR, 'NewData', 'HerbsData.json')
+    )
+
+
+@resource('chat.retriever')
+def load_retriever():
+    return Retriever.from_files(
+        disease_paths=[os.path.join(BASE_DIR, 'static', 'wholeData.json'),
+                       os.path.join(BASE_DIR, 'NewData', 'NewData.json')],
+        herbs_path=os.path.join(BASE_DIR, 'NewData', 'HerbsData.json')
+    )
+
+
+@resource('textblob')
+def load_textblob():
+    nltk_data.get()
+    from textblob import TextBlob
+    return TextBlob
+
+
+@resource('langdetect')
+def load_langdetect():
+    from langdetect import detect, detector_factory
+
+    # Language profiles are otherwise read on the first detect() call
+    detector_factory.init_factory()
+    return detect
+
+
+# Bump whenever _create_system_message changes so cached replies are not reused
+SYSTEM_PROMPT_VERSION = 2
+
+# Knowledge base passages injected into the prompt / used by the fallback
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 3))
+PROMPT_PASSAGE_CHARS = 500
+FALLBACK_PASSAGE_CHARS = 300
+
+# Intents with a fixed answer never need retrieval
+STATIC_INTENTS = ('greeting', 'goodbye', 'thank', 'appointment_inquiry')
 
 # Common symptom patterns and medical terms for detection
 SYMPTOMS = [
@@ -76,8 +146,25 @@ class ChatbotProcessor:
     A class to process messages for the context-aware chatbot
     """
     
-    def __init__(self):
-        self.openai_available = openai.api_key is not None
+    @property
+    def llm(self):
+        return load_llm_client.get()
+    
+    @property
+    def response_cache(self):
+        return load_response_cache.get()
+    
+    @property
+    def fallback_engine(self):
+        return load_fallback_engine.get()
+    
+    @property
+    def retriever(self):
+        return load_retriever.get()
+    
+    @property
+    def openai_available(self):
+        return self.llm.available
     
     def detect_language(self, text):
         """
@@ -86,7 +173,7 @@ class ChatbotProcessor:
         """
         try:
             # First try langdetect
-            lang = detect(text)
+            lang = load_langdetect.get()(text)
             
             # Simple heuristic for Hindi/English detection
             if any(self._contains_devanagari(text)):
@@ -119,6 +206,7 @@ class ChatbotProcessor:
                 })
         
         # Use spaCy for named entity recognition (if available)
+        nlp_en = load_spacy.get()
         if nlp_en and language == 'en':
             doc = nlp_en(text)
             for ent in doc.ents:
@@ -153,56 +241,133 @@ class ChatbotProcessor:
         Returns {'polarity': float, 'subjectivity': float}
         """
         if language == 'en':
-            blob = TextBlob(text)
-            return {
-                'polarity': blob.sentiment.polarity,
-                'subjectivity': blob.sentiment.subjectivity
-            }
+            try:
+                blob = load_textblob.get()(text)
+                return {
+                    'polarity': blob.sentiment.polarity,
+                    'subjectivity': blob.sentiment.subjectivity
+                }
+            except Exception as e:
+                print(f"Sentiment analysis unavailable: {str(e)}")
         
         # Default neutral sentiment for non-English text
         return {'polarity': 0, 'subjectivity': 0.5}
     
-    def generate_response(self, user_message, conversation_history, user_context):
+    def retrieve(self, text, k=RETRIEVAL_TOP_K):
+        """
+        Knowledge base passages relevant to `text`.
+        Symptoms written in Hindi/Hinglish are added as their English names first.
+        """
+        query = ' '.join([text] + self.fallback_engine.match_symptoms(text))
+        return [passage for score, passage in self.retriever.search(query, k=k)]
+    
+    def generate_response(self, user_message, conversation_history, user_context, summary=None):
         """
         Generate a response using OpenAI or fallback mechanisms
         """
         language = self.detect_language(user_message)
+        reply = self.llm_response(user_message, conversation_history, user_context, language, summary)
+        if reply is not None:
+            return reply
+        
+        # If OpenAI is unavailable or fails, use fallback responses
+        return self.fallback_response(user_message, user_context, language)
+    
+    def llm_response(self, user_message, conversation_history, user_context, language, summary=None):
+        """
+        Answer from the response cache or the LLM.
+        Returns None when the LLM is unavailable, the circuit is open or the call fails.
+        """
+        if not self.openai_available:
+            return None
+        
+        # Near-identical turns are answered from the cache without any network call
+        cache_key = make_key(user_message, language, user_context, SYSTEM_PROMPT_VERSION)
+        cached = self.response_cache.get(cache_key, language)
+        if cached is not None:
+            return cached
+        
+        # An open circuit breaker skips straight to the fallback
+        if not self.llm.allow_request():
+            return None
+        
+        # Format conversation for OpenAI, grounded in the local knowledge base
+        passages = self.retrieve(user_message)
+        messages = self._build_messages(language, user_context, conversation_history, summary, passages)
+        try:
+            # Call OpenAI API
+            reply = self.llm.chat(messages, max_tokens=350, temperature=0.7)
+        except LLMError as e:
+            print(f"OpenAI API error: {str(e)}")
+            return None
+        
+        self.response_cache.set(cache_key, language, reply)
+        return reply
+    
+    def fallback_response(self, user_message, user_context, language):
+        """Rule-based response, cheap enough to return immediately"""
         intent = self.detect_intent(user_message, language)
         entities = self.extract_entities(user_message, language)
+        return self._generate_fallback_response(user_message, intent, entities, language, user_context)
+    
+    def stream_response(self, user_message, conversation_history, user_context, summary=None):
+        """
+        Generate a response as a stream of text chunks.
+        Streams tokens from OpenAI as they arrive; if OpenAI is unavailable or fails
+        before the first token, streams the fallback response word by word instead.
+        """
+        language = self.detect_language(user_message)
         
-        # Format conversation for OpenAI
         if self.openai_available:
-            # Prepare system message based on context
-            system_message = self._create_system_message(language, user_context)
-            
-            # Format conversation history
-            messages = [{"role": "system", "content": system_message}]
+            cache_key = make_key(user_message, language, user_context, SYSTEM_PROMPT_VERSION)
+            cached = self.response_cache.get(cache_key, language)
+            if cached is not None:
+                yield from re.findall(r'\S+\s*', cached)
+                return
             
-            # Add conversation history
-            for msg in conversation_history:
-                role = "assistant" if msg.is_bot else "user"
-                messages.append({"role": role, "content": msg.content})
-            
-            try:
-                # Call OpenAI API
-                response = openai.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    max_tokens=350,
-                    temperature=0.7,
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                print(f"OpenAI API error: {str(e)}")
-                # Fall back to rule-based responses
+            if self.llm.allow_request():
+                passages = self.retrieve(user_message)
+                messages = self._build_messages(language, user_context, conversation_history, summary, passages)
+                parts = []
+                
+                try:
+                    for delta in self.llm.stream_chat(messages, max_tokens=350, temperature=0.7):
+                        parts.append(delta)
+                        yield delta
+                    self.response_cache.set(cache_key, language, ''.join(parts).strip())
+                    return
+                except LLMError as e:
+                    print(f"OpenAI API error: {str(e)}")
+                    # A partial answer has already reached the client, don't append a second one
+                    if parts:
+                        return
         
-        # If OpenAI is unavailable or fails, use fallback responses
-        return self._generate_fallback_response(user_message, intent, entities, language, user_context)
+        fallback = self.fallback_response(user_message, user_context, language)
+        for word in re.findall(r'\S+\s*', fallback):
+            yield word
     
-    def _create_system_message(self, language, user_context):
+    def _build_messages(self, language, user_context, conversation_history, summary=None, passages=None):
+        """Build the OpenAI messages list from the context and conversation history"""
+        # Prepare system message based on context
+        system_message = self._create_system_message(language, user_context, passages)
+        
+        # Format conversation history
+        messages = [{"role": "system", "content": system_message}]
+        
+        # Older turns that no longer fit the window are carried as a short summary
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        
+        # Add conversation history
+        for msg in conversation_history:
+            role = "assistant" if msg.is_bot else "user"
+            messages.append({"role": role, "content": msg.content})
+        return messages
+    
+    def _create_system_message(self, language, user_context, passages=None):
         """Create a system message for the OpenAI API based on context"""
         if language == 'hi':
-            return f"""
+            message = f"""
             आप एक चिकित्सा सहायक हैं जो AyushHealthBot के लिए काम करते हैं। आपका नाम Ayush Assistant है।
             
             आपको निम्नलिखित दिशानिर्देशों का पालन करना चाहिए:
@@ -218,7 +383,7 @@ class ChatbotProcessor:
             पिछली बातचीत में उल्लिखित विषय: {', '.join(user_context.get('topics', []))}
             """
         else:
-            return f"""
+            message = f"""
             You are a medical assistant working for AyushHealthBot. Your name is Ayush Assistant.
             
             You should follow these guidelines:
@@ -233,167 +398,97 @@ class ChatbotProcessor:
             User's symptoms so far: {', '.join(user_context.get('symptoms', []))}
             Topics mentioned in previous conversation: {', '.join(user_context.get('topics', []))}
             """
+        
+        # Retrieved passages let the model answer briefly from facts instead of from scratch
+        if passages:
+            header = "ज्ञानकोश से प्रासंगिक जानकारी:" if language == 'hi' else "Relevant knowledge base entries (use them if they apply):"
+            lines = [f"- {snippet(p['text'], PROMPT_PASSAGE_CHARS)}" for p in passages]
+            message += f"\n{header}\n" + "\n".join(lines)
+        return message
     
     def _generate_fallback_response(self, message, intent, entities, language, context):
-        """Generate a rule-based fallback response"""
-        # Extract symptoms from entities
-        symptoms = [e['value'] for e in entities if e['type'] == 'symptom']
-        previous_symptoms = context.get('symptoms', [])
-        all_symptoms = list(set(previous_symptoms + symptoms))
-        
-        # Hindi responses
-        if language == 'hi':
-            if intent == 'greeting':
-                return "नमस्ते! मैं आपका Ayush स्वास्थ्य सहायक हूँ। आप कैसे हैं और मैं आपकी कैसे मदद कर सकता हूँ?"
-            
-            if intent == 'goodbye':
-                return "अलविदा! अच्छे स्वास्थ्य की कामना करता हूँ। जब भी आपको स्वास्थ्य संबंधी सलाह चाहिए, मुझसे पूछ सकते हैं।"
-            
-            if intent == 'thank':
-                return "आपका स्वागत है! कृपया अच्छे स्वास्थ्य के लिए पर्याप्त आराम करें और पानी पीते रहें।"
-            
-            if intent == 'symptom_report':
-                if not symptoms and not previous_symptoms:
-                    return "कृपया अपने लक्षणों के बारे में अधिक जानकारी दें ताकि मैं आपकी बेहतर मदद कर सकूँ।"
-                
-                if symptoms and previous_symptoms:
-                    shared_symptoms = set(symptoms).intersection(set(previous_symptoms))
-                    new_symptoms = set(symptoms) - set(previous_symptoms)
-                    
-                    if new_symptoms:
-                        return f"मैं देख रहा हूँ कि आपने पहले {', '.join(previous_symptoms)} का उल्लेख किया था, और अब आपको {', '.join(new_symptoms)} भी हो रहा है। ये लक्षण एक साथ आम तौर पर वायरल संक्रमण के संकेत हो सकते हैं। अधिक पानी पिएं और आराम करें। यदि लक्षण बिगड़ जाते हैं, तो डॉक्टर से परामर्श करें।"
-                    else:
-                        return f"आपने फिर से {', '.join(shared_symptoms)} का उल्लेख किया। क्या आपको कोई अन्य लक्षण भी महसूस हो रहे हैं?"
-                
-                # New symptoms only
-                symptom_responses = {
-                    'fever': "बुखार के लिए, पर्याप्त आराम करें और तरल पदार्थ अधिक पिएं। पैरासिटामोल ले सकते हैं। यदि बुखार 102°F से अधिक है या 3 दिनों से अधिक रहता है, तो डॉक्टर से परामर्श करें।",
-                    'bukhaar': "बुखार के लिए, पर्याप्त आराम करें और तरल पदार्थ अधिक पिएं। पैरासिटामोल ले सकते हैं। यदि बुखार 102°F से अधिक है या 3 दिनों से अधिक रहता है, तो डॉक्टर से परामर्श करें।",
-                    'headache': "सिरदर्द के लिए, आराम करें, पानी पिएं, और अगर आवश्यक हो तो पैरासिटामोल लें। यदि सिरदर्द गंभीर है या बार-बार होता है, तो डॉक्टर से परामर्श करें।",
-                    'sirdard': "सिरदर्द के लिए, आराम करें, पानी पिएं, और अगर आवश्यक हो तो पैरासिटामोल लें। यदि सिरदर्द गंभीर है या बार-बार होता है, तो डॉक्टर से परामर्श करें।",
-                    'cough': "खांसी के लिए, गर्म पानी पिएं और शहद-नींबू का मिश्रण ले सकते हैं। अदरक और तुलसी की चाय भी फायदेमंद होती है।",
-                    'khansi': "खांसी के लिए, गर्म पानी पिएं और शहद-नींबू का मिश्रण ले सकते हैं। अदरक और तुलसी की चाय भी फायदेमंद होती है।",
-                    'sore throat': "गले में खराश के लिए, गर्म नमक के पानी से गरारे करें और आराम करें। शहद और अदरक की चाय पी सकते हैं।",
-                    'galaa kharaab': "गले में खराश के लिए, गर्म नमक के पानी से गरारे करें और आराम करें। शहद और अदरक की चाय पी सकते हैं।"
-                }
-                
-                for s in symptoms:
-                    if s in symptom_responses:
-                        return symptom_responses[s]
-                
-                return f"मैं आपके {', '.join(symptoms)} के लक्षणों को नोट कर लिया है। कृपया पर्याप्त आराम करें और तरल पदार्थ पिएं। यदि लक्षण गंभीर हों या लंबे समय तक रहें, तो डॉक्टर से परामर्श करें।"
-            
-            if intent == 'medicine_inquiry':
-                if not all_symptoms:
-                    return "विशेषिक दवाओं के बारे में सलाह देने के लिए, मुझे आपके लक्षणों के बारे में अधिक जानकारी चाहिए। कृपया अपने लक्षणों का वर्णन करें।"
-                
-                if 'fever' in all_symptoms or 'bukhaar' in all_symptoms:
-                    return "बुखार के लिए, पैरासिटामोल (500-650mg) 6 घंटे में एक बार ले सकते हैं। आयुर्वेदिक उपचार में तुलसी, शहद, और हल्दी वाला दूध शामिल है। अधिक जानकारी के लिए डॉक्टर से परामर्श करें।"
-                
-                if 'headache' in all_symptoms or 'sirdard' in all_symptoms:
-                    return "सिरदर्द के लिए, पैरासिटामोल या आइबुप्रोफेन ले सकते हैं। आयुर्वेदिक उपचार में लौंग का तेल लगाना और तुलसी की चाय शामिल है। पर्याप्त पानी पीना न भूलें।"
-                
-                return "बिना डॉक्टरी सलाह के दवाएं लेने की सिफारिश नहीं की जाती है। आपके लक्षणों के आधार पर, पर्याप्त आराम करें, अधिक पानी पिएं, और यदि लक्षण गंभीर हैं या 2-3 दिनों से अधिक रहते हैं, तो डॉक्टर से परामर्श करें।"
-            
-            if intent == 'appointment_inquiry':
-                return "डॉक्टर से अपॉइंटमेंट बुक करने के लिए, आप अपने डैशबोर्ड पर 'अपॉइंटमेंट बुक करें' बटन पर क्लिक कर सकते हैं। आप विशेषज्ञता के आधार पर डॉक्टर चुन सकते हैं और अपने लिए सुविधाजनक समय निर्धारित कर सकते हैं।"
-            
-            # Default response
-            return "मैं आपकी स्वास्थ्य संबंधी जिज्ञासाओं में मदद करने के लिए यहां हूं। क्या आप कृपया अधिक विवरण दे सकते हैं कि आप किस तरह की जानकारी चाहते हैं?"
+        """Generate a rule-based fallback response from the precompiled response table"""
+        engine = self.fallback_engine
+        # Symptoms from entities plus anything else the knowledge base knows about
+        symptoms = [e['value'] for e in entities if e['type'] == 'symptom'] + engine.match_symptoms(message)
+        # The intent patterns only know a few romanized symptoms; treat any other one as a report
+        if intent == 'general_query' and symptoms:
+            intent = 'symptom_report'
         
-        # English responses
-        else:
-            if intent == 'greeting':
-                return "Hello! I'm your Ayush Health Assistant. How are you feeling today and how can I help you?"
-            
-            if intent == 'goodbye':
-                return "Goodbye! Wishing you good health. Feel free to ask me whenever you need health advice."
-            
-            if intent == 'thank':
-                return "You're welcome! Please make sure to rest well and stay hydrated for good health."
-            
-            if intent == 'symptom_report':
-                if not symptoms and not previous_symptoms:
-                    return "Please provide more details about your symptoms so I can help you better."
-                
-                if symptoms and previous_symptoms:
-                    shared_symptoms = set(symptoms).intersection(set(previous_symptoms))
-                    new_symptoms = set(symptoms) - set(previous_symptoms)
-                    
-                    if new_symptoms:
-                        return f"I see that you previously mentioned {', '.join(previous_symptoms)}, and now you're also experiencing {', '.join(new_symptoms)}. These symptoms together typically suggest a viral infection. Stay hydrated and get rest. If symptoms worsen, consult a doctor."
-                    else:
-                        return f"You've mentioned {', '.join(shared_symptoms)} again. Are you experiencing any other symptoms?"
-                
-                # New symptoms only
-                symptom_responses = {
-                    'fever': "For fever, get plenty of rest and drink fluids. You can take paracetamol. If the fever is above 102°F or persists for more than 3 days, consult a doctor.",
-                    'headache': "For headache, rest, stay hydrated, and take paracetamol if needed. If the headache is severe or recurrent, consult a doctor.",
-                    'cough': "For cough, drink warm water and try honey-lemon mix. Ginger and tulsi tea can also be beneficial.",
-                    'sore throat': "For sore throat, gargle with warm salt water and get rest. You can drink honey and ginger tea."
-                }
-                
-                for s in symptoms:
-                    if s in symptom_responses:
-                        return symptom_responses[s]
-                
-                return f"I've noted your symptoms of {', '.join(symptoms)}. Please get adequate rest and stay hydrated. If symptoms are severe or persist, consult a doctor."
-            
-            if intent == 'medicine_inquiry':
-                if not all_symptoms:
-                    return "To advise on specific medications, I would need more information about your symptoms. Please describe what you're experiencing."
-                
-                if 'fever' in all_symptoms:
-                    return "For fever, you can take paracetamol (500-650mg) every 6 hours. Ayurvedic remedies include tulsi, honey, and turmeric milk. Please consult a doctor for more information."
-                
-                if 'headache' in all_symptoms:
-                    return "For headache, you can take paracetamol or ibuprofen. Ayurvedic remedies include applying clove oil and drinking tulsi tea. Remember to stay hydrated."
-                
-                return "Taking medications without medical advice is not recommended. Based on your symptoms, get plenty of rest, drink more water, and if symptoms are severe or persist for more than 2-3 days, consult a doctor."
-            
-            if intent == 'appointment_inquiry':
-                return "To book an appointment with a doctor, you can click on the 'Book Appointment' button on your dashboard. You can select doctors based on specialization and schedule a time that's convenient for you."
-            
-            # Default response
-            return "I'm here to help with your health-related queries. Could you please provide more details about what information you're looking for?"
+        knowledge = None
+        if intent not in STATIC_INTENTS:
+            knowledge = [{'title': p['title'], 'text': snippet(p['text'], FALLBACK_PASSAGE_CHARS)}
+                         for p in self.retrieve(message, k=1)]
+        return engine.respond(intent, symptoms, context.get('symptoms', []), language, knowledge)
     
-    def update_context_from_message(self, text, context):
+    def new_context(self):
+        """Empty conversation context"""
+        return {
+            'symptoms': [],
+            'topics': [],
+            'sentiment_history': [],
+            'created_at': datetime.now().isoformat()
+        }
+    
+    def update_context_from_message(self, text, context, entities=None):
         """
         Update context based on user message content
         Returns updated context dictionary
         """
+        context = self.update_context_symptoms(text, context, entities)
+        return self.update_context_topics(text, context)
+    
+    def update_context_symptoms(self, text, context, entities=None):
+        """Add the symptoms mentioned in `text` to the context (what the reply depends on)"""
         # Initialize context if empty
         if not context:
-            context = {
-                'symptoms': [],
-                'topics': [],
-                'sentiment_history': [],
-                'created_at': datetime.now().isoformat()
-            }
+            context = self.new_context()
+        context.setdefault('symptoms', [])
         
         # Extract entities and update symptoms
-        entities = self.extract_entities(text, self.detect_language(text))
+        if entities is None:
+            entities = self.extract_entities(text, self.detect_language(text))
         for entity in entities:
             if entity['type'] == 'symptom' and entity['value'] not in context['symptoms']:
                 context['symptoms'].append(entity['value'])
         
-        # Add topic from the first few words
+        # Keep lists to a reasonable size
+        if len(context['symptoms']) > 10:
+            context['symptoms'] = context['symptoms'][-10:]
+        
+        # Update timestamp
+        context['created_at'] = datetime.now().isoformat()
+        
+        return context
+    
+    def update_context_topics(self, text, context):
+        """Add a topic from the first few words of `text`"""
+        if not context:
+            context = self.new_context()
+        context.setdefault('topics', [])
+        
         words = text.lower().split()
         if len(words) > 3:
             topic = " ".join(words[:min(5, len(words))])
             if topic not in context['topics']:
                 context['topics'].append(topic)
         
-        # Keep lists to a reasonable size
-        if len(context['symptoms']) > 10:
-            context['symptoms'] = context['symptoms'][-10:]
         if len(context['topics']) > 5:
             context['topics'] = context['topics'][-5:]
-        
-        # Update timestamp
-        context['created_at'] = datetime.now().isoformat()
-        
-        return context 
+        return context
+    
+    def record_sentiment(self, context, sentiment, message_id=None):
+        """Append a sentiment reading to the context's sentiment_history (last 20 kept)"""
+        history = context.setdefault('sentiment_history', [])
+        history.append({
+            'message_id': message_id,
+            'polarity': round(sentiment['polarity'], 3),
+            'subjectivity': round(sentiment['subjectivity'], 3),
+            'at': datetime.now().isoformat()
+        })
+        if len(history) > 20:
+            context['sentiment_history'] = history[-20:]
+        return context
 
     @property
     def last_updated(self):
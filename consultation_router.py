@@ -0,0 +1,303 @@
+"""
+Least-loaded consultation routing.
+
+A consultation goes to the available doctor of its specialization with the
+fewest open (pending) consultations, urgent ones first and then the oldest.
+Everything the router decides on is read from the database when it runs, so
+every app process sees the same queue, availability and loads:
+
+- waiting consultations are the pending rows without a doctor,
+- a doctor's load is the number of pending consultations assigned to them,
+- a doctor is available while `users.available_until` is in the future.
+  Logging in sets it, any request or open dashboard stream from the doctor
+  renews it, logging out clears it. A doctor whose session just ends (or
+  who closed the tab) drops out after CONSULTATION_AVAILABILITY_TTL seconds
+  and their open consultations go back to the queue.
+
+Assignments are made with a conditional UPDATE that only succeeds while the
+consultation is still unassigned and pending and the doctor is below
+CONSULTATION_MAX_OPEN, so two processes (or a doctor answering directly)
+can never both claim one or overfill a doctor. The router works in its own
+sessions and never commits the caller's. A sweep every
+CONSULTATION_SWEEP_INTERVAL seconds routes whatever is still waiting, such
+as consultations submitted while no doctor was available, and expires idle
+doctors.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import request
+from flask_login import current_user, user_logged_in, user_logged_out
+from sqlalchemy import func, select, update
+
+import question_feed
+import startup
+from extensions import db
+from models import Consultation, User
+
+DEFAULT_MAX_OPEN = 10
+DEFAULT_AVAILABILITY_TTL = 1800
+
+
+def _channel(specialization):
+    return specialization or 'general'
+
+
+def _open_count(doctor_id):
+    """Pending consultations assigned to a doctor, as a scalar subquery"""
+    return select(func.count(Consultation.id)).where(
+        Consultation.doctor_id == doctor_id, Consultation.status == 'pending'
+    ).scalar_subquery()
+
+
+def _doctors_of(channel):
+    return (User.role == 'doctor', func.coalesce(User.specialization, 'general') == channel)
+
+
+class ConsultationRouter:
+    def __init__(self, max_open=DEFAULT_MAX_OPEN, availability_ttl=DEFAULT_AVAILABILITY_TTL):
+        self.max_open = max_open
+        self.availability_ttl = availability_ttl
+        self._lock = threading.RLock()
+        self._renewed = {}  # doctor id -> when this process last renewed their availability
+        self._thread = None
+
+    def _session(self):
+        # Never the request's session: committing here must not commit what the caller staged
+        return db.session.session_factory()
+
+    # -------------------------------
+    # 🔹 Doctors
+    # -------------------------------
+    def doctor_available(self, doctor):
+        """Put the doctor in rotation for the next CONSULTATION_AVAILABILITY_TTL seconds"""
+        session = self._session()
+        try:
+            session.execute(update(User).where(User.id == doctor.id).values(
+                available_until=datetime.utcnow() + timedelta(seconds=self.availability_ttl)
+            ))
+            session.commit()
+        finally:
+            session.close()
+        self._renewed[doctor.id] = time.monotonic()
+        return self.dispatch(doctor.specialization)
+
+    def heartbeat(self, doctor):
+        """Renew the availability of a doctor who is using the app, at most every quarter TTL"""
+        renewed = self._renewed.get(doctor.id)
+        if renewed is not None and time.monotonic() - renewed < self.availability_ttl / 4:
+            return []
+        return self.doctor_available(doctor)
+
+    def while_streaming(self, app, doctor, chunks):
+        """Pass a dashboard's SSE stream through, renewing the doctor's availability on its keep-alives"""
+        for chunk in chunks:
+            if chunk.startswith(':'):
+                try:
+                    with app.app_context():
+                        self.heartbeat(doctor)
+                except Exception as e:
+                    print(f"Consultation router heartbeat error: {str(e)}")
+            yield chunk
+
+    def doctor_unavailable(self, doctor):
+        """Take the doctor out of rotation and hand their open consultations to the others"""
+        self._renewed.pop(doctor.id, None)
+        session = self._session()
+        try:
+            session.execute(update(User).where(User.id == doctor.id).values(available_until=None))
+            released = self._release(session, [doctor.id])
+            session.commit()
+        finally:
+            session.close()
+        self._publish_released(_channel(doctor.specialization), released)
+        return self.dispatch(doctor.specialization)
+
+    def available(self, specialization):
+        """{doctor id: open consultations} of the available doctors of a specialization"""
+        session = self._session()
+        try:
+            rows = session.execute(select(User.id, _open_count(User.id)).where(
+                *_doctors_of(_channel(specialization)), User.available_until > datetime.utcnow()
+            )).all()
+            return dict(rows)
+        finally:
+            session.close()
+
+    # -------------------------------
+    # 🔹 Consultations
+    # -------------------------------
+    def submit(self, consultation):
+        """Assign a committed consultation if a doctor has room; returns assignments made"""
+        return self.dispatch(consultation.specialization)
+
+    def completed(self, doctor_id, specialization):
+        """The doctor closed one of their consultations: refill their queue"""
+        return self.dispatch(specialization)
+
+    def dispatch(self, specialization):
+        """Assign waiting consultations of a specialization; returns [(consultation id, doctor id)]"""
+        channel = _channel(specialization)
+        with self._lock:
+            session = self._session()
+            try:
+                released = self._expire(session, channel, datetime.utcnow())
+                assigned = self._dispatch(session, channel)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+        # Core UPDATEs never reach question_feed's session capture, so publish them here
+        self._publish_released(channel, released)
+        for consultation_id, doctor_id in assigned:
+            question_feed.feed.publish(channel, 'consultation.assigned',
+                                       {'id': consultation_id, 'doctor_id': doctor_id})
+        return assigned
+
+    def _release(self, session, doctor_ids):
+        """Put the doctors' pending consultations back in the queue; returns [(consultation id, doctor id)]"""
+        released = []
+        # One doctor at a time: RETURNING only sees the new (NULL) doctor_id
+        for doctor_id in doctor_ids:
+            released += [(consultation_id, doctor_id) for consultation_id in session.execute(
+                update(Consultation).where(
+                    Consultation.doctor_id == doctor_id, Consultation.status == 'pending'
+                ).values(doctor_id=None, assigned_at=None)
+                .returning(Consultation.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()]
+        return released
+
+    def _publish_released(self, channel, released):
+        for consultation_id, doctor_id in released:
+            question_feed.feed.publish(channel, 'consultation.updated', {
+                'id': consultation_id, 'status': 'pending', 'previous_status': 'pending',
+                'doctor_id': None, 'previous_doctor_id': doctor_id
+            })
+
+    def _expire(self, session, channel, now):
+        """Release the consultations of doctors whose availability ran out; returns them"""
+        expired = session.execute(select(User.id).where(
+            *_doctors_of(channel), User.available_until <= now
+        )).scalars().all()
+        if not expired:
+            return []
+        released = self._release(session, expired)
+        session.execute(update(User).where(
+            User.id.in_(expired), User.available_until <= now
+        ).values(available_until=None))
+        return released
+
+    def _dispatch(self, session, channel):
+        now = datetime.utcnow()
+
+        doctors = [(load, doctor_id) for doctor_id, load in session.execute(
+            select(User.id, _open_count(User.id)).where(*_doctors_of(channel), User.available_until > now)
+        ) if load < self.max_open]
+        if not doctors:
+            return []
+        heapq.heapify(doctors)
+
+        waiting = session.execute(
+            select(Consultation.id).where(
+                Consultation.specialization == channel,
+                Consultation.status == 'pending',
+                Consultation.doctor_id.is_(None)
+            ).order_by(Consultation.urgent.desc(), Consultation.created_at.asc())
+            .limit(sum(self.max_open - load for load, _ in doctors))
+        ).scalars().all()
+
+        assigned = []
+        for consultation_id in waiting:
+            if not doctors:
+                break
+            load, doctor_id = heapq.heappop(doctors)
+            claimed = session.execute(
+                update(Consultation).where(
+                    Consultation.id == consultation_id,
+                    Consultation.doctor_id.is_(None),
+                    Consultation.status == 'pending',
+                    _open_count(doctor_id) < self.max_open
+                ).values(doctor_id=doctor_id, assigned_at=now)
+            ).rowcount
+            if claimed:
+                assigned.append((consultation_id, doctor_id))
+                load += 1
+            else:
+                # Answered, or claimed by another process, since it was read: re-read the doctor's load
+                load = session.execute(select(_open_count(doctor_id))).scalar()
+            if load < self.max_open:
+                heapq.heappush(doctors, (load, doctor_id))
+        return assigned
+
+    # -------------------------------
+    # 🔹 Sweep
+    # -------------------------------
+    def sweep(self):
+        """Dispatch every specialization with waiting consultations or expired doctors"""
+        session = self._session()
+        try:
+            now = datetime.utcnow()
+            channels = set(session.execute(select(Consultation.specialization).where(
+                Consultation.status == 'pending', Consultation.doctor_id.is_(None)
+            ).distinct()).scalars())
+            channels |= set(session.execute(select(func.coalesce(User.specialization, 'general')).where(
+                User.role == 'doctor', User.available_until <= now
+            ).distinct()).scalars())
+        finally:
+            session.close()
+        return {channel: self.dispatch(channel) for channel in channels}
+
+    def start_sweeper(self, app, interval):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.sweep()
+                except Exception as e:
+                    print(f"Consultation router sweep error: {str(e)}")
+
+        self._thread = threading.Thread(target=loop, name='consultation-sweep', daemon=True)
+        self._thread.start()
+
+
+router = ConsultationRouter()
+
+
+# -------------------------------
+# 🔹 Availability from login / logout and activity
+# -------------------------------
+def _logged_in(sender, user, **extra):
+    if user.role == 'doctor':
+        router.doctor_available(user)
+
+
+def _logged_out(sender, user, **extra):
+    if user is not None and getattr(user, 'role', None) == 'doctor':
+        router.doctor_unavailable(user)
+
+
+def init_app(app):
+    router.max_open = app.config.get('CONSULTATION_MAX_OPEN', DEFAULT_MAX_OPEN)
+    router.availability_ttl = app.config.get('CONSULTATION_AVAILABILITY_TTL', DEFAULT_AVAILABILITY_TTL)
+    user_logged_in.connect(_logged_in, app)
+    user_logged_out.connect(_logged_out, app)
+
+    @app.before_request
+    def _doctor_heartbeat():
+        if request.endpoint != 'static' and current_user.is_authenticated and current_user.role == 'doctor':
+            router.heartbeat(current_user)
+
+    interval = app.config.get('CONSULTATION_SWEEP_INTERVAL')
+    if interval and startup.serving():
+        router.start_sweeper(app, interval)
+    return router
@@ -0,0 +1,131 @@
+"""
+Token-budgeted conversation window for the LLM prompt.
+
+The most recent turns are kept verbatim as long as they fit in the token
+budget. Turns that fall out of the window are folded, once, into a rolling
+summary stored on the Conversation (`summary` / `summary_upto`), so prompt
+size stays flat no matter how long the conversation gets.
+"""
+import math
+import re
+
+from models import ChatMessage
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s')
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate without a tokenizer: ~4 characters per token for
+    Latin text, but never fewer tokens than words (Devanagari is denser).
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), len(text.split()))
+
+
+def message_tokens(content):
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _summary_line(message, max_chars):
+    """One condensed line for a message leaving the window"""
+    text = ' '.join(message.content.split())
+    first_sentence = _SENTENCE_END.split(text, 1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars - 3].rstrip() + '...'
+    speaker = 'Assistant' if message.is_bot else 'User'
+    return f"{speaker}: {first_sentence}"
+
+
+class ContextWindow:
+    """Selects recent messages within a token budget and maintains the rolling summary"""
+
+    def __init__(self, budget=1500, max_fetch=50, summary_max_chars=1200,
+                 user_line_chars=160, bot_line_chars=100):
+        self.budget = budget
+        self.max_fetch = max_fetch
+        self.summary_max_chars = summary_max_chars
+        self.user_line_chars = user_line_chars
+        self.bot_line_chars = bot_line_chars
+
+    def select(self, conversation, pending=(), history=None):
+        """
+        Newest messages that fit in the budget, in chronological order, and
+        whether older messages were left out of the window. `pending` are
+        messages staged but not flushed yet (oldest first); they are the newest.
+        `history` is the saved tail of the conversation (oldest first, at most
+        max_fetch) when the caller already has it, e.g. from the state cache.
+        """
+        # Newest first, bounded: the budget is always exhausted well before max_fetch
+        if history is None:
+            saved = ChatMessage.query.filter_by(
+                conversation_id=conversation.conversation_id
+            ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(self.max_fetch).all()
+        else:
+            saved = list(reversed(history))[:self.max_fetch]
+        newest = list(reversed(pending)) + saved
+
+        budget = self.budget - (estimate_tokens(conversation.summary) if conversation.summary else 0)
+        selected = []
+        used = 0
+        for message in newest:
+            cost = message_tokens(message.content)
+            # The newest message is always kept, even if it alone exceeds the budget
+            if selected and used + cost > budget:
+                break
+            selected.append(message)
+            used += cost
+        selected.reverse()
+
+        truncated = len(selected) < len(newest) or len(newest) >= self.max_fetch
+        return selected, truncated
+
+    def build(self, conversation, fold=True):
+        """
+        Return (recent_messages, summary) for the prompt. `recent_messages` is in
+        chronological order. Updates conversation.summary in the session when
+        messages have left the window; the caller commits.
+        """
+        selected, truncated = self.select(conversation)
+        if fold and truncated and selected:
+            self._fold_older(conversation, selected[0].id)
+        return selected, conversation.summary
+
+    def needs_fold(self, conversation, window, truncated):
+        """True if messages that left `window` have not been folded into the summary yet"""
+        if not truncated:
+            return False
+        first_id = next((m.id for m in window if m.id is not None), None)
+        # Only unsaved messages fit: everything saved before them has left the window
+        return first_id is None or first_id - 1 > (conversation.summary_upto or 0)
+
+    def _fold_older(self, conversation, first_kept_id):
+        """Fold messages between the last summarized id and the window into the summary"""
+        summary_upto = conversation.summary_upto or 0
+        if first_kept_id <= summary_upto + 1:
+            return
+
+        dropped = ChatMessage.query.filter(
+            ChatMessage.conversation_id == conversation.conversation_id,
+            ChatMessage.id > summary_upto,
+            ChatMessage.id < first_kept_id
+        ).order_by(ChatMessage.id.asc()).all()
+        # Everything before the window is covered from now on, even ids from other conversations
+        conversation.summary_upto = first_kept_id - 1
+        if not dropped:
+            return
+
+        lines = conversation.summary.split('\n') if conversation.summary else []
+        for message in dropped:
+            max_chars = self.bot_line_chars if message.is_bot else self.user_line_chars
+            lines.append(_summary_line(message, max_chars))
+
+        # Keep the summary itself bounded by forgetting the oldest lines
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self.summary_max_chars:
+            lines.pop(0)
+
+        conversation.summary = '\n'.join(lines)
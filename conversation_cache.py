@@ -0,0 +1,342 @@
+"""
+Per-process cache of conversation state.
+
+A chat turn used to load the Conversation row, parse its JSON context, load
+the recent messages and serialize the context back. The cache keeps the
+parsed context, summary and last N messages of active conversations in an
+LRU with an idle TTL. Context changes are written back by a background
+flusher in coalesced batches (write-behind); messages themselves are still
+saved by the turn.
+
+Every write to a conversation bumps `Conversation.version`. A turn checks the
+version with one scalar query, so changes made by other workers or by
+background jobs invalidate the cached copy. Local context changes that have
+not been flushed yet are merged into the reloaded state rather than lost.
+Background jobs that change the context of a conversation cached in their
+process (topics and sentiment from chat.enrich) go through update_context(),
+so they don't invalidate it either.
+"""
+import atexit
+import copy
+import json
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+
+from extensions import db
+from models import ChatMessage, Conversation
+from startup import serving
+
+MAX_SYMPTOMS = 10
+MAX_TOPICS = 5
+MAX_SENTIMENTS = 20
+
+
+def merge_symptoms(base, extra):
+    """Symptoms of `base` followed by the new ones from `extra`, capped like the context"""
+    symptoms = list(base)
+    for symptom in extra:
+        if symptom not in symptoms:
+            symptoms.append(symptom)
+    return symptoms[-MAX_SYMPTOMS:]
+
+
+def merge_context(base, local):
+    """`base` (the stored context) plus what `local` added: symptoms, topics and sentiment readings"""
+    merged = copy.deepcopy(base)
+    merged['symptoms'] = merge_symptoms(base.get('symptoms', []), local.get('symptoms', []))
+
+    topics = list(base.get('topics', []))
+    topics += [topic for topic in local.get('topics', []) if topic not in topics]
+    if topics or 'topics' in base:
+        merged['topics'] = topics[-MAX_TOPICS:]
+
+    sentiments = list(base.get('sentiment_history', []))
+    seen = {entry.get('message_id') for entry in sentiments}
+    sentiments += [entry for entry in local.get('sentiment_history', []) if entry.get('message_id') not in seen]
+    if sentiments or 'sentiment_history' in base:
+        merged['sentiment_history'] = sorted(sentiments, key=lambda entry: entry.get('at', ''))[-MAX_SENTIMENTS:]
+    return merged
+
+
+def _snapshot(message):
+    return SimpleNamespace(id=message.id, is_bot=message.is_bot, content=message.content)
+
+
+class ConversationState:
+    """Cached, already-parsed view of one conversation"""
+
+    def __init__(self, conversation, recent, max_recent):
+        self.conversation_id = conversation.conversation_id
+        self.user_id = conversation.user_id
+        self.language = conversation.language
+        self.context = conversation.get_context()
+        self.summary = conversation.summary
+        self.summary_upto = conversation.summary_upto
+        self.version = conversation.version
+        self.recent = deque((_snapshot(m) for m in recent), maxlen=max_recent)
+        self.dirty = False   # context/language changed locally, not flushed yet
+        self.stale = False   # the row changed elsewhere; reload before use
+        self.last_access = time.monotonic()
+
+
+class ConversationCache:
+    """LRU of ConversationState with idle TTL, version checks and a write-behind flusher"""
+
+    def __init__(self, max_entries=512, ttl=1800, max_recent=50, flush_interval=1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_recent = max_recent
+        self.flush_interval = flush_interval
+        self.stats = Counter()
+        self._states = OrderedDict()
+        self._lock = threading.RLock()
+        self._flusher = None
+
+    def configure(self, max_entries=None, ttl=None, max_recent=None, flush_interval=None):
+        self.max_entries = max_entries or self.max_entries
+        self.ttl = ttl or self.ttl
+        self.max_recent = max_recent or self.max_recent
+        self.flush_interval = flush_interval or self.flush_interval
+
+    # -------------------------------
+    # 🔹 Reads
+    # -------------------------------
+    def get(self, conversation_id, user_id):
+        """
+        State of `conversation_id` if it belongs to `user_id`, else None.
+        Costs one scalar query when the cached copy is current.
+        """
+        version = db.session.execute(
+            select(Conversation.version).where(
+                Conversation.conversation_id == conversation_id,
+                Conversation.user_id == user_id
+            )
+        ).scalar()
+        if version is None:
+            return None
+
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is not None and state.version == version and not state.stale:
+                state.last_access = time.monotonic()
+                self._states.move_to_end(conversation_id)
+                self.stats['hit'] += 1
+                return state
+            self.stats['invalidated' if state is not None else 'miss'] += 1
+
+        state = self._load(conversation_id, previous=state)
+        with self._lock:
+            self._states[conversation_id] = state
+            self._states.move_to_end(conversation_id)
+        return state
+
+    def _load(self, conversation_id, previous=None):
+        """Fresh state from the database, keeping unflushed local changes of `previous`"""
+        conversation = Conversation.query.filter_by(conversation_id=conversation_id).first()
+        recent = ChatMessage.query.filter_by(
+            conversation_id=conversation_id
+        ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(self.max_recent).all()
+        state = ConversationState(conversation, reversed(recent), self.max_recent)
+
+        if previous is not None and previous.dirty:
+            state.context = merge_context(state.context, previous.context)
+            state.language = previous.language
+            state.dirty = True
+        return state
+
+    def new_state(self, conversation):
+        """State for a conversation created by the current turn (not cached until committed)"""
+        return ConversationState(conversation, [], self.max_recent)
+
+    def snapshot(self, state):
+        """Private copy of `state` for one turn; the cached state may change under it"""
+        with self._lock:
+            return SimpleNamespace(
+                conversation_id=state.conversation_id,
+                language=state.language,
+                context=copy.deepcopy(state.context),
+                summary=state.summary,
+                summary_upto=state.summary_upto,
+                recent=list(state.recent)
+            )
+
+    def peek_context(self, conversation):
+        """
+        Context of a just-loaded Conversation row including this process's
+        unflushed changes, or None when nothing cached adds to the row.
+        """
+        with self._lock:
+            state = self._states.get(conversation.conversation_id)
+            if state is None:
+                return None
+            if not state.stale and state.version == conversation.version:
+                return copy.deepcopy(state.context)
+            # The row is newer than the cached copy; only unflushed local changes still count
+            if state.dirty:
+                return merge_context(conversation.get_context(), state.context)
+            return None
+
+    # -------------------------------
+    # 🔹 Writes
+    # -------------------------------
+    def touch(self, session, conversation_id):
+        """Bump the version (and last_updated) in `session`'s transaction; returns the new version"""
+        return session.execute(
+            update(Conversation)
+            .where(Conversation.conversation_id == conversation_id)
+            .values(version=Conversation.version + 1, last_updated=datetime.utcnow())
+            .returning(Conversation.version)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+
+    def commit_turn(self, conversation_id, version, messages, symptoms=(), language=None, state=None):
+        """Apply a committed turn to the cached state; context changes are flushed later"""
+        with self._lock:
+            state = state or self._states.get(conversation_id)
+            if state is None:
+                return
+            # Anything but our own bump means another writer got in between
+            if state.version is not None and version != state.version + 1:
+                state.stale = True
+            state.version = version
+
+            merged = merge_symptoms(state.context.get('symptoms', []), symptoms)
+            if merged != state.context.get('symptoms', []):
+                state.context['symptoms'] = merged
+                state.dirty = True
+            if language and language != state.language:
+                state.language = language
+                state.dirty = True
+            state.recent.extend(_snapshot(m) for m in messages)
+
+            state.last_access = time.monotonic()
+            self._states[conversation_id] = state
+            self._states.move_to_end(conversation_id)
+
+    def update_context(self, conversation_id, change):
+        """
+        Apply `change(context) -> context` to a cached conversation and leave
+        the write to the flusher. Returns False if the conversation isn't cached
+        here, in which case the caller writes the row itself.
+        """
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is None:
+                return False
+            state.context = change(state.context)
+            state.dirty = True
+            return True
+
+    def flush(self):
+        """Write dirty contexts back in one transaction; returns how many were written"""
+        with self._lock:
+            stale = [s for s in self._states.values() if s.dirty and s.stale]
+        # Lost a race with another writer: merge with the current row before writing
+        for state in stale:
+            fresh = self._load(state.conversation_id, previous=state)
+            with self._lock:
+                if self._states.get(state.conversation_id) is state:
+                    self._states[state.conversation_id] = fresh
+
+        with self._lock:
+            batch = [(s, s.version, json.dumps(s.context), s.language)
+                     for s in self._states.values() if s.dirty and not s.stale]
+            for state, *_ in batch:
+                state.dirty = False
+        if not batch:
+            self._evict()
+            return 0
+
+        results = []
+        try:
+            for state, version, context_data, language in batch:
+                new_version = db.session.execute(
+                    update(Conversation)
+                    .where(Conversation.conversation_id == state.conversation_id,
+                           Conversation.version == version)
+                    .values(context_data=context_data, language=language, version=Conversation.version + 1)
+                    .returning(Conversation.version)
+                    .execution_options(synchronize_session=False)
+                ).scalar()
+                results.append((state, version, new_version))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error flushing conversation state: {str(e)}")
+            with self._lock:
+                for state, *_ in batch:
+                    state.dirty = True
+            return 0
+
+        with self._lock:
+            for state, version, new_version in results:
+                if new_version is None:
+                    state.dirty = state.stale = True
+                    self.stats['conflict'] += 1
+                elif state.version == version:
+                    state.version = new_version
+            self.stats['flushed'] += len(results)
+        self._evict()
+        return len(results)
+
+    def _evict(self):
+        """Drop idle and least recently used states; dirty ones wait for their flush"""
+        now = time.monotonic()
+        with self._lock:
+            for conversation_id, state in list(self._states.items()):
+                if not state.dirty and now - state.last_access > self.ttl:
+                    del self._states[conversation_id]
+            for conversation_id, state in list(self._states.items()):
+                if len(self._states) <= self.max_entries:
+                    break
+                if not state.dirty:
+                    del self._states[conversation_id]
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._states),
+                        dirty=sum(1 for s in self._states.values() if s.dirty))
+
+    # -------------------------------
+    # 🔹 Background flusher
+    # -------------------------------
+    def start_flusher(self, app):
+        if self._flusher is not None:
+            return
+
+        def flush_in_context():
+            with app.app_context():
+                self.flush()
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    flush_in_context()
+                except Exception as e:
+                    print(f"Conversation state flusher error: {str(e)}")
+
+        self._flusher = threading.Thread(target=loop, name='conversation-flusher', daemon=True)
+        self._flusher.start()
+        # Don't lose the last second of context changes on a clean shutdown
+        atexit.register(flush_in_context)
+
+
+state_cache = ConversationCache()
+
+
+def init_app(app):
+    """Size the cache from the config and start the write-behind flusher"""
+    state_cache.configure(
+        max_entries=app.config.get('CONVERSATION_CACHE_SIZE'),
+        ttl=app.config.get('CONVERSATION_CACHE_TTL'),
+        flush_interval=app.config.get('CONVERSATION_FLUSH_INTERVAL')
+    )
+    # CLI commands (`flask db upgrade`, ...) must not write conversations in the background
+    if serving():
+        state_cache.start_flusher(app)
@@ -0,0 +1,117 @@
+"""
+In-memory directory of doctors, grouped by specialization.
+
+The patient dashboard and the booking forms only need (id, username,
+specialization) of every doctor. The directory loads just those columns once
+and keeps them, with an ETag for the JSON endpoint, until a doctor is added
+or a doctor's name, specialization or role changes: session events notice
+such changes at flush time and drop the directory once the transaction
+commits, whichever route or script made them. Other processes pick the
+change up after DOCTOR_DIRECTORY_TTL seconds.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import User
+
+# Changes to these columns of a doctor change the directory
+DIRECTORY_COLUMNS = ('username', 'specialization', 'role')
+
+
+class DoctorDirectory:
+    """Cached, specialization-grouped doctor list"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry = None  # (groups, etag, loaded_at)
+        self._generation = 0
+
+    def _load(self):
+        rows = db.session.query(User.id, User.username, User.specialization).filter(
+            User.role == 'doctor'
+        ).order_by(User.specialization, User.username, User.id).all()
+
+        groups = {}
+        for doctor_id, username, specialization in rows:
+            groups.setdefault(specialization or 'general', []).append(
+                {'id': doctor_id, 'username': username, 'specialization': specialization}
+            )
+        etag = hashlib.sha1(json.dumps(groups, sort_keys=True).encode('utf-8')).hexdigest()
+        return groups, etag
+
+    def snapshot(self):
+        """({specialization: [doctor, ...]}, etag); the lists must not be modified"""
+        with self._lock:
+            entry, generation = self._entry, self._generation
+        if entry is not None and time.monotonic() - entry[2] < self.ttl:
+            return entry[0], entry[1]
+
+        groups, etag = self._load()
+        with self._lock:
+            # Don't keep a result that an invalidation overtook while loading
+            if generation == self._generation:
+                self._entry = (groups, etag, time.monotonic())
+        return groups, etag
+
+    def grouped(self):
+        return self.snapshot()[0]
+
+    def doctors(self, specialization=None):
+        """Flat list of doctors, optionally of one specialization"""
+        groups = self.grouped()
+        if specialization is not None:
+            return list(groups.get(specialization, []))
+        return [doctor for doctors in groups.values() for doctor in doctors]
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            self._generation += 1
+
+
+directory = DoctorDirectory()
+
+
+# -------------------------------
+# 🔹 Invalidation
+# -------------------------------
+def _changes_directory(obj, is_new):
+    if not isinstance(obj, User):
+        return False
+    if is_new:
+        return obj.role == 'doctor'
+    state = inspect(obj)
+    changed = any(state.attrs[column].history.has_changes() for column in DIRECTORY_COLUMNS)
+    # A role change away from doctor still has to drop the old entry
+    return changed and (obj.role == 'doctor' or 'doctor' in state.attrs.role.history.deleted)
+
+
+@event.listens_for(Session, 'before_flush')
+def _note_doctor_changes(session, flush_context, instances):
+    if any(_changes_directory(obj, True) for obj in session.new) or \
+            any(_changes_directory(obj, False) for obj in session.dirty) or \
+            any(isinstance(obj, User) and obj.role == 'doctor' for obj in session.deleted):
+        session.info['doctor_directory_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('doctor_directory_changed', False):
+        directory.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('doctor_directory_changed', None)
+
+
+def init_app(app):
+    directory.ttl = app.config.get('DOCTOR_DIRECTORY_TTL', directory.ttl)
+    return directory
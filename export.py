@@ -0,0 +1,339 @@
+"""
+Streaming compliance export of conversations and chat messages.
+
+Records are produced section by section — conversations, live messages,
+archived messages, legacy chat_history rows and archived chat_history rows —
+each in id order, as NDJSON lines or CSV rows. Every record carries a
+`cursor`; passing the cursor of the last record received resumes the export
+right after it.
+
+Rows are read in windows of `chunk` rows, each in its own short read
+transaction that is closed before anything is written out. Memory stays
+bounded by one window and a slow client never holds a lock that would block
+chat writes.
+"""
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+import click
+from sqlalchemy import select
+
+from archive import store
+from extensions import db
+from models import ChatHistory, ChatMessage, Conversation
+
+TYPES = ('conversation', 'message', 'chat_history')
+SECTIONS = ('conversations', 'messages', 'archived_messages', 'chat_history', 'archived_chat_history')
+FORMATS = ('ndjson', 'csv')
+DEFAULT_CHUNK = 1000
+BLOCK_SIZE = 64 * 1024
+
+CSV_FIELDS = [
+    'type', 'cursor', 'id', 'conversation_id', 'user_id', 'created_at', 'last_updated', 'language',
+    'is_bot', 'intent', 'entities', 'content', 'message', 'response', 'context_data'
+]
+
+
+def encode_cursor(section, key):
+    raw = json.dumps([section] + list(key))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(section, key) from an export cursor; raises ValueError if it is malformed"""
+    try:
+        section, *key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if section not in SECTIONS:
+        raise ValueError('Invalid cursor')
+    return section, key
+
+
+# -------------------------------
+# 🔹 Sections
+# -------------------------------
+def _windows(query, id_column, after_id, chunk):
+    """Rows of `query` after `after_id` as (id, record), one short read transaction per window"""
+    while True:
+        rows = [(row.id, row.to_dict())
+                for row in query.filter(id_column > after_id).order_by(id_column.asc()).limit(chunk)]
+        db.session.rollback()
+        yield from rows
+        if len(rows) < chunk:
+            return
+        after_id = rows[-1][0]
+
+
+def _conversations(filters):
+    query = Conversation.query
+    if filters['user_id'] is not None:
+        query = query.filter(Conversation.user_id == filters['user_id'])
+    if filters['language']:
+        query = query.filter(Conversation.language == filters['language'])
+    # Conversations active at any point in the range
+    if filters['since']:
+        query = query.filter(Conversation.last_updated >= filters['since'])
+    if filters['until']:
+        query = query.filter(Conversation.created_at < filters['until'])
+    return query
+
+
+def _owned_conversation_ids(filters):
+    """Subquery of conversation ids matching the user and language filters, or None"""
+    if filters['user_id'] is None and not filters['language']:
+        return None
+    ids = select(Conversation.conversation_id)
+    if filters['user_id'] is not None:
+        ids = ids.where(Conversation.user_id == filters['user_id'])
+    if filters['language']:
+        ids = ids.where(Conversation.language == filters['language'])
+    return ids
+
+
+def _conversation_section(filters, key, chunk):
+    after_id = key[0] if key else 0
+    for row_id, record in _windows(_conversations(filters), Conversation.id, after_id, chunk):
+        yield [row_id], record
+
+
+def _message_section(filters, key, chunk):
+    query = ChatMessage.query
+    owned = _owned_conversation_ids(filters)
+    if owned is not None:
+        query = query.filter(ChatMessage.conversation_id.in_(owned))
+    if filters['since']:
+        query = query.filter(ChatMessage.created_at >= filters['since'])
+    if filters['until']:
+        query = query.filter(ChatMessage.created_at < filters['until'])
+
+    after_id = key[0] if key else 0
+    for row_id, record in _windows(query, ChatMessage.id, after_id, chunk):
+        yield [row_id], record
+
+
+def _archived_message_section(filters, key, chunk):
+    """Archived messages, conversation by conversation; the key is (conversation row id, message id)"""
+    archive = store()
+    after_conversation, after_message = key if key else (0, 0)
+    query = Conversation.query.with_entities(
+        Conversation.id, Conversation.conversation_id, Conversation.archive_path
+    ).filter(Conversation.archive_path.isnot(None))
+    if filters['user_id'] is not None:
+        query = query.filter(Conversation.user_id == filters['user_id'])
+    if filters['language']:
+        query = query.filter(Conversation.language == filters['language'])
+
+    # Include the conversation the cursor stopped in
+    after_id = after_conversation - 1 if after_message else after_conversation
+    while True:
+        conversations = query.filter(Conversation.id > after_id).order_by(Conversation.id.asc()).limit(chunk).all()
+        db.session.rollback()
+        for conversation in conversations:
+            message_id = after_message if conversation.id == after_conversation else 0
+            while True:
+                rows = archive.scan(conversation.archive_path, 'messages', after_id=message_id, limit=chunk,
+                                    since=filters['since'], until=filters['until'],
+                                    conversation_id=conversation.conversation_id)
+                for message_id, record in rows:
+                    yield [conversation.id, message_id], record
+                if len(rows) < chunk:
+                    break
+        if len(conversations) < chunk:
+            return
+        after_id = conversations[-1].id
+
+
+def _chat_history_section(filters, key, chunk):
+    query = ChatHistory.query
+    if filters['user_id'] is not None:
+        query = query.filter(ChatHistory.user_id == filters['user_id'])
+    if filters['since']:
+        query = query.filter(ChatHistory.created_at >= filters['since'])
+    if filters['until']:
+        query = query.filter(ChatHistory.created_at < filters['until'])
+
+    after_id = key[0] if key else 0
+    for row_id, record in _windows(query, ChatHistory.id, after_id, chunk):
+        yield [row_id], record
+
+
+def _archived_chat_history_section(filters, key, chunk):
+    """Archived chat_history rows, file by file; the key is (file name, row id)"""
+    archive = store()
+    after_name, after_id = key if key else ('', 0)
+    equals = {'user_id': filters['user_id']} if filters['user_id'] is not None else {}
+    for name in archive.files():
+        if name < after_name:
+            continue
+        row_id = after_id if name == after_name else 0
+        while True:
+            rows = archive.scan(name, 'chat_history', after_id=row_id, limit=chunk,
+                                since=filters['since'], until=filters['until'], **equals)
+            for row_id, record in rows:
+                yield [name, row_id], record
+            if len(rows) < chunk:
+                break
+
+
+# Section -> (record type, reader)
+_READERS = {
+    'conversations': ('conversation', _conversation_section),
+    'messages': ('message', _message_section),
+    'archived_messages': ('message', _archived_message_section),
+    'chat_history': ('chat_history', _chat_history_section),
+    'archived_chat_history': ('chat_history', _archived_chat_history_section),
+}
+
+
+def records(user_id=None, since=None, until=None, language=None, types=TYPES, cursor=None, chunk=DEFAULT_CHUNK):
+    """
+    Export records as dicts with a `type` and a resume `cursor`. chat_history
+    rows have no language, so they are left out when filtering by language.
+    """
+    filters = {'user_id': user_id, 'since': since, 'until': until, 'language': language}
+    start_section, start_key = decode_cursor(cursor) if cursor else (SECTIONS[0], None)
+
+    for section in SECTIONS[SECTIONS.index(start_section):]:
+        record_type, reader = _READERS[section]
+        if record_type not in types or (record_type == 'chat_history' and language):
+            continue
+        key = start_key if section == start_section else None
+        for row_key, record in reader(filters, key, chunk):
+            record['type'] = record_type
+            record['cursor'] = encode_cursor(section, row_key)
+            yield record
+
+
+# -------------------------------
+# 🔹 Formats
+# -------------------------------
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def ndjson_lines(rows):
+    for record in rows:
+        yield json.dumps({k: _value(v) for k, v in record.items()}, default=str) + '\n'
+
+
+def csv_lines(rows, header=True):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    for record in rows:
+        writer.writerow({k: _value(v) for k, v in record.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def lines(rows, fmt, header=True):
+    return csv_lines(rows, header=header) if fmt == 'csv' else ndjson_lines(rows)
+
+
+def blocks(text_lines, size=BLOCK_SIZE):
+    """Join lines into blocks of about `size` characters, so the stream isn't one write per row"""
+    block = []
+    length = 0
+    for line in text_lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(block)
+            block = []
+            length = 0
+    if block:
+        yield ''.join(block)
+
+
+def _last_ndjson_line(f):
+    """(offset after the last complete line, that line); reads backwards from the end"""
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    tail = b''
+    while position > 0 and tail.count(b'\n') < 2:
+        step = min(BLOCK_SIZE, position)
+        position -= step
+        f.seek(position)
+        tail = f.read(step) + tail
+    end = tail.rfind(b'\n') + 1
+    if not end:
+        return 0, None
+    return position + end, tail[:end - 1].rsplit(b'\n', 1)[-1]
+
+
+def _last_csv_row(f):
+    """(offset after the last complete row, that row); quoted fields may span lines"""
+    f.seek(0)
+    end, last = 0, None
+    offset, row, quotes = 0, b'', 0
+    for line in f:
+        offset += len(line)
+        row += line
+        quotes += line.count(b'"')
+        # A row ends at a newline outside quotes; escaped quotes ("") keep the count even
+        if line.endswith(b'\n') and quotes % 2 == 0:
+            end, last = offset, row
+            row, quotes = b'', 0
+    return end, last
+
+
+def last_cursor(path, fmt):
+    """
+    Cursor of the last complete record in an export file, after cutting off
+    a partially written record. None if the file has no records yet.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb+') as f:
+        end, last = _last_csv_row(f) if fmt == 'csv' else _last_ndjson_line(f)
+        f.truncate(end)
+    if last is None:
+        return None
+
+    if fmt == 'csv':
+        row = next(csv.reader(io.StringIO(last.decode('utf-8'), newline='')), None)
+        if not row or row == CSV_FIELDS:
+            return None
+        return row[CSV_FIELDS.index('cursor')]
+    return json.loads(last)['cursor']
+
+
+def init_app(app):
+    @app.cli.command('export-chats')
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default='ndjson')
+    @click.option('--output', '-o', default='-', help='Output file (default: stdout).')
+    @click.option('--user-id', type=int, default=None)
+    @click.option('--since', type=click.DateTime(), default=None, help='Only records from this time (UTC).')
+    @click.option('--until', type=click.DateTime(), default=None, help='Only records before this time (UTC).')
+    @click.option('--language', default=None)
+    @click.option('--type', 'types', multiple=True, type=click.Choice(TYPES), help='Record type (repeatable; default: all).')
+    @click.option('--cursor', default=None, help='Resume after this cursor.')
+    @click.option('--resume', is_flag=True, help='Continue an interrupted export into --output.')
+    @click.option('--chunk', type=int, default=DEFAULT_CHUNK, help='Rows per read.')
+    def export_chats_command(fmt, output, user_id, since, until, language, types, cursor, resume, chunk):
+        """Stream conversations and chat messages as NDJSON or CSV."""
+        if resume:
+            if output == '-':
+                raise click.UsageError('--resume needs --output')
+            cursor = last_cursor(output, fmt) or cursor
+        appending = resume and os.path.exists(output) and os.path.getsize(output) > 0
+        rows = records(user_id=user_id, since=since, until=until, language=language,
+                       types=types or TYPES, cursor=cursor, chunk=chunk)
+
+        to_stdout = output == '-'
+        out = click.get_text_stream('stdout') if to_stdout else open(output, 'a' if appending else 'w',
+                                                                      encoding='utf-8', newline='')
+        try:
+            for block in blocks(lines(rows, fmt, header=not appending)):
+                out.write(block)
+                out.flush()
+        finally:
+            if not to_stdout:
+                out.close()
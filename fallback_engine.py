@@ -0,0 +1,235 @@
+"""
+Table-driven fallback responses for the chatbot.
+
+Answers used when the LLM is unavailable are compiled once from
+NewData/FallbackResponses.json into a flat dictionary keyed by
+(language, intent, canonical symptom). Symptoms that have no hand-written
+answer get one generated from the remedies in static/wholeData.json and
+NewData/HerbsData.json, so every lookup at request time is a dict access.
+"""
+import json
+import re
+
+# Intents whose answer depends on the symptoms mentioned
+SYMPTOM_INTENTS = ('symptom_report', 'medicine_inquiry')
+
+# Devanagari vowel signs are not \w, so word boundaries have to include the block
+_WORD_CHARS = r'\w\u0900-\u097F'
+
+
+def canonical_symptom(symptom, aliases):
+    """Normalised symptom name, with known aliases (Hinglish, Devanagari, plurals) resolved"""
+    symptom = ' '.join(symptom.lower().replace('_', ' ').split())
+    return aliases.get(symptom, symptom)
+
+
+def _unique(values):
+    seen = set()
+    result = []
+    for value in values:
+        key = value.lower()
+        if value and key not in seen:
+            seen.add(key)
+            result.append(value)
+    return result
+
+
+class FallbackEngine:
+    """Precompiled (language, intent, symptom) -> response table"""
+
+    def __init__(self, table, diseases=(), herbs=()):
+        self.default_language = table.get('default_language', 'en')
+        self.max_symptoms = table.get('max_symptoms', 3)
+        self.max_remedies = table.get('max_remedies', 4)
+        self.aliases = {alias.lower(): canonical for alias, canonical in table.get('aliases', {}).items()}
+
+        self.languages = set(table['languages'])
+        self.names = {}       # (language, symptom) -> display name
+        self.templates = {}   # (language, template) -> format string
+        self.responses = {}   # (language, intent, symptom or None) -> response
+
+        remedies = self._build_remedy_index(diseases, herbs)
+        vocabulary = set(remedies)
+
+        for language, spec in table['languages'].items():
+            for symptom, name in table.get('symptom_names', {}).get(language, {}).items():
+                self.names[(language, symptom)] = name
+            for name, template in spec['templates'].items():
+                self.templates[(language, name)] = template
+            for intent, response in spec['intents'].items():
+                self.responses[(language, intent, None)] = response
+            for intent in SYMPTOM_INTENTS:
+                for symptom, response in spec.get(intent, {}).items():
+                    self.responses[(language, intent, symptom)] = response
+                    vocabulary.add(symptom)
+
+        for language in self.languages:
+            for symptom in vocabulary:
+                self._compile_symptom(language, symptom, remedies.get(symptom))
+
+        self.vocabulary = vocabulary
+        terms = sorted(vocabulary | set(self.aliases), key=len, reverse=True)
+        self._matcher = re.compile(
+            r'(?<![' + _WORD_CHARS + r'])(' + '|'.join(re.escape(t) for t in terms) + r')(?![' + _WORD_CHARS + r'])'
+        )
+
+    @classmethod
+    def from_files(cls, table_path, diseases_path=None, herbs_path=None):
+        with open(table_path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        diseases, herbs = [], []
+        if diseases_path:
+            with open(diseases_path, 'r', encoding='utf-8') as f:
+                diseases = json.load(f)
+        if herbs_path:
+            with open(herbs_path, 'r', encoding='utf-8') as f:
+                herbs = json.load(f)
+        return cls(table, diseases, herbs)
+
+    # -------------------------------
+    # 🔹 Compilation
+    # -------------------------------
+    def canonical(self, symptom):
+        return canonical_symptom(symptom, self.aliases)
+
+    def _build_remedy_index(self, diseases, herbs):
+        """canonical symptom -> {'ayurvedic': [...], 'treatments': [...], 'herbs': [(name, hindi_name)]}"""
+        index = {}
+
+        def entry(symptom):
+            return index.setdefault(self.canonical(symptom), {'ayurvedic': [], 'treatments': [], 'herbs': []})
+
+        # wholeData has one record per (disease, age group, gender); merge them
+        for disease in diseases:
+            remedies = entry(disease['name'])
+            remedies['ayurvedic'].extend(disease.get('ayurvedicRemedies') or [])
+            remedies['treatments'].extend(disease.get('remedy') or [])
+
+        for herb in herbs:
+            for use in herb.get('usedFor', []):
+                if use.get('disease'):
+                    entry(use['disease'])['herbs'].append((herb['name'], herb.get('hindiName') or herb['name']))
+
+        for remedies in index.values():
+            remedies['ayurvedic'] = _unique(remedies['ayurvedic'])
+            remedies['treatments'] = _unique(remedies['treatments'])
+        return index
+
+    def _remedy_list(self, language, remedies):
+        herbs = [hindi if language == 'hi' else name for name, hindi in remedies['herbs']]
+        return _unique(remedies['ayurvedic'] + [h.capitalize() for h in herbs])[:self.max_remedies]
+
+    def _compile_symptom(self, language, symptom, remedies):
+        """Fill in generated answers for a symptom that has no hand-written one"""
+        if not remedies:
+            return
+        remedy_list = self._remedy_list(language, remedies)
+        if not remedy_list:
+            return
+        separator = self.templates[(language, 'separator')]
+        values = {
+            'symptom': self.display_name(language, symptom),
+            'remedies': separator.join(remedy_list),
+            'treatments': separator.join(remedies['treatments'][:self.max_remedies])
+        }
+
+        self.responses.setdefault(
+            (language, 'symptom_report', symptom),
+            self.templates[(language, 'symptom_remedies')].format(**values)
+        )
+        template = 'medicine_remedies' if remedies['treatments'] else 'medicine_herbs'
+        self.responses.setdefault(
+            (language, 'medicine_inquiry', symptom),
+            self.templates[(language, template)].format(**values)
+        )
+
+    # -------------------------------
+    # 🔹 Lookup
+    # -------------------------------
+    def display_name(self, language, symptom):
+        return self.names.get((language, symptom), symptom)
+
+    def match_symptoms(self, text):
+        """Canonical symptoms mentioned in `text`, in order of appearance"""
+        return _unique([self.canonical(m) for m in self._matcher.findall(text.lower())])
+
+    def respond(self, intent, symptoms, previous_symptoms, language, knowledge=None):
+        """
+        Build the fallback answer. `symptoms` are the ones in the current message,
+        `previous_symptoms` the ones remembered from earlier turns. `knowledge` is an
+        optional list of retrieved passages ({'title', 'text'}) used when the table
+        has no specific answer.
+        """
+        if language not in self.languages:
+            language = self.default_language
+
+        current = _unique([self.canonical(s) for s in symptoms])
+        previous = [s for s in _unique([self.canonical(s) for s in previous_symptoms]) if s not in current]
+
+        if intent == 'symptom_report':
+            return self._symptom_report(language, current, previous, knowledge)
+        if intent == 'medicine_inquiry':
+            return self._medicine_inquiry(language, current + previous, knowledge)
+
+        response = self.responses.get((language, intent, None))
+        if response is not None and intent != 'general_query':
+            return response
+        if knowledge:
+            return self._knowledge(language, knowledge)
+        return self.responses[(language, 'general_query', None)]
+
+    def _symptom_report(self, language, current, previous, knowledge=None):
+        if not current:
+            if not previous:
+                return self.templates[(language, 'ask_symptoms')]
+            return self.templates[(language, 'repeated')].format(symptoms=self._join(language, previous))
+
+        advice = self._lookup(language, 'symptom_report', current)
+        parts = []
+        if previous:
+            parts.append(self.templates[(language, 'previous_and_new')].format(
+                previous=self._join(language, previous), current=self._join(language, current)
+            ))
+            parts.extend(advice or [self.templates[(language, 'combined_advice')]])
+        elif advice:
+            parts.extend(advice)
+        else:
+            parts.append(self.templates[(language, 'symptom_generic')].format(symptoms=self._join(language, current)))
+            if knowledge:
+                parts.append(self._knowledge(language, knowledge))
+        return ' '.join(parts)
+
+    def _medicine_inquiry(self, language, symptoms, knowledge=None):
+        if not symptoms:
+            return self.templates[(language, 'ask_symptoms_for_medicine')]
+        advice = self._lookup(language, 'medicine_inquiry', symptoms)
+        if advice:
+            return ' '.join(advice)
+        if knowledge:
+            return self.templates[(language, 'medicine_generic')] + ' ' + self._knowledge(language, knowledge)
+        return self.templates[(language, 'medicine_generic')]
+
+    def _knowledge(self, language, knowledge):
+        passage = knowledge[0]
+        return self.templates[(language, 'knowledge')].format(title=passage['title'], text=passage['text'])
+
+    def _lookup(self, language, intent, symptoms):
+        found = []
+        for symptom in symptoms:
+            response = self.responses.get((language, intent, symptom))
+            if response is not None:
+                found.append(response)
+                if len(found) >= self.max_symptoms:
+                    break
+        return found
+
+    def _join(self, language, symptoms):
+        return self.templates[(language, 'separator')].join(self.display_name(language, s) for s in symptoms)
+
+    def stats(self):
+        return {
+            "languages": sorted(self.languages),
+            "symptoms": len(self.vocabulary),
+            "aliases": len(self.aliases),
+            "responses": len(self.responses)
+        }
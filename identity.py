@@ -0,0 +1,233 @@
+"""
+Stateless request identity.
+
+At login the fields routes actually read (id, username, role,
+specialization) are signed into a token with the app's SECRET_KEY. The token
+is the Flask-Login user id kept in the session (and remember-me) cookie, and
+the same claims go into the JWT access cookie. Each request rebuilds the user
+from the token as an IdentityUser, without touching the users table; any
+other attribute (email, relationships, check_password) loads the real User
+on first use.
+
+Tokens older than IDENTITY_TTL seconds, or issued before the user's profile,
+role or password changed in this process, are checked again against a small
+TTL cache of users (the database on a miss) and re-issued with the new
+claims. A changed password or a deleted user logs those sessions out.
+Changes are noticed by session events, whatever made them; other processes
+pick them up within IDENTITY_TTL.
+"""
+import hashlib
+import threading
+import time
+
+from flask import current_app, session
+from flask_jwt_extended import create_access_token
+from flask_login import UserMixin
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import User
+
+CLAIMS = ('id', 'username', 'role', 'specialization')
+# Changes to these columns make issued tokens stale
+IDENTITY_COLUMNS = CLAIMS[1:] + ('password_hash',)
+SALT = 'identity'
+
+
+def password_stamp(password_hash):
+    """Short fingerprint of the password hash; a new password invalidates old tokens"""
+    return hashlib.sha256((password_hash or '').encode('utf-8')).hexdigest()[:12]
+
+
+def claims_for(user):
+    claims = {name: getattr(user, name) for name in CLAIMS}
+    claims['pwd'] = password_stamp(user.password_hash)
+    return claims
+
+
+# -------------------------------
+# 🔹 Identity proxy
+# -------------------------------
+class IdentityUser(UserMixin):
+    """current_user built from token claims; other attributes come from the User row, loaded on demand"""
+
+    def __init__(self, claims, token=None):
+        self.claims = claims
+        self.id = claims['id']
+        self.username = claims['username']
+        self.role = claims['role']
+        self.specialization = claims['specialization']
+        self._token = token
+        self._record = None
+
+    def get_id(self):
+        if self._token is None:
+            self._token = _serializer().dumps(self.claims)
+        return self._token
+
+    @property
+    def record(self):
+        """The User row, for updates and the fields not in the token"""
+        if self._record is None:
+            self._record = db.session.get(User, self.id)
+        return self._record
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record, name)
+
+    @classmethod
+    def from_user(cls, user):
+        identity = cls(claims_for(user))
+        identity._record = user
+        return identity
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+# -------------------------------
+# 🔹 User cache and invalidation
+# -------------------------------
+class IdentityCache:
+    """Recently checked users' claims by id, and when each user last changed"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._claims = {}  # user id -> (claims, loaded_at)
+        self._changed = {}  # user id -> time of the last identity change
+
+    def is_current(self, user_id, issued_at):
+        """Whether a token issued at `issued_at` can be trusted without a lookup"""
+        now = time.time()
+        if now - issued_at >= self.ttl:
+            return False
+        changed = self._changed.get(user_id)
+        return changed is None or changed < issued_at
+
+    def claims(self, user_id):
+        """Current claims of a user (None if the user is gone), cached for `ttl` seconds"""
+        now = time.time()
+        with self._lock:
+            entry = self._claims.get(user_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+
+        user = db.session.get(User, user_id)
+        claims = claims_for(user) if user is not None else None
+        with self._lock:
+            # Don't keep a load that an invalidation overtook
+            if claims is not None and self._changed.get(user_id, 0) < now:
+                self._claims[user_id] = (claims, now)
+        return claims
+
+    def invalidate(self, user_ids):
+        now = time.time()
+        with self._lock:
+            for user_id in user_ids:
+                self._claims.pop(user_id, None)
+                self._changed[user_id] = now
+            # Tokens older than the TTL are checked anyway
+            for user_id, changed in list(self._changed.items()):
+                if now - changed > self.ttl:
+                    del self._changed[user_id]
+
+
+cache = IdentityCache()
+
+
+def resolve(claims, issued_at, token=None):
+    """IdentityUser for verified claims, re-checked if stale; None if the session is no longer valid"""
+    user_id = claims.get('id')
+    if user_id is None:
+        return None
+    if cache.is_current(user_id, issued_at):
+        return IdentityUser(claims, token)
+
+    current = cache.claims(user_id)
+    if current is None or current['pwd'] != claims.get('pwd'):
+        return None
+    return IdentityUser(current)
+
+
+def load_user(user_id):
+    """Flask-Login user loader: the stored id is a signed claims token"""
+    if user_id.isdigit():
+        # Sessions from before signed tokens: look the user up once and upgrade the session
+        claims = cache.claims(int(user_id))
+        if claims is None:
+            return None
+        identity = IdentityUser(claims)
+    else:
+        try:
+            claims, issued_at = _serializer().loads(user_id, return_timestamp=True)
+        except BadSignature:
+            return None
+        identity = resolve(claims, issued_at.timestamp(), token=user_id)
+        if identity is None or identity.claims is claims:
+            return identity
+
+    # Re-issued: store the fresh token so the next requests take the fast path again
+    if session.get('_user_id') == user_id:
+        session['_user_id'] = identity.get_id()
+    return identity
+
+
+def refresh(user):
+    """Re-issue the current session's token after the user changed their own profile or password"""
+    identity = IdentityUser.from_user(user)
+    session['_user_id'] = identity.get_id()
+    return identity
+
+
+def access_token(user):
+    """JWT access cookie value carrying the same claims"""
+    claims = claims_for(user)
+    return create_access_token(identity=str(user.id), additional_claims={'user': claims})
+
+
+def jwt_user(jwt_header, jwt_data):
+    """flask_jwt_extended user lookup: the identity from the token's claims"""
+    claims = jwt_data.get('user')
+    if not claims:
+        return None
+    return resolve(claims, jwt_data['iat'])
+
+
+def _changes_identity(obj):
+    if not isinstance(obj, User):
+        return False
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in IDENTITY_COLUMNS)
+
+
+@event.listens_for(Session, 'before_flush')
+def _note_identity_changes(session, flush_context, instances):
+    changed = {obj.id for obj in session.dirty if _changes_identity(obj)}
+    changed |= {obj.id for obj in session.deleted if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('identity_changed', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    changed = session.info.pop('identity_changed', None)
+    if changed:
+        cache.invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('identity_changed', None)
+
+
+def init_app(app, login_manager, jwt):
+    cache.ttl = app.config.get('IDENTITY_TTL', cache.ttl)
+    login_manager.user_loader(load_user)
+    jwt.user_lookup_loader(jwt_user)
+    return cache
@@ -0,0 +1,254 @@
+"""
+Durable background jobs.
+
+Work a response does not depend on (intent/sentiment/topic enrichment,
+analytics counters, summary refresh) is enqueued into a SQLite table and run
+by a small pool of worker threads inside the app context. Jobs survive
+restarts: a job left 'running' by a dead process is claimed again once its
+lease expires. Handlers are plain functions registered with @task.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+import click
+
+from startup import BASE_DIR, serving
+
+_handlers = {}
+_queue = None
+
+
+def task(kind, max_attempts=3):
+    """
+    Register a job handler:
+
+        @task('chat.enrich')
+        def enrich_message(message_id): ...
+    """
+    def register(fn):
+        _handlers[kind] = (fn, max_attempts)
+        return fn
+    return register
+
+
+class JobQueue:
+    """SQLite-backed queue with leases, retries and daily counters"""
+
+    def __init__(self, path, lease=60):
+        self.path = path
+        self.lease = lease
+        self.processed = Counter()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after REAL NOT NULL,
+                lease_until REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                day TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, name)
+            )
+        """)
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind, payload=None, delay=0):
+        now = time.time()
+        conn = self._connection()
+        job_id = conn.execute(
+            "INSERT INTO jobs (kind, payload, run_after, created_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload or {}), now + delay, now)
+        ).lastrowid
+        conn.commit()
+        self._wakeup.set()
+        return job_id
+
+    def claim(self):
+        """Atomically take the oldest runnable job; returns (id, kind, payload, attempts) or None"""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'pending' AND run_after <= ?) OR (status = 'running' AND lease_until < ?)
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts
+        """, (now + self.lease, now, now)).fetchone()
+        conn.commit()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3]
+
+    def complete(self, job_id, kind):
+        conn = self._connection()
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        conn.commit()
+        self.processed[(kind, 'done')] += 1
+
+    def fail(self, job_id, kind, error, retry_in=None):
+        """Reschedule the job after `retry_in` seconds, or mark it failed for good"""
+        conn = self._connection()
+        if retry_in is None:
+            conn.execute("UPDATE jobs SET status = 'failed', last_error = ? WHERE id = ?", (error, job_id))
+            self.processed[(kind, 'failed')] += 1
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', run_after = ?, last_error = ? WHERE id = ?",
+                (time.time() + retry_in, error, job_id)
+            )
+            self.processed[(kind, 'retried')] += 1
+        conn.commit()
+
+    def wait(self, timeout):
+        """Sleep until something is enqueued in this process or `timeout` passes"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def increment(self, name, amount=1, day=None):
+        conn = self._connection()
+        conn.execute("""
+            INSERT INTO counters (day, name, value) VALUES (?, ?, ?)
+            ON CONFLICT (day, name) DO UPDATE SET value = value + excluded.value
+        """, ((day or date.today()).isoformat(), name, amount))
+        conn.commit()
+
+    def counters(self, day=None):
+        rows = self._connection().execute(
+            "SELECT name, value FROM counters WHERE day = ? ORDER BY name", ((day or date.today()).isoformat(),)
+        ).fetchall()
+        return dict(rows)
+
+    def stats(self):
+        rows = self._connection().execute(
+            "SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status"
+        ).fetchall()
+        queued = {}
+        for kind, status, count in rows:
+            queued.setdefault(kind, {})[status] = count
+        processed = {}
+        for (kind, outcome), count in self.processed.items():
+            processed.setdefault(kind, {})[outcome] = count
+        return {"queued": queued, "processed": processed}
+
+
+class JobWorkers:
+    """Threads that claim jobs and run their handlers inside the app context"""
+
+    def __init__(self, app, queue, workers=2, poll_interval=1.0):
+        self.app = app
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self.queue._wakeup.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self.queue.wait(self.poll_interval)
+                continue
+            self.run(*job)
+
+    def run_pending(self):
+        """Run every runnable job in the calling thread; returns how many ran"""
+        ran = 0
+        job = self.queue.claim()
+        while job is not None:
+            self.run(*job)
+            ran += 1
+            job = self.queue.claim()
+        return ran
+
+    def run(self, job_id, kind, payload, attempts):
+        handler = _handlers.get(kind)
+        if handler is None:
+            self.queue.fail(job_id, kind, f"No handler registered for '{kind}'")
+            return
+        fn, max_attempts = handler
+        try:
+            with self.app.app_context():
+                fn(**payload)
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed on attempt {attempts}: {e}")
+            retry_in = 2 ** attempts if attempts < max_attempts else None
+            self.queue.fail(job_id, kind, str(e), retry_in)
+            return
+        self.queue.complete(job_id, kind)
+
+
+def enqueue(kind, **payload):
+    """Queue a job; without a configured queue the handler runs inline"""
+    if _queue is None:
+        _handlers[kind][0](**payload)
+        return None
+    return _queue.enqueue(kind, payload)
+
+
+def increment(name, amount=1):
+    """Bump today's value of an analytics counter"""
+    if _queue is not None:
+        _queue.increment(name, amount)
+
+
+def init_app(app):
+    """Open the queue, start the workers and register the CLI commands"""
+    global _queue
+    _queue = JobQueue(app.config.get('JOB_QUEUE_PATH') or os.path.join(BASE_DIR, 'jobs.db'))
+    workers = JobWorkers(app, _queue, workers=app.config.get('JOB_WORKERS', 2))
+    app.extensions['jobs'] = workers
+
+    @app.cli.command('jobs-status')
+    def jobs_status_command():
+        """Show queued jobs and today's analytics counters."""
+        click.echo(json.dumps({"jobs": _queue.stats(), "counters": _queue.counters()}, indent=2))
+
+    @app.cli.command('jobs-run')
+    def jobs_run_command():
+        """Run all pending jobs in the foreground."""
+        click.echo(f"Ran {workers.run_pending()} job(s)")
+
+    # CLI commands (`flask db upgrade`, `flask jobs-run`, ...) must not run jobs in the background
+    if workers.workers and serving():
+        workers.start()
+    return workers
@@ -0,0 +1,266 @@
+"""
+HTTP client for the chat completions API.
+
+Wraps the OpenAI-compatible REST endpoint with a keep-alive connection pool,
+per-call deadlines, bounded retries with jittered backoff and a circuit
+breaker. The base URL is configurable, so the client can be pointed at a
+local fake server during development.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Transport errors worth another attempt; other RequestExceptions (bad URL, redirect loops) are not
+RETRYABLE_ERRORS = (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+
+class LLMError(Exception):
+    """Raised when the LLM call fails after retries"""
+
+
+class CircuitOpenError(LLMError):
+    """Raised without touching the network while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker. Opens after `failure_threshold`
+    consecutive failed calls and lets a single probe through after `reset_timeout`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go out now"""
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # Half-open: only one probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def is_open(self):
+        """True while calls are being rejected, without claiming the half-open probe"""
+        if self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self._probe_in_flight
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def to_dict(self):
+        return {"state": self.state, "failures": self.failures}
+
+
+class LLMMetrics:
+    """Thread-safe per-outcome counters and latency totals"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = Counter()
+        self.latency_ms = Counter()
+
+    def record(self, outcome, elapsed_ms=None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if elapsed_ms is not None:
+                self.latency_ms[outcome] += elapsed_ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                outcome: {
+                    "count": count,
+                    "avg_ms": round(self.latency_ms[outcome] / count, 1) if outcome in self.latency_ms else None
+                }
+                for outcome, count in self.outcomes.items()
+            }
+
+
+class LLMClient:
+    """
+    Chat completions client. `chat()` returns the full reply, `stream_chat()`
+    yields content chunks. Both raise LLMError (or CircuitOpenError) on failure.
+    """
+
+    def __init__(self, api_key=None, base_url=DEFAULT_BASE_URL, model='gpt-3.5-turbo',
+                 timeout=10.0, connect_timeout=3.05, max_retries=2, backoff_base=0.25,
+                 backoff_max=2.0, pool_size=10, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = LLMMetrics()
+
+        # Keep-alive pool shared by all request threads; retries are handled here
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def allow_request(self):
+        """Cheap pre-check so callers can skip building a prompt while the breaker is open"""
+        if not self.breaker.is_open():
+            return True
+        self.metrics.record('circuit_open')
+        return False
+
+    def chat(self, messages, max_tokens=350, temperature=0.7, timeout=None):
+        """Return the assistant reply text for `messages`"""
+        payload = {"model": self.model, "messages": messages,
+                   "max_tokens": max_tokens, "temperature": temperature}
+        start = time.monotonic()
+        response = self._post(payload, timeout or self.timeout, stream=False)
+        try:
+            reply = response.json()['choices'][0]['message']['content'].strip()
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            self._failed('malformed', start)
+            raise LLMError(f"Malformed completion response: {e}")
+        # Only a parsed reply counts as a healthy call
+        self._succeeded(start)
+        return reply
+
+    def stream_chat(self, messages, max_tokens=350, temperature=0.7, timeout=None):
+        """Yield reply chunks as they arrive (server-sent events from the API)"""
+        payload = {"model": self.model, "messages": messages,
+                   "max_tokens": max_tokens, "temperature": temperature, "stream": True}
+        start = time.monotonic()
+        response = self._post(payload, timeout or self.timeout, stream=True)
+        settled = False
+        # text/event-stream often comes without a charset; iter_lines would yield bytes
+        response.encoding = response.encoding or 'utf-8'
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                choices = json.loads(data).get('choices') or []
+                delta = choices[0].get('delta', {}).get('content') if choices else None
+                if not settled:
+                    # The first well-formed event shows the API is answering
+                    settled = True
+                    self._succeeded(start)
+                if delta:
+                    yield delta
+        except (requests.RequestException, ValueError, AttributeError, IndexError, TypeError) as e:
+            # Mid-stream failures can't be retried, the caller already has tokens
+            if settled:
+                self.metrics.record('stream_error')
+            else:
+                settled = True
+                self._failed('stream_error', start)
+            raise LLMError(f"Stream interrupted: {e}")
+        finally:
+            response.close()
+        if not settled:
+            self._failed('malformed', start)
+            raise LLMError("Stream ended without any events")
+
+    def _post(self, payload, timeout, stream):
+        """POST with a deadline, bounded jittered retries and the circuit breaker"""
+        if not self.breaker.allow():
+            self.metrics.record('circuit_open')
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+        url = f"{self.base_url}/chat/completions"
+        start = time.monotonic()
+        deadline = start + timeout
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            outcome, error = None, None
+            try:
+                response = self.session.post(
+                    url, json=payload, stream=stream,
+                    timeout=(min(self.connect_timeout, remaining), remaining)
+                )
+                if response.status_code < 400:
+                    # Success is recorded by the caller once the body has been read and parsed
+                    return response
+                outcome, error = f'http_{response.status_code}', f"HTTP {response.status_code}: {response.text[:200]}"
+                response.close()
+                retryable = response.status_code in RETRYABLE_STATUS
+            except requests.Timeout as e:
+                outcome, error, retryable = 'timeout', str(e), True
+            except requests.ConnectionError as e:
+                outcome, error, retryable = 'connection_error', str(e), True
+            except requests.RequestException as e:
+                outcome, error, retryable = 'request_error', str(e), isinstance(e, RETRYABLE_ERRORS)
+
+            self.metrics.record(outcome, (time.monotonic() - start) * 1000)
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            if not retryable or attempt >= self.max_retries or time.monotonic() + backoff >= deadline:
+                self.breaker.record_failure()
+                raise LLMError(error)
+
+            attempt += 1
+            self.metrics.record('retry')
+            time.sleep(backoff)
+
+    def _succeeded(self, start):
+        self.breaker.record_success()
+        self.metrics.record('success', (time.monotonic() - start) * 1000)
+
+    def _failed(self, outcome, start):
+        self.breaker.record_failure()
+        self.metrics.record(outcome, (time.monotonic() - start) * 1000)
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "available": self.available,
+            "breaker": self.breaker.to_dict(),
+            "outcomes": self.metrics.snapshot()
+        }
@@ -0,0 +1,183 @@
+"""
+Normalized chat entities for analytics.
+
+Entities extracted from user messages are stored one row per (message, type,
+value) in `message_entities`, with the canonical value ("bukhar" -> "fever"),
+the sender and the message time copied in. Questions like "how many users
+reported fever this week" become one indexed aggregate instead of parsing
+the JSON in every ChatMessage.entities. The chat.enrich job writes the rows
+for new messages; `flask backfill-entities` fills them in for existing ones.
+"""
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from sqlalchemy import distinct, func, insert, select
+
+from extensions import db
+from fallback_engine import canonical_symptom
+from models import ChatMessage, MessageEntity
+
+VALUE_MAX_CHARS = 100
+
+
+def normalize(entities, aliases):
+    """(type, canonical value, confidence) per distinct entity; the highest confidence wins"""
+    rows = {}
+    for entity in entities or []:
+        kind = entity.get('type')
+        value = entity.get('value')
+        if not kind or not value:
+            continue
+        if kind == 'symptom':
+            value = canonical_symptom(value, aliases)
+        else:
+            value = ' '.join(str(value).lower().split())
+        key = (kind, value[:VALUE_MAX_CHARS])
+        rows[key] = max(rows.get(key, 0), entity.get('confidence') or 0)
+    return [(kind, value, confidence) for (kind, value), confidence in rows.items()]
+
+
+def entity_rows(message_id, user_id, language, created_at, entities, aliases):
+    return [
+        {'message_id': message_id, 'user_id': user_id, 'language': language, 'type': kind, 'value': value,
+         'confidence': confidence, 'created_at': created_at}
+        for kind, value, confidence in normalize(entities, aliases)
+    ]
+
+
+def insert_rows(session, rows):
+    """Insert entity rows, ignoring ones already present (so backfills and job retries are safe)"""
+    if rows:
+        session.execute(insert(MessageEntity).prefix_with('OR IGNORE'), rows)
+
+
+def record_message(session, message, aliases):
+    """
+    Stage the entity rows of a saved ChatMessage on `session`. Returns the
+    rows, or [] if the message was recorded before (e.g. by a backfill).
+    """
+    if session.query(MessageEntity.id).filter_by(message_id=message.id).first() is not None:
+        return []
+    rows = entity_rows(message.id, message.user_id, message.language, message.created_at,
+                       message.get_entities(), aliases)
+    insert_rows(session, rows)
+    return rows
+
+
+# -------------------------------
+# 🔹 Backfill
+# -------------------------------
+_worker_aliases = {}
+
+
+def _init_worker(aliases):
+    global _worker_aliases
+    _worker_aliases = aliases
+
+
+def _parse_batch(messages):
+    """Entity rows for (id, user_id, language, created_at, entities JSON) tuples; runs in a worker process"""
+    rows = []
+    for message_id, user_id, language, created_at, raw in messages:
+        try:
+            entities = json.loads(raw)
+        except (TypeError, ValueError):
+            continue
+        rows.extend(entity_rows(message_id, user_id, language, created_at, entities, _worker_aliases))
+    return rows
+
+
+def backfill(aliases, batch_size=2000, workers=None, start_id=0, log=print):
+    """
+    Parse the entities of every message after `start_id`. Batches are read in
+    id order and parsed by a process pool; this process is the only writer,
+    committing one batch at a time. Returns (messages read, entity rows).
+    """
+    workers = workers or os.cpu_count() or 2
+    after_id = start_id
+    read = written = 0
+    in_flight = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(aliases,)) as pool:
+        while True:
+            batch = db.session.execute(
+                select(ChatMessage.id, ChatMessage.user_id, ChatMessage.language, ChatMessage.created_at,
+                       ChatMessage.entities)
+                .where(ChatMessage.id > after_id, ChatMessage.entities.isnot(None))
+                .order_by(ChatMessage.id.asc())
+                .limit(batch_size)
+            ).all()
+            db.session.rollback()
+            if batch:
+                after_id = batch[-1].id
+                read += len(batch)
+                in_flight.append((after_id, pool.submit(_parse_batch, [tuple(row) for row in batch])))
+
+            # Keep every worker busy; write finished batches in order so start_id stays a valid resume point
+            while in_flight and (not batch or len(in_flight) >= workers or in_flight[0][1].done()):
+                last_id, future = in_flight.popleft()
+                rows = future.result()
+                insert_rows(db.session, rows)
+                db.session.commit()
+                written += len(rows)
+                log(f"Backfilled entities up to message {last_id} ({read} messages, {written} entities)")
+
+            if not batch:
+                return read, written
+
+
+# -------------------------------
+# 🔹 Aggregates
+# -------------------------------
+def top_values(kind='symptom', since=None, until=None, limit=10):
+    """Most mentioned values of `kind` in [since, until): value, mentions and distinct users"""
+    query = db.session.query(
+        MessageEntity.value,
+        func.count(MessageEntity.id).label('mentions'),
+        func.count(distinct(MessageEntity.user_id)).label('users')
+    ).filter(MessageEntity.type == kind)
+    if since:
+        query = query.filter(MessageEntity.created_at >= since)
+    if until:
+        query = query.filter(MessageEntity.created_at < until)
+    rows = query.group_by(MessageEntity.value).order_by(func.count(MessageEntity.id).desc()).limit(limit).all()
+    return [{'value': row.value, 'mentions': row.mentions, 'users': row.users} for row in rows]
+
+
+def value_summary(kind, value, since=None, until=None):
+    """Mentions, distinct users and per-day mentions of one value"""
+    filters = [MessageEntity.type == kind, MessageEntity.value == value]
+    if since:
+        filters.append(MessageEntity.created_at >= since)
+    if until:
+        filters.append(MessageEntity.created_at < until)
+
+    mentions, users = db.session.query(
+        func.count(MessageEntity.id), func.count(distinct(MessageEntity.user_id))
+    ).filter(*filters).one()
+    day = func.date(MessageEntity.created_at)
+    daily = db.session.query(day, func.count(MessageEntity.id)).filter(*filters).group_by(day).order_by(day).all()
+    return {
+        'value': value,
+        'mentions': mentions,
+        'users': users,
+        'daily': [{'date': date, 'mentions': count} for date, count in daily]
+    }
+
+
+def init_app(app):
+    @app.cli.command('backfill-entities')
+    @click.option('--batch-size', type=int, default=2000, help='Messages per batch.')
+    @click.option('--workers', type=int, default=None, help='Parser processes (default: CPU count).')
+    @click.option('--start-id', type=int, default=0, help='Resume after this message id.')
+    def backfill_entities_command(batch_size, workers, start_id):
+        """Fill message_entities from the entities JSON of existing chat messages."""
+        from chatbot_processor import load_fallback_engine
+        aliases = load_fallback_engine.get().aliases
+        read, written = backfill(aliases, batch_size=batch_size, workers=workers, start_id=start_id, log=click.echo)
+        click.echo(f"Read {read} message(s), wrote {written} entity row(s)")
+        if written:
+            click.echo("Run `flask rebuild-symptom-trends` to include them in the symptom rollups")
@@ -0,0 +1,28 @@
+"""Add rolling summary to conversations
+
+Revision ID: 3f9a1c2d7b41
+Revises: 79d8738ef309
+Create Date: 2026-10-19 09:12:31.184220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7b41'
+down_revision = '79d8738ef309'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('summary_upto', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('summary_upto')
+        batch_op.drop_column('summary')
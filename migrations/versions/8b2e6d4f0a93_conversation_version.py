@@ -0,0 +1,26 @@
+"""Add version counter to conversations
+
+Revision ID: 8b2e6d4f0a93
+Revises: 3f9a1c2d7b41
+Create Date: 2026-10-19 14:02:47.531906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e6d4f0a93'
+down_revision = '3f9a1c2d7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,49 @@
+"""Add symptom_daily_counts rollup and message_entities.language
+
+Revision ID: a3d6f0b8c215
+Revises: f1c8a2e64b37
+Create Date: 2026-10-19 19:12:40.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d6f0b8c215'
+down_revision = 'f1c8a2e64b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message_entities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('language', sa.String(length=20), nullable=True))
+    op.execute(
+        "UPDATE message_entities SET language = "
+        "(SELECT chat_messages.language FROM chat_messages WHERE chat_messages.id = message_entities.message_id)"
+    )
+
+    op.create_table('symptom_daily_counts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('bucket', sa.String(length=50), nullable=False),
+    sa.Column('symptom', sa.String(length=100), nullable=False),
+    sa.Column('mentions', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('symptom_daily_counts', schema=None) as batch_op:
+        batch_op.create_index('uq_symptom_daily_counts_key', ['dimension', 'symptom', 'day', 'bucket'], unique=True)
+        batch_op.create_index('ix_symptom_daily_counts_dimension_bucket_day', ['dimension', 'bucket', 'day', 'symptom', 'mentions'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('symptom_daily_counts', schema=None) as batch_op:
+        batch_op.drop_index('ix_symptom_daily_counts_dimension_bucket_day')
+        batch_op.drop_index('uq_symptom_daily_counts_key')
+
+    op.drop_table('symptom_daily_counts')
+
+    with op.batch_alter_table('message_entities', schema=None) as batch_op:
+        batch_op.drop_column('language')
@@ -0,0 +1,27 @@
+"""Add index for the answered-questions tab of the doctor dashboard
+
+Revision ID: b7e2c9d4f160
+Revises: a3d6f0b8c215
+Create Date: 2026-10-19 20:04:51.207395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c9d4f160'
+down_revision = 'a3d6f0b8c215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.create_index('ix_questions_specialization_answered_created',
+                              ['specialization', 'answered', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_index('ix_questions_specialization_answered_created')
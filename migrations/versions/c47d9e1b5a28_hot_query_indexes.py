@@ -0,0 +1,50 @@
+"""Add composite indexes for the chat, question and appointment hot queries
+
+Revision ID: c47d9e1b5a28
+Revises: 8b2e6d4f0a93
+Create Date: 2026-10-19 15:21:09.774512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47d9e1b5a28'
+down_revision = '8b2e6d4f0a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_messages_conversation_created', ['conversation_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.create_index('ix_conversations_user_last_updated', ['user_id', 'last_updated'], unique=False)
+
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.create_index('ix_questions_specialization_answered_urgent_created',
+                              ['specialization', 'answered', sa.text('urgent DESC'), sa.text('created_at DESC')],
+                              unique=False)
+        batch_op.create_index('ix_questions_patient_created', ['patient_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index('ix_appointments_doctor_date', ['doctor_id', 'appointment_date'], unique=False)
+        batch_op.create_index('ix_appointments_patient_date', ['patient_id', 'appointment_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index('ix_appointments_patient_date')
+        batch_op.drop_index('ix_appointments_doctor_date')
+
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_index('ix_questions_patient_created')
+        batch_op.drop_index('ix_questions_specialization_answered_urgent_created')
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversations_user_last_updated')
+
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_messages_conversation_created')
@@ -0,0 +1,47 @@
+"""Add appointments.slot_key with a unique (doctor_id, slot_key) index
+
+Revision ID: c4f9e1a7d350
+Revises: b7e2c9d4f160
+Create Date: 2026-10-19 21:04:17.552903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f9e1a7d350'
+down_revision = 'b7e2c9d4f160'
+branch_labels = None
+depends_on = None
+
+# Default APPOINTMENT_SLOT_MINUTES; key = slots since 2000-01-01
+SLOT_SECONDS = 30 * 60
+
+
+def upgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slot_key', sa.Integer(), nullable=True))
+
+    op.execute(
+        "UPDATE appointments SET slot_key = "
+        "(CAST(strftime('%s', appointment_date) AS INTEGER) - CAST(strftime('%s', '2000-01-01') AS INTEGER)) "
+        f"/ {SLOT_SECONDS} "
+        "WHERE status != 'cancelled' AND appointment_date IS NOT NULL"
+    )
+    # Existing double bookings: a confirmed one, else the earliest, keeps the slot
+    op.execute(
+        "UPDATE appointments SET slot_key = NULL WHERE slot_key IS NOT NULL AND id NOT IN ("
+        "SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY doctor_id, slot_key ORDER BY status = 'confirmed' DESC, id) AS rank "
+        "FROM appointments WHERE slot_key IS NOT NULL) WHERE rank = 1)"
+    )
+
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index('uq_appointments_doctor_slot', ['doctor_id', 'slot_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index('uq_appointments_doctor_slot')
+        batch_op.drop_column('slot_key')
@@ -0,0 +1,43 @@
+"""Add consultation assignment columns for the consultation router
+
+Revision ID: d2b8f5a6c913
+Revises: c4f9e1a7d350
+Create Date: 2026-10-19 22:31:08.140562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b8f5a6c913'
+down_revision = 'c4f9e1a7d350'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('consultations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('urgent', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('response', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('doctor_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('assigned_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_consultations_doctor_id_users', 'users', ['doctor_id'], ['id'])
+    op.execute("UPDATE consultations SET urgent = 0")
+
+    with op.batch_alter_table('consultations', schema=None) as batch_op:
+        batch_op.create_index('ix_consultations_specialization_status_doctor',
+                              ['specialization', 'status', 'doctor_id', sa.text('urgent DESC'), 'created_at'],
+                              unique=False)
+        batch_op.create_index('ix_consultations_doctor_status', ['doctor_id', 'status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('consultations', schema=None) as batch_op:
+        batch_op.drop_index('ix_consultations_doctor_status')
+        batch_op.drop_index('ix_consultations_specialization_status_doctor')
+        batch_op.drop_constraint('fk_consultations_doctor_id_users', type_='foreignkey')
+        batch_op.drop_column('assigned_at')
+        batch_op.drop_column('doctor_id')
+        batch_op.drop_column('response')
+        batch_op.drop_column('urgent')
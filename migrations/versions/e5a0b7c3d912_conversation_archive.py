@@ -0,0 +1,28 @@
+"""Add cold-storage archive stub columns to conversations
+
+Revision ID: e5a0b7c3d912
+Revises: c47d9e1b5a28
+Create Date: 2026-10-19 16:40:18.203557
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a0b7c3d912'
+down_revision = 'c47d9e1b5a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('archived_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('archive_path', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('archive_path')
+        batch_op.drop_column('archived_at')
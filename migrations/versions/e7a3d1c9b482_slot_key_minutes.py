@@ -0,0 +1,64 @@
+"""Key appointment slots by the minutes from 2000-01-01 to their start
+
+Revision ID: e7a3d1c9b482
+Revises: d2b8f5a6c913
+Create Date: 2026-10-20 09:12:44.306718
+
+"""
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3d1c9b482'
+down_revision = 'd2b8f5a6c913'
+branch_labels = None
+depends_on = None
+
+# Minutes from 2000-01-01 to the appointment, in SQLite
+MINUTES = ("((CAST(strftime('%s', appointment_date) AS INTEGER) "
+           "- CAST(strftime('%s', '2000-01-01') AS INTEGER)) / 60)")
+
+# Existing double bookings: a confirmed one, else the earliest, keeps the slot
+DEDUPE = (
+    "UPDATE appointments SET slot_key = NULL WHERE slot_key IS NOT NULL AND id NOT IN ("
+    "SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+    "PARTITION BY doctor_id, slot_key ORDER BY status = 'confirmed' DESC, id) AS rank "
+    "FROM appointments WHERE slot_key IS NOT NULL) WHERE rank = 1)"
+)
+
+
+def _slot_minutes():
+    return int(current_app.config.get('APPOINTMENT_SLOT_MINUTES', 30))
+
+
+def upgrade():
+    # Recomputed from the dates: the old keys (slots since 2000-01-01) depended on the slot length.
+    # Appointments off the slot grid get the slot containing them, so they are protected too.
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index('uq_appointments_doctor_slot')
+
+    slot = _slot_minutes()
+    op.execute(
+        f"UPDATE appointments SET slot_key = ({MINUTES} / {slot}) * {slot} "
+        "WHERE status != 'cancelled' AND appointment_date IS NOT NULL"
+    )
+    op.execute(DEDUPE)
+
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index('uq_appointments_doctor_slot', ['doctor_id', 'slot_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index('uq_appointments_doctor_slot')
+
+    op.execute(
+        f"UPDATE appointments SET slot_key = {MINUTES} / {_slot_minutes()} "
+        "WHERE status != 'cancelled' AND appointment_date IS NOT NULL"
+    )
+    op.execute(DEDUPE)
+
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index('uq_appointments_doctor_slot', ['doctor_id', 'slot_key'], unique=True)
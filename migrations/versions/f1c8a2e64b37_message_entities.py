@@ -0,0 +1,41 @@
+"""Add normalized message_entities table
+
+Revision ID: f1c8a2e64b37
+Revises: e5a0b7c3d912
+Create Date: 2026-10-19 17:55:02.648113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c8a2e64b37'
+down_revision = 'e5a0b7c3d912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('message_entities',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.String(length=100), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('message_id', 'type', 'value', name='uq_message_entities_message_type_value')
+    )
+    with op.batch_alter_table('message_entities', schema=None) as batch_op:
+        batch_op.create_index('ix_message_entities_type_value_created', ['type', 'value', 'created_at', 'user_id'], unique=False)
+        batch_op.create_index('ix_message_entities_type_created', ['type', 'created_at', 'value', 'user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message_entities', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_entities_type_created')
+        batch_op.drop_index('ix_message_entities_type_value_created')
+
+    op.drop_table('message_entities')
@@ -0,0 +1,26 @@
+"""Add users.available_until for the consultation router
+
+Revision ID: f3c6b9d2e817
+Revises: e7a3d1c9b482
+Create Date: 2026-10-20 14:05:31.522907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c6b9d2e817'
+down_revision = 'e7a3d1c9b482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('available_until')
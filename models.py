@@ -3,7 +3,8 @@ from flask_bcrypt import Bcrypt
 from datetime import datetime
 from sqlalchemy import Enum  # Add this line
 from flask_login import UserMixin
-from extensions import db, bcrypt
+from extensions import db
+import passwords
 import json
 
 
@@ -29,6 +30,7 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128))
     role = db.Column(db.String(20), nullable=False, default='patient')  # 'patient' or 'doctor'
     specialization = db.Column(db.String(50))  # Only for doctors
+    available_until = db.Column(db.DateTime)  # Doctors: assigned consultations until then (see consultation_router)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)
     
     # Relationships
@@ -37,15 +39,26 @@ class User(UserMixin, db.Model):
     appointments_patient = db.relationship('Appointment', backref='patient', lazy=True, foreign_keys='Appointment.patient_id')
     appointments_doctor = db.relationship('Appointment', backref='doctor', lazy=True, foreign_keys='Appointment.doctor_id')
 
-    def __init__(self, username, email, password, role='patient', specialization=None):
+    def __init__(self, username, email, password=None, role='patient', specialization=None, password_hash=None):
         self.username = username
         self.email = email
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        # A precomputed hash skips hashing here (bulk creation hashes in parallel)
+        self.password_hash = password_hash or passwords.hash_password(password)
         self.role = role
         self.specialization = specialization
 
+    def set_password(self, password):
+        self.password_hash = passwords.hash_password(password)
+
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return passwords.check_password(self.password_hash, password)
+
+    def rehash_password(self, password):
+        """After a successful check: re-hash with the configured cost if the stored hash used another one"""
+        if not passwords.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
 
     # ✅ Convert User Object to Dictionary (for JSON responses)
     def to_dict(self):
@@ -84,14 +97,43 @@ class Consultation(db.Model):
     problem_description = db.Column(db.Text, nullable=False)
     specialization = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(50), nullable=False, default='pending')  # pending, answered
+    urgent = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    response = db.Column(db.Text)
+
+    # Doctor the consultation router assigned it to (None while queued)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    assigned_at = db.Column(db.DateTime)
+
+    # Router queue per specialization (urgent first, oldest first) and open load per doctor
+    __table_args__ = (
+        db.Index('ix_consultations_specialization_status_doctor', 'specialization', 'status', 'doctor_id',
+                 urgent.desc(), created_at),
+        db.Index('ix_consultations_doctor_status', 'doctor_id', 'status', created_at),
+    )
 
-    def __init__(self, user_id, problem_description, specialization, status='pending'):
+    def __init__(self, user_id, problem_description, specialization, status='pending', urgent=False):
         self.user_id = user_id
         self.problem_description = problem_description
         self.specialization = specialization
         self.status = status
+        self.urgent = urgent
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "problem_description": self.problem_description,
+            "specialization": self.specialization,
+            "status": self.status,
+            "urgent": self.urgent,
+            "doctor_id": self.doctor_id,
+            "assigned_at": self.assigned_at,
+            "response": self.response,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
 
 
 # -------------------------------
@@ -158,6 +200,15 @@ class Question(db.Model):
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'))
 
+    # Doctor dashboard / queue: unanswered first, urgent first, newest first
+    __table_args__ = (
+        db.Index('ix_questions_specialization_answered_urgent_created',
+                 'specialization', 'answered', urgent.desc(), created_at.desc()),
+        db.Index('ix_questions_patient_created', 'patient_id', 'created_at'),
+        # Doctor dashboard tabs, newest first: read backwards with no sort, ids included
+        db.Index('ix_questions_specialization_answered_created', 'specialization', 'answered', 'created_at'),
+    )
+
     # ✅ Convert Question Object to Dictionary
     def to_dict(self):
         return {
@@ -183,11 +234,20 @@ class Appointment(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    slot_key = db.Column(db.Integer, nullable=True)  # Booked availability slot; None once cancelled
     
     # Foreign Keys
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    # Dashboards list appointments per doctor / patient by date
+    __table_args__ = (
+        db.Index('ix_appointments_doctor_date', 'doctor_id', 'appointment_date'),
+        db.Index('ix_appointments_patient_date', 'patient_id', 'appointment_date'),
+        # One live appointment per doctor and slot; also the booked-slot index of availability searches
+        db.Index('uq_appointments_doctor_slot', 'doctor_id', 'slot_key', unique=True),
+    )
+
     # ✅ Convert Appointment Object to Dictionary
     def to_dict(self):
         return {
@@ -196,6 +256,7 @@ class Appointment(db.Model):
             "doctor_id": self.doctor_id,
             "appointment_date": self.appointment_date,
             "status": self.status,
+            "slot_key": self.slot_key,
             "created_at": self.created_at,
             "updated_at": self.updated_at
         }
@@ -210,11 +271,24 @@ class Conversation(db.Model):
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     language = db.Column(db.String(20), default='en')  # Language of conversation (en, hi, etc.)
     context_data = db.Column(db.Text)  # JSON-encoded context data
+    summary = db.Column(db.Text)  # Rolling summary of turns that left the prompt window
+    summary_upto = db.Column(db.Integer)  # ChatMessage ids up to this one are folded into the summary
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped on every write
+    archived_at = db.Column(db.DateTime)  # Set when older messages were moved to cold storage
+    archive_path = db.Column(db.String(255))  # Archive file (under CHAT_ARCHIVE_DIR) holding them
     
     # Relationships
     user = db.relationship('User', backref=db.backref('conversations', lazy=True))
     messages = db.relationship('ChatMessage', backref='conversation', lazy=True,
                              cascade="all, delete-orphan")
+
+    # ORM updates check and bump `version`, so they can't overwrite a newer row
+    # written by another worker or by the conversation state cache
+    __mapper_args__ = {'version_id_col': version}
+    # A user's conversations, most recently active first
+    __table_args__ = (
+        db.Index('ix_conversations_user_last_updated', 'user_id', 'last_updated'),
+    )
     
     def to_dict(self):
         return {
@@ -263,6 +337,12 @@ class ChatMessage(db.Model):
     
     # Relationships
     user = db.relationship('User', backref=db.backref('chat_messages', lazy=True))
+
+    # History and prompt windows read one conversation in time order (the
+    # rowid `id` is implicitly the last column, so ties sort without a temp b-tree)
+    __table_args__ = (
+        db.Index('ix_chat_messages_conversation_created', 'conversation_id', 'created_at'),
+    )
     
     def to_dict(self):
         return {
@@ -285,3 +365,68 @@ class ChatMessage(db.Model):
             return json.loads(self.entities)
         except:
             return []
+
+
+# -------------------------------
+# 🔹 MESSAGE ENTITY MODEL (Normalized chat entities for analytics)
+# -------------------------------
+class MessageEntity(db.Model):
+    __tablename__ = 'message_entities'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: entity rows outlive messages moved to the cold-storage archive
+    message_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)  # Sender, copied from the message
+    language = db.Column(db.String(20), nullable=True)  # Message language, copied for the symptom rollups
+    type = db.Column(db.String(50), nullable=False)  # symptom, DATE, GPE, ...
+    value = db.Column(db.String(100), nullable=False)  # Canonical value ("bukhar" -> "fever")
+    confidence = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, nullable=False)  # When the message was sent
+
+    # Aggregates filter on type (+ value) and a time range; user_id makes them covering
+    __table_args__ = (
+        db.UniqueConstraint('message_id', 'type', 'value', name='uq_message_entities_message_type_value'),
+        db.Index('ix_message_entities_type_value_created', 'type', 'value', 'created_at', 'user_id'),
+        db.Index('ix_message_entities_type_created', 'type', 'created_at', 'value', 'user_id'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "message_id": self.message_id,
+            "user_id": self.user_id,
+            "language": self.language,
+            "type": self.type,
+            "value": self.value,
+            "confidence": self.confidence,
+            "created_at": self.created_at.isoformat()
+        }
+
+
+# -------------------------------
+# 🔹 SYMPTOM DAILY COUNT MODEL (Materialized symptom trends)
+# -------------------------------
+class SymptomDailyCount(db.Model):
+    __tablename__ = 'symptom_daily_counts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)  # language, age_group or specialization
+    bucket = db.Column(db.String(50), nullable=False)  # e.g. 'hi', 'adult', 'cardiologist'
+    symptom = db.Column(db.String(100), nullable=False)  # Canonical symptom name
+    mentions = db.Column(db.Integer, nullable=False, default=0)
+
+    # The unique key doubles as the index for one symptom's trend; per-bucket top symptoms are covered by the second
+    __table_args__ = (
+        db.Index('uq_symptom_daily_counts_key', 'dimension', 'symptom', 'day', 'bucket', unique=True),
+        db.Index('ix_symptom_daily_counts_dimension_bucket_day', 'dimension', 'bucket', 'day', 'symptom', 'mentions'),
+    )
+
+    def to_dict(self):
+        return {
+            "day": self.day.isoformat(),
+            "dimension": self.dimension,
+            "bucket": self.bucket,
+            "symptom": self.symptom,
+            "mentions": self.mentions
+        }
@@ -0,0 +1,63 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are cut on a (timestamp, id) sort key instead of OFFSET, so fetching
+an old page costs the same as the newest one and rows inserted meanwhile
+don't shift page boundaries. A cursor is an opaque URL-safe token holding
+the sort key of the last row of the previous page.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def page_size(requested, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Requested page size, defaulted and capped"""
+    if not requested or requested < 1:
+        return default
+    return min(requested, maximum)
+
+
+def keyset_page(query, timestamp_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE, ascending=False):
+    """
+    Newest-first (or with `ascending`, oldest-first) page of `query` strictly
+    after `cursor`. Returns (rows, next_cursor); next_cursor is None on the
+    last page. Rows must expose the two sort columns by name (ORM objects or
+    labelled result rows).
+    """
+    key = tuple_(timestamp_column, id_column)
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(key > (timestamp, row_id) if ascending else key < (timestamp, row_id))
+
+    if ascending:
+        query = query.order_by(timestamp_column.asc(), id_column.asc())
+    else:
+        query = query.order_by(timestamp_column.desc(), id_column.desc())
+    # One extra row tells whether there is another page without a COUNT
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
@@ -0,0 +1,156 @@
+"""
+Password hashing on a small dedicated thread pool.
+
+bcrypt is deliberately slow (about 250 ms at cost 12), so signups and logins
+run it on PASSWORD_HASH_WORKERS threads rather than on as many request threads
+as happen to log in at once. bcrypt releases the GIL while hashing, so a
+login burst uses at most that many cores and the chat and prediction
+requests keep the rest. At most PASSWORD_HASH_QUEUE operations may be queued
+or running; beyond that a request waits PASSWORD_HASH_TIMEOUT seconds for a
+slot and then fails fast with PasswordBusy (503, Retry-After).
+
+New hashes use BCRYPT_LOG_ROUNDS. A login with a hash of another cost
+stores a new hash, so changing the cost takes effect as users log in.
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from extensions import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+class PasswordBusy(Exception):
+    """Raised when too many password operations are already queued"""
+
+
+class PasswordMetrics:
+    """Per-operation counts, queue wait and hash time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.wait_ms = Counter()
+        self.hash_ms = Counter()
+        self.max_hash_ms = Counter()
+
+    def record(self, operation, wait_ms=None, hash_ms=None):
+        with self._lock:
+            self.counts[operation] += 1
+            if wait_ms is not None:
+                self.wait_ms[operation] += wait_ms
+            if hash_ms is not None:
+                self.hash_ms[operation] += hash_ms
+                self.max_hash_ms[operation] = max(self.max_hash_ms[operation], hash_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                operation: {
+                    "count": count,
+                    "avg_wait_ms": round(self.wait_ms[operation] / count, 1) if operation in self.wait_ms else None,
+                    "avg_hash_ms": round(self.hash_ms[operation] / count, 1) if operation in self.hash_ms else None,
+                    "max_hash_ms": round(self.max_hash_ms[operation], 1) if operation in self.max_hash_ms else None
+                }
+                for operation, count in self.counts.items()
+            }
+
+
+class PasswordHasher:
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=2, max_pending=32, timeout=5.0):
+        self.metrics = PasswordMetrics()
+        self.configure(rounds=rounds, workers=workers, max_pending=max_pending, timeout=timeout)
+
+    def configure(self, rounds=None, workers=None, max_pending=None, timeout=None):
+        self.rounds = rounds or getattr(self, 'rounds', DEFAULT_ROUNDS)
+        self.workers = workers or getattr(self, 'workers', 2)
+        self.max_pending = max_pending or getattr(self, 'max_pending', 32)
+        self.timeout = timeout if timeout is not None else getattr(self, 'timeout', 5.0)
+        previous = getattr(self, '_executor', None)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        if previous is not None:
+            previous.shutdown(wait=False)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _submit(self, operation, fn, *args):
+        """Queue `fn(*args)` on the pool; raises PasswordBusy if no slot frees up in time"""
+        if not self._slots.acquire(timeout=self.timeout):
+            self.metrics.record('rejected')
+            raise PasswordBusy('Too many password operations in progress')
+
+        queued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.metrics.record(operation, (started - queued) * 1000, (time.perf_counter() - started) * 1000)
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _hash(self, password, rounds=None):
+        return bcrypt.generate_password_hash(password, rounds or self.rounds).decode('utf-8')
+
+    def hash(self, password, rounds=None):
+        return self._submit('hash', self._hash, password, rounds).result()
+
+    def hash_many(self, passwords):
+        """Hash several passwords at once, as many in parallel as there are workers"""
+        futures = [self._submit('hash', self._hash, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def check(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._submit('check', bcrypt.check_password_hash, password_hash, password).result()
+
+    def needs_rehash(self, password_hash):
+        """Whether a bcrypt hash ($2b$<cost>$...) was made with another cost than the configured one"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "operations": self.metrics.snapshot()
+        }
+
+
+hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return hasher.hash(password)
+
+
+def check_password(password_hash, password):
+    return hasher.check(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return hasher.needs_rehash(password_hash)
+
+
+def init_app(app):
+    hasher.configure(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS),
+        workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        max_pending=app.config.get('PASSWORD_HASH_QUEUE'),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT')
+    )
+
+    @app.errorhandler(PasswordBusy)
+    def password_busy(e):
+        return ({'error': 'The server is busy signing other users in. Please try again in a moment.'},
+                503, {'Retry-After': '1'})
+
+    return hasher
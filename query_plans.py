@@ -0,0 +1,136 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot queries.
+
+Each entry builds the same query a route runs and names the index it has to
+use. `flask check-query-plans` prints SQLite's plan for every one and fails
+when a query scans its table, picks another index or sorts in a temp b-tree,
+so a dropped or mismatched index shows up before the tables are large.
+"""
+import sys
+from datetime import datetime
+
+import click
+from sqlalchemy import desc, distinct, func, tuple_
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import (Appointment, ChatMessage, Consultation, Conversation, MessageEntity, Question, SymptomDailyCount,
+                    User)
+
+
+def hot_queries():
+    """(name, query, expected index) for the queries behind chat, history and the dashboards"""
+    return [
+        ('chat history',
+         ChatMessage.query.filter_by(conversation_id='c').order_by(ChatMessage.created_at.asc()),
+         'ix_chat_messages_conversation_created'),
+        ('prompt window',
+         ChatMessage.query.filter_by(conversation_id='c').order_by(
+             ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(50),
+         'ix_chat_messages_conversation_created'),
+        ('older history page',
+         ChatMessage.query.filter(ChatMessage.conversation_id == 'c',
+                                  tuple_(ChatMessage.created_at, ChatMessage.id) < (datetime(2026, 1, 1), 100))
+         .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(51),
+         'ix_chat_messages_conversation_created'),
+        ('conversation list',
+         Conversation.query.filter_by(user_id=1).order_by(Conversation.last_updated.desc(), Conversation.id.desc()),
+         'ix_conversations_user_last_updated'),
+        ('older conversations page',
+         Conversation.query.filter(Conversation.user_id == 1,
+                                   tuple_(Conversation.last_updated, Conversation.id) < (datetime(2026, 1, 1), 100))
+         .order_by(Conversation.last_updated.desc(), Conversation.id.desc()).limit(51),
+         'ix_conversations_user_last_updated'),
+        ('doctor dashboard question tab',
+         Question.query.options(joinedload(Question.patient).load_only(User.username)).filter(
+             Question.specialization == 'general', Question.answered == True,
+             tuple_(Question.created_at, Question.id) < (datetime(2026, 1, 1), 100))
+         .order_by(Question.created_at.desc(), Question.id.desc()).limit(21),
+         'ix_questions_specialization_answered_created'),
+        ('unanswered questions',
+         Question.query.filter_by(specialization='general', answered=False).order_by(
+             desc(Question.urgent), desc(Question.created_at)),
+         'ix_questions_specialization_answered_urgent_created'),
+        ('patient questions page',
+         Question.query.options(joinedload(Question.doctor).load_only(User.username)).filter_by(patient_id=1)
+         .order_by(Question.created_at.desc(), Question.id.desc()).limit(21),
+         'ix_questions_patient_created'),
+        ('doctor appointments page',
+         Appointment.query.options(joinedload(Appointment.patient).load_only(User.username)).filter(
+             Appointment.doctor_id == 1,
+             tuple_(Appointment.appointment_date, Appointment.id) > (datetime(2026, 1, 1), 100))
+         .order_by(Appointment.appointment_date.asc(), Appointment.id.asc()).limit(21),
+         'ix_appointments_doctor_date'),
+        ('patient appointments page',
+         Appointment.query.options(joinedload(Appointment.doctor).load_only(User.username)).filter_by(patient_id=1)
+         .order_by(Appointment.appointment_date.asc(), Appointment.id.asc()).limit(21),
+         'ix_appointments_patient_date'),
+        ('entity mentions and users',
+         db.session.query(func.count(MessageEntity.id), func.count(distinct(MessageEntity.user_id))).filter(
+             MessageEntity.type == 'symptom', MessageEntity.value == 'fever',
+             MessageEntity.created_at >= datetime(2026, 1, 1)),
+         'ix_message_entities_type_value_created'),
+        ('symptom trend series',
+         db.session.query(SymptomDailyCount.day, SymptomDailyCount.bucket, SymptomDailyCount.mentions).filter(
+             SymptomDailyCount.dimension == 'language', SymptomDailyCount.symptom == 'fever',
+             SymptomDailyCount.day >= datetime(2026, 1, 1).date()).order_by(SymptomDailyCount.day.asc()),
+         'uq_symptom_daily_counts_key'),
+        ('consultation queue',
+         db.session.query(Consultation.id, Consultation.urgent, Consultation.created_at).filter(
+             Consultation.specialization == 'general', Consultation.status == 'pending',
+             Consultation.doctor_id.is_(None)),
+         'ix_consultations_specialization_status_doctor'),
+        ('assigned consultations',
+         Consultation.query.filter_by(doctor_id=1, status='pending').order_by(Consultation.created_at.asc()).limit(20),
+         'ix_consultations_doctor_status'),
+        ('booked slots of a day',
+         db.session.query(Appointment.doctor_id, Appointment.slot_key).filter(
+             Appointment.doctor_id.in_([1, 2, 3]), Appointment.slot_key.between(13770000, 13770480))
+         .order_by(Appointment.doctor_id, Appointment.slot_key),
+         'uq_appointments_doctor_slot'),
+    ]
+
+
+def explain(query):
+    """SQLite's query plan for an ORM query, one detail string per step"""
+    sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_plan(plan, index):
+    """Problems with `plan` for a query that should be served by `index` (empty if fine)"""
+    problems = []
+    if not any(f'INDEX {index}' in step for step in plan):
+        problems.append(f'does not use {index}')
+    for step in plan:
+        if step.startswith('SCAN ') and 'USING' not in step:
+            problems.append(f'full scan: {step}')
+        # Temp b-trees for DISTINCT aggregates are fine; sorting the rows themselves is not
+        if 'TEMP B-TREE FOR ORDER BY' in step or 'TEMP B-TREE FOR GROUP BY' in step:
+            problems.append(f'sorts: {step}')
+    return problems
+
+
+def check_all():
+    """Plan and problems for every hot query"""
+    return [(name, plan, check_plan(plan, index))
+            for name, query, index in hot_queries()
+            for plan in [explain(query)]]
+
+
+def init_app(app):
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Verify the hot queries use their composite indexes."""
+        failed = 0
+        for name, plan, problems in check_all():
+            click.echo(f"{'FAIL' if problems else 'ok  '}  {name}")
+            for step in plan:
+                click.echo(f"        {step}")
+            for problem in problems:
+                click.echo(f"        ! {problem}")
+            failed += bool(problems)
+        if failed:
+            click.echo(f"{failed} query plan(s) need attention")
+            sys.exit(1)
@@ -0,0 +1,355 @@
+"""
+Live question queue for doctors.
+
+Creating a question or consultation, answering a question or changing a
+consultation's status is noticed by session events at flush time and, once
+the transaction commits, published as a small delta event on the channel of
+its specialization. Doctors' dashboards subscribe over Server-Sent Events
+(/doctors/questions/stream) instead of reloading or polling /doctors/questions.
+
+Events are fanned out by an in-process broker. Every event is also appended
+to a small SQLite relay file shared by all app processes on the host; a relay
+thread in each process picks up the events other processes wrote and
+publishes them locally, and reconnecting clients replay what they missed
+from it via Last-Event-ID.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import Consultation, Question, User
+from startup import BASE_DIR, serving
+
+REPLAY_LIMIT = 500
+
+
+def channel_for(specialization):
+    return specialization or 'general'
+
+
+def question_tab(answered, urgent):
+    """Dashboard tab a question is listed in"""
+    return 'answered' if answered else ('urgent' if urgent else 'open')
+
+
+# -------------------------------
+# 🔹 In-process broker
+# -------------------------------
+class Subscription:
+    """Bounded event queue of one client; dropped by the broker if the client falls behind"""
+
+    def __init__(self, channel, maxsize):
+        self.channel = channel
+        self.events = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def get(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._channels.pop(subscription.channel, None)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.events.put_nowait(event)
+            except queue.Full:
+                # The client reconnects and replays from the relay
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+    def subscribers(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+
+# -------------------------------
+# 🔹 Cross-process relay
+# -------------------------------
+class Relay:
+    """Append-only SQLite event log shared by the app processes of one host"""
+
+    def __init__(self, path, retention=3600):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS feed_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                node TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_feed_events_channel_id ON feed_events (channel, id)")
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def append(self, node, channel, kind, payload):
+        conn = self._connection()
+        event_id = conn.execute(
+            "INSERT INTO feed_events (node, channel, kind, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+            (node, channel, kind, json.dumps(payload), time.time())
+        ).lastrowid
+        conn.commit()
+        return event_id
+
+    def last_id(self):
+        return self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM feed_events").fetchone()[0]
+
+    def after(self, last_id, channel=None, limit=REPLAY_LIMIT):
+        """Events after `last_id` as (id, node, channel, kind, payload), oldest first"""
+        sql = "SELECT id, node, channel, kind, payload FROM feed_events WHERE id > ?"
+        params = [last_id]
+        if channel is not None:
+            sql += " AND channel = ?"
+            params.append(channel)
+        rows = self._connection().execute(sql + " ORDER BY id LIMIT ?", params + [limit]).fetchall()
+        self._connection().commit()
+        return [(row[0], row[1], row[2], row[3], json.loads(row[4])) for row in rows]
+
+    def prune(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM feed_events WHERE created_at < ?", (time.time() - self.retention,))
+        conn.commit()
+
+
+# -------------------------------
+# 🔹 Feed
+# -------------------------------
+class QuestionFeed:
+    """Broker plus relay; the SSE endpoint subscribes here"""
+
+    def __init__(self):
+        self.node = uuid.uuid4().hex
+        self.broker = Broker()
+        self.relay = None
+        self.relay_interval = 1.0
+        self.keepalive = 15
+        self._relayed = 0
+        self._thread = None
+
+    def publish(self, channel, kind, payload):
+        event_id = None
+        if self.relay is not None:
+            try:
+                event_id = self.relay.append(self.node, channel, kind, payload)
+            except sqlite3.Error as e:
+                print(f"Question feed relay error: {str(e)}")
+        self.broker.publish(channel, (event_id, kind, payload))
+        return event_id
+
+    def replay(self, channel, last_id):
+        """Events of `channel` after `last_id` as (id, kind, payload)"""
+        if self.relay is None:
+            return []
+        return [(event_id, kind, payload) for event_id, _, _, kind, payload in self.relay.after(last_id, channel)]
+
+    def relay_once(self):
+        """Publish events other processes wrote since the last call; returns how many"""
+        published = 0
+        for event_id, node, channel, kind, payload in self.relay.after(self._relayed):
+            self._relayed = event_id
+            if node != self.node:
+                self.broker.publish(channel, (event_id, kind, payload))
+                published += 1
+        return published
+
+    def start_relay(self):
+        if self._thread is not None:
+            return
+        self._relayed = self.relay.last_id()
+
+        def loop():
+            pruned_at = time.monotonic()
+            while True:
+                time.sleep(self.relay_interval)
+                try:
+                    self.relay_once()
+                    if time.monotonic() - pruned_at > 60:
+                        self.relay.prune()
+                        pruned_at = time.monotonic()
+                except Exception as e:
+                    print(f"Question feed relay error: {str(e)}")
+
+        self._thread = threading.Thread(target=loop, name='question-feed-relay', daemon=True)
+        self._thread.start()
+
+
+feed = QuestionFeed()
+
+
+def sse(event_id, kind, payload):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {kind}", f"data: {json.dumps(payload)}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(channel, last_event_id=None):
+    """SSE text for one client: missed events first, then live ones, with keep-alive comments"""
+    subscription = feed.broker.subscribe(channel)
+    try:
+        yield "retry: 3000\n\n"
+        replayed = 0
+        if last_event_id is not None:
+            for event_id, kind, payload in feed.replay(channel, last_event_id):
+                replayed = event_id
+                yield sse(event_id, kind, payload)
+
+        while not subscription.overflowed:
+            item = subscription.get(timeout=feed.keepalive)
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, kind, payload = item
+            # Already sent from the relay while catching up
+            if event_id is not None and event_id <= replayed:
+                continue
+            yield sse(event_id, kind, payload)
+    finally:
+        feed.broker.unsubscribe(subscription)
+
+
+# -------------------------------
+# 🔹 Change capture
+# -------------------------------
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _before(state, column):
+    history = state.attrs[column].history
+    return history.deleted[0] if history.deleted else getattr(state.object, column)
+
+
+def _question_payload(question, **extra):
+    payload = {
+        'id': question.id,
+        'title': question.title,
+        'description': question.description,
+        'specialization': question.specialization,
+        'urgent': bool(question.urgent),
+        'answered': bool(question.answered),
+        'tab': question_tab(question.answered, question.urgent),
+        'created_at': _value(question.created_at),
+        'patient_id': question.patient_id,
+    }
+    payload.update(extra)
+    return payload
+
+
+def _question_events(session):
+    for question in session.new:
+        if isinstance(question, Question):
+            patient = session.connection().execute(
+                select(User.username).where(User.id == question.patient_id)
+            ).scalar()
+            yield channel_for(question.specialization), 'question.created', \
+                _question_payload(question, patient=patient)
+
+    for question in session.dirty:
+        if not isinstance(question, Question):
+            continue
+        state = inspect(question)
+        if not any(state.attrs[column].history.has_changes() for column in ('answered', 'urgent')):
+            continue
+        previous_tab = question_tab(_before(state, 'answered'), _before(state, 'urgent'))
+        kind = 'question.answered' if question.answered and previous_tab != 'answered' else 'question.updated'
+        yield channel_for(question.specialization), kind, _question_payload(
+            question, previous_tab=previous_tab,
+            answer=question.answer, answered_at=_value(question.answered_at)
+        )
+
+    for question in session.deleted:
+        if isinstance(question, Question):
+            yield channel_for(question.specialization), 'question.deleted', {
+                'id': question.id, 'previous_tab': question_tab(question.answered, question.urgent)
+            }
+
+
+def _consultation_events(session):
+    for consultation in session.new:
+        if isinstance(consultation, Consultation):
+            yield channel_for(consultation.specialization), 'consultation.created', {
+                'id': consultation.id, 'status': consultation.status,
+                'specialization': consultation.specialization, 'created_at': _value(consultation.created_at)
+            }
+    for consultation in session.dirty:
+        if isinstance(consultation, Consultation) and inspect(consultation).attrs.status.history.has_changes():
+            yield channel_for(consultation.specialization), 'consultation.updated', {
+                'id': consultation.id, 'status': consultation.status,
+                'previous_status': _before(inspect(consultation), 'status')
+            }
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    # New rows have their ids here and attribute history still shows what changed
+    events = list(_question_events(session)) + list(_consultation_events(session))
+    if events:
+        session.info.setdefault('question_feed', []).extend(events)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session):
+    for channel, kind, payload in session.info.pop('question_feed', ()):
+        feed.publish(channel, kind, payload)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('question_feed', None)
+
+
+def init_app(app):
+    """Open the relay and start relaying other processes' events"""
+    feed.relay = Relay(app.config.get('QUESTION_FEED_PATH') or os.path.join(BASE_DIR, 'question_feed.db'),
+                       retention=app.config.get('QUESTION_FEED_RETENTION', 3600))
+    feed.keepalive = app.config.get('QUESTION_FEED_KEEPALIVE', feed.keepalive)
+    feed.relay_interval = app.config.get('QUESTION_FEED_RELAY_INTERVAL', feed.relay_interval)
+    # CLI commands serve no dashboards, so there is nothing to relay to
+    if feed.relay_interval and serving():
+        feed.start_relay()
+    return feed
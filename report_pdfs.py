@@ -0,0 +1,198 @@
+"""
+Rendered medical report PDFs, cached on disk.
+
+Each report is rendered once per version into MEDICAL_REPORT_DIR as
+<id>-<timestamp>-<fingerprint>.pdf, the fingerprint covering edits that keep
+the timestamp. Creating or changing a report queues a 'reports.render' job
+once the transaction commits, so the PDF is usually
+ready before anyone asks for it; a download that finds no file renders it
+in the request. Files are written to a temporary name and renamed into place,
+so readers never see a half-written PDF, and older versions of a report are
+removed once the new one exists.
+
+Downloads are served from the file with conditional request support
+(ETag / Last-Modified, 304 on a match). All reports of a user can be
+downloaded as one ZIP that is streamed entry by entry without being built
+in memory.
+"""
+import glob
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+import jobs
+from jobs import task
+from extensions import db
+from models import MedicalReport
+
+# Columns that appear in the PDF
+RENDERED_COLUMNS = ('report_name', 'diagnosis', 'doctor_id', 'timestamp')
+CHUNK_SIZE = 64 * 1024
+
+
+def version(report):
+    """Cache key of a report dict: its id, timestamp and a fingerprint of the rendered fields"""
+    timestamp = report['timestamp']
+    fields = '\x1f'.join(str(report[column]) for column in RENDERED_COLUMNS)
+    fingerprint = hashlib.sha1(fields.encode('utf-8')).hexdigest()[:8]
+    return f"{report['id']}-{timestamp.strftime('%Y%m%d%H%M%S%f') if timestamp else 0}-{fingerprint}"
+
+
+def render(report):
+    """PDF bytes of a report dict"""
+    # ReportLab is only needed here, keep it off the startup path
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer)
+    p.drawString(100, 750, f"Report: {report['report_name']}")
+    p.drawString(100, 730, f"Diagnosis: {report['diagnosis']}")
+    p.drawString(100, 710, f"Doctor: {report['doctor_id'] if report['doctor_id'] else 'N/A'}")
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+# -------------------------------
+# 🔹 On-disk cache
+# -------------------------------
+class ReportCache:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, report):
+        return os.path.join(self.directory, f"{version(report)}.pdf")
+
+    def pdf(self, report):
+        """Path of the report's current PDF, rendering it first if it isn't cached"""
+        path = self.path(report)
+        if os.path.exists(path):
+            return path
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(render(report))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.discard(report['id'], keep=path)
+        return path
+
+    def discard(self, report_id, keep=None):
+        """Remove cached versions of a report other than `keep`"""
+        for path in glob.glob(os.path.join(self.directory, f"{report_id}-*.pdf")):
+            if path != keep:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+def cache():
+    return current_app.extensions['report_cache']
+
+
+@task('reports.render')
+def render_report(report_id):
+    report = db.session.get(MedicalReport, report_id)
+    if report is not None:
+        cache().pdf(report.to_dict())
+
+
+# -------------------------------
+# 🔹 Bulk ZIP download
+# -------------------------------
+class _Sink(io.RawIOBase):
+    """Unseekable file that collects what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        """What was written since the last drain, as zero or one chunk"""
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return [data] if data else []
+
+
+def zip_stream(reports):
+    """
+    ZIP archive of the given report dicts as a stream of byte chunks. The
+    sink isn't seekable, so zipfile writes sizes and CRCs after each entry and
+    only one chunk of a PDF is in memory at a time. PDFs are compressed
+    already and are stored as they are.
+    """
+    pdf_cache = cache()
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for report in reports:
+            timestamp = report['timestamp']
+            info = zipfile.ZipInfo(f"report_{report['id']}.pdf",
+                                   date_time=timestamp.timetuple()[:6] if timestamp else (1980, 1, 1, 0, 0, 0))
+            with open(pdf_cache.pdf(report), 'rb') as f, archive.open(info, 'w') as entry:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    entry.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    # Central directory
+    yield from sink.drain()
+
+
+# -------------------------------
+# 🔹 Re-render on change
+# -------------------------------
+def _changes_pdf(report):
+    state = inspect(report)
+    return any(state.attrs[column].history.has_changes() for column in RENDERED_COLUMNS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_report_changes(session, flush_context):
+    # New rows have their ids here
+    changed = {report.id for report in session.new if isinstance(report, MedicalReport)}
+    changed |= {report.id for report in session.dirty if isinstance(report, MedicalReport) and _changes_pdf(report)}
+    deleted = {report.id for report in session.deleted if isinstance(report, MedicalReport)}
+    if changed or deleted:
+        notes = session.info.setdefault('report_pdfs', {'changed': set(), 'deleted': set()})
+        notes['changed'] |= changed
+        notes['deleted'] |= deleted
+
+
+@event.listens_for(Session, 'after_commit')
+def _render_after_commit(session):
+    notes = session.info.pop('report_pdfs', None)
+    if not notes:
+        return
+    for report_id in notes['changed'] - notes['deleted']:
+        jobs.enqueue('reports.render', report_id=report_id)
+    pdf_cache = current_app.extensions.get('report_cache')
+    if pdf_cache is not None:
+        for report_id in notes['deleted']:
+            pdf_cache.discard(report_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('report_pdfs', None)
+
+
+def init_app(app):
+    pdf_cache = ReportCache(app.config['MEDICAL_REPORT_DIR'])
+    app.extensions['report_cache'] = pdf_cache
+    return pdf_cache
@@ -0,0 +1,143 @@
+"""
+Two-tier cache for LLM responses.
+
+Keys are a hash of the normalized user message, the language, the parts of the
+conversation context that go into the prompt (symptoms/topics) and the system
+prompt version. Lookups hit an in-process LRU first and then an on-disk SQLite
+table, so cached answers survive restarts. Entries expire after a TTL; expired
+rows are deleted when the cache opens and after every `purge_every` writes.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+_PUNCTUATION = re.compile(r'[!?.,;:\'"()\[\]{}।]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_message(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION.sub(' ', text.lower())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def make_key(message, language, context, prompt_version):
+    """Stable cache key for one prompt"""
+    context = context or {}
+    material = json.dumps({
+        "m": normalize_message(message),
+        "l": language,
+        "s": sorted(context.get('symptoms', [])),
+        "t": sorted(context.get('topics', [])),
+        "v": prompt_version
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """In-process LRU in front of a SQLite table, with TTLs and per-language hit metrics"""
+
+    def __init__(self, path, max_entries=1024, ttl=86400, purge_every=500):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._memory = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = Counter()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                language TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_expires_at ON llm_cache (expires_at)")
+        conn.commit()
+        self.purge_expired()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, language):
+        """Return the cached response or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats[(language, 'memory_hit')] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        row = self._connection().execute(
+            "SELECT response, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self._stats[(language, 'miss')] += 1
+                return None
+            self._stats[(language, 'disk_hit')] += 1
+            self._remember(key, row[1], row[0])
+        return row[0]
+
+    def set(self, key, language, response, ttl=None):
+        now = time.time()
+        expires_at = now + (ttl or self.ttl)
+        with self._lock:
+            self._remember(key, expires_at, response)
+            self._writes += 1
+            purge = self.purge_every and self._writes % self.purge_every == 0
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, language, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, language, response, now, expires_at)
+        )
+        conn.commit()
+        # Reads skip expired rows, but only this keeps the file from growing forever
+        if purge:
+            self.purge_expired()
+
+    def _remember(self, key, expires_at, response):
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self):
+        """Delete expired rows from disk; returns the number removed"""
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        conn.commit()
+        return removed
+
+    def stats(self):
+        """Hit/miss counts per language"""
+        with self._lock:
+            per_language = {}
+            for (language, outcome), count in self._stats.items():
+                per_language.setdefault(language, Counter())[outcome] += count
+            memory_entries = len(self._memory)
+        report = {}
+        for language, counts in per_language.items():
+            lookups = sum(counts.values())
+            hits = counts['memory_hit'] + counts['disk_hit']
+            report[language] = dict(counts, hit_rate=round(hits / lookups, 3) if lookups else 0.0)
+        return {"memory_entries": memory_entries, "languages": report}
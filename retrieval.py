@@ -0,0 +1,181 @@
+"""
+Local retrieval over the disease and herb knowledge base.
+
+Passages built from static/wholeData.json, NewData/NewData.json and
+NewData/HerbsData.json are embedded as L2-normalised TF-IDF vectors in a
+single NumPy matrix, so a query is one matrix-vector product followed by a
+top-k selection. Everything is computed from local files; no network is used.
+"""
+import json
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = {
+    'a', 'about', 'after', 'all', 'also', 'am', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'been',
+    'but', 'by', 'can', 'could', 'do', 'does', 'for', 'from', 'had', 'has', 'have', 'having', 'he',
+    'her', 'his', 'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or',
+    'our', 'she', 'should', 'so', 'some', 'than', 'that', 'the', 'their', 'them', 'then', 'there',
+    'these', 'they', 'this', 'to', 'up', 'very', 'was', 'we', 'were', 'what', 'when', 'which',
+    'while', 'who', 'why', 'will', 'with', 'would', 'you', 'your', 'since', 'feel', 'feeling',
+    'get', 'getting', 'got', 'tell', 'please', 'take', 'used'
+}
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with a crude plural strip"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _unique(values):
+    seen = set()
+    result = []
+    for value in values:
+        if value and value.lower() not in seen:
+            seen.add(value.lower())
+            result.append(value)
+    return result
+
+
+def _listing(label, values, limit=8):
+    values = _unique(values)[:limit]
+    return f" {label}: {', '.join(values)}." if values else ''
+
+
+def disease_passages(records):
+    """One passage per disease, merging the per age group / gender records"""
+    merged = {}
+    for record in records:
+        title = ' '.join(record['name'].replace('_', ' ').lower().split())
+        entry = merged.setdefault(title, {
+            'descriptions': [], 'symptom': [], 'remedy': [], 'ayurvedicRemedies': [], 'ayurvedicDiet': [], 'yoga': []
+        })
+        entry['descriptions'].append(record.get('description') or '')
+        for field in ('symptom', 'remedy', 'ayurvedicRemedies', 'ayurvedicDiet', 'yoga'):
+            entry[field].extend(record.get(field) or [])
+
+    passages = []
+    for title, entry in merged.items():
+        text = (f"{title.capitalize()}: {' '.join(_unique(entry['descriptions'])[:1])}"
+                + _listing('Symptoms', entry['symptom'])
+                + _listing('Remedies', entry['remedy'])
+                + _listing('Ayurvedic remedies', entry['ayurvedicRemedies'])
+                + _listing('Ayurvedic diet', entry['ayurvedicDiet'], limit=5)
+                + _listing('Yoga', entry['yoga'], limit=4))
+        passages.append({'source': 'disease', 'title': title, 'text': text})
+    return passages
+
+
+def herb_passages(herbs):
+    """One passage per condition, listing the herbs used for it"""
+    uses = {}
+    for herb in herbs:
+        names = ', '.join(n for n in (herb.get('englishName'), herb.get('hindiName') and f"Hindi: {herb['hindiName']}") if n)
+        label = f"{herb['name'].capitalize()} ({names})" if names else herb['name'].capitalize()
+        for use in herb.get('usedFor', []):
+            disease = ' '.join(use.get('disease', '').lower().split())
+            if disease:
+                # "joint pain" and "joint pains" are the same condition
+                entry = uses.setdefault(' '.join(tokenize(disease)), {'disease': disease, 'lines': []})
+                entry['lines'].append(f"{label}: {use.get('symptom', '').strip()}")
+
+    return [
+        {'source': 'herb', 'title': f"herbs for {entry['disease']}",
+         'text': f"Herbs for {entry['disease']}. " + ' '.join(entry['lines'])}
+        for entry in uses.values()
+    ]
+
+
+def snippet(text, max_chars=400):
+    """Cut `text` at a word boundary so it fits in `max_chars`"""
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 3].rsplit(' ', 1)[0].rstrip(',;:') + '...'
+
+
+class Retriever:
+    """TF-IDF matrix over knowledge base passages with cosine top-k search"""
+
+    def __init__(self, passages, title_weight=0.5):
+        self.passages = passages
+        self.title_weight = title_weight
+        # Titles get their own matrix so a passage *about* "fever" outranks a
+        # long one that merely mentions it
+        titles = [tokenize(p['title']) for p in passages]
+        documents = [title + tokenize(p['text']) for title, p in zip(titles, passages)]
+
+        document_frequency = Counter()
+        for tokens in documents:
+            document_frequency.update(set(tokens))
+        self.vocabulary = {term: i for i, term in enumerate(sorted(document_frequency))}
+
+        n = len(documents)
+        self.idf = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, df in document_frequency.items():
+            self.idf[self.vocabulary[term]] = math.log((1 + n) / (1 + df)) + 1
+
+        self.matrix = self._vectors(documents)
+        self.title_matrix = self._vectors(titles)
+
+    def _vectors(self, documents):
+        """Row-normalised TF-IDF matrix for tokenized documents"""
+        matrix = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            for term, count in Counter(tokens).items():
+                matrix[row, self.vocabulary[term]] = 1 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    @classmethod
+    def from_files(cls, disease_paths=(), herbs_path=None):
+        records = []
+        for path in disease_paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                records.extend(json.load(f))
+        passages = disease_passages(records)
+        if herbs_path:
+            with open(herbs_path, 'r', encoding='utf-8') as f:
+                passages.extend(herb_passages(json.load(f)))
+        return cls(passages)
+
+    def embed(self, text):
+        """L2-normalised TF-IDF vector for `text`; unknown terms are ignored"""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, count in Counter(tokenize(text)).items():
+            index = self.vocabulary.get(term)
+            if index is not None:
+                vector[index] = 1 + math.log(count)
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, query, k=3, min_score=0.15):
+        """Return up to `k` (score, passage) pairs, best first"""
+        vector = self.embed(query)
+        if not vector.any():
+            return []
+        scores = (1 - self.title_weight) * (self.matrix @ vector) + self.title_weight * (self.title_matrix @ vector)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.passages[i]) for i in top if scores[i] >= min_score]
+
+    def stats(self):
+        return {
+            "passages": len(self.passages),
+            "terms": len(self.vocabulary),
+            "matrix_mb": round((self.matrix.nbytes + self.title_matrix.nbytes) / 1e6, 1)
+        }
@@ -1,20 +1,47 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
 from models import db, ChatMessage, Conversation, User
+from sqlalchemy import func, select
+import copy
 import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from types import SimpleNamespace
 
 # Import custom chatbot processor
 from chatbot_processor import ChatbotProcessor
+from context_window import ContextWindow
+import jobs
+from jobs import task
+from unit_of_work import UnitOfWork, db_timing
+from conversation_cache import state_cache
+from pagination import keyset_page, page_size
+from archive import history_page
+import message_entities
+import symptom_trends
+import export
 
 chatbot = Blueprint('chatbot', __name__)
 
 # Initialize chatbot processor
 processor = ChatbotProcessor()
 
+# Prompt history is limited to the most recent turns within this token budget
+context_window = ContextWindow(budget=int(os.environ.get('CHAT_CONTEXT_TOKENS', 1500)))
+
+# LLM calls raced against CHAT_LLM_DEADLINE run here so they can outlive the request
+llm_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('CHAT_LLM_WORKERS', 8)),
+                                  thread_name_prefix='llm')
+
+# The chat page renders only the newest messages; older ones are loaded on demand
+CHAT_PAGE_SIZE = 30
+# Characters of the last message shown in the conversation list
+PREVIEW_CHARS = 80
+
 @chatbot.route('/chat')
 @login_required
 def chat_interface():
@@ -46,166 +73,530 @@ def chat_interface():
         db.session.add(conversation)
         db.session.commit()
     
-    # Get chat history for this conversation
-    chat_history = ChatMessage.query.filter_by(
-        conversation_id=conversation_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    # Newest page of the chat history; the page asks for older ones as the user scrolls up
+    chat_history, older_cursor = history_page(conversation, limit=CHAT_PAGE_SIZE)
+    chat_history.reverse()
     
     return render_template('chat.html', 
                          conversation_id=conversation_id,
-                         chat_history=chat_history)
+                         chat_history=chat_history,
+                         older_cursor=older_cursor)
 
-@chatbot.route('/send', methods=['POST'])
-@login_required
-def send_message():
-    """API endpoint to send a message to the chatbot"""
-    data = request.json
-    user_message = data.get('message')
-    conversation_id = data.get('conversation_id')
-    
-    if not user_message:
-        return jsonify({'error': 'No message provided'}), 400
+def _new_conversation(conversation_id, language='en'):
+    """Create a new conversation with an empty context (not yet added to the session)"""
+    return Conversation(
+        conversation_id=conversation_id,
+        user_id=current_user.id,
+        language=language,
+        context_data=json.dumps({
+            'symptoms': [],
+            'topics': [],
+            'last_updated': datetime.now().isoformat()
+        })
+    )
+
+def _prepare_turn(user_message, conversation_id, uow):
+    """
+    Shared first half of a chat turn: resolve the conversation from the state
+    cache, stage the user message on `uow` and select the prompt window.
+    Nothing is written until the caller commits with _commit_turn(). Returns
+    a dict describing the turn.
+    """
+    # One version check when the conversation is cached; loaded otherwise
+    state = state_cache.get(conversation_id, current_user.id) if conversation_id else None
+    conversation_id = conversation_id or str(uuid.uuid4())
     
-    if not conversation_id:
+    new_conversation = None
+    if state is None:
         # Create new conversation if none exists
-        conversation_id = str(uuid.uuid4())
-        conversation = Conversation(
-            conversation_id=conversation_id,
-            user_id=current_user.id,
-            language='en',  # Default language
-            context_data=json.dumps({
-                'symptoms': [],
-                'topics': [],
-                'last_updated': datetime.now().isoformat()
-            })
-        )
-        db.session.add(conversation)
-        db.session.commit()
-    else:
-        # Get existing conversation
-        conversation = Conversation.query.filter_by(
-            conversation_id=conversation_id,
-            user_id=current_user.id
-        ).first()
-        
-        if not conversation:
-            # Create if it doesn't exist (should not happen normally)
-            conversation = Conversation(
-                conversation_id=conversation_id,
-                user_id=current_user.id,
-                language='en',
-                context_data=json.dumps({
-                    'symptoms': [],
-                    'topics': [],
-                    'last_updated': datetime.now().isoformat()
-                })
-            )
-            db.session.add(conversation)
-            db.session.commit()
+        new_conversation = uow.add(_new_conversation(conversation_id))
+        state = state_cache.new_state(new_conversation)
+    view = state_cache.snapshot(state)
     
-    # Detect language and update conversation language if needed
+    # Detect the language; the conversation follows it once the turn is committed
     detected_language = processor.detect_language(user_message)
-    if detected_language != conversation.language:
-        conversation.language = detected_language
     
-    # Extract intent and entities from user message
-    intent = processor.detect_intent(user_message, detected_language)
+    # Entities feed the context the reply is built from; intent is filled in by chat.enrich
     entities = processor.extract_entities(user_message, detected_language)
     
     # Convert entities to JSON for storage
     entities_json = json.dumps(entities) if entities else None
     
-    # Save user message to database
-    user_chat = ChatMessage(
+    # Stage user message
+    user_chat = uow.add(ChatMessage(
         conversation_id=conversation_id,
         content=user_message,
         is_bot=False,
         user_id=current_user.id,
         language=detected_language,
-        intent=intent,
         entities=entities_json
+    ))
+    
+    # Update the context with the symptoms from this message; the cache writes it back later
+    updated_context = processor.update_context_symptoms(user_message, view.context, entities)
+    if new_conversation is not None:
+        # A new conversation is inserted with its first context, so nothing is left to write back
+        new_conversation.language = detected_language
+        new_conversation.context_data = json.dumps(updated_context)
+        state.language = detected_language
+        state.context = copy.deepcopy(updated_context)
+    
+    # Most recent turns within the token budget; folding older turns into the summary is deferred
+    window, truncated = context_window.select(view, pending=[user_chat], history=view.recent)
+    # Plain copies so the history stays usable in streams and worker threads
+    chat_history = [SimpleNamespace(is_bot=m.is_bot, content=m.content) for m in window]
+    
+    return {
+        'conversation_id': conversation_id,
+        'language': detected_language,
+        'entities': entities,
+        'chat_history': chat_history,
+        'summary': view.summary,
+        'context': updated_context,
+        'user_message': user_chat,
+        'refresh_summary': context_window.needs_fold(view, window, truncated),
+        'state': state,
+        'new_conversation': new_conversation is not None
+    }
+
+def _commit_turn(uow, turn, bot_chat):
+    """Commit the turn with a version bump and apply it to the cached conversation state"""
+    if turn['new_conversation']:
+        version = 1
+    else:
+        version = state_cache.touch(uow.session, turn['conversation_id'])
+    uow.commit()
+    state_cache.commit_turn(turn['conversation_id'], version, [turn['user_message'], bot_chat],
+                            symptoms=turn['context'].get('symptoms', []), language=turn['language'],
+                            state=turn['state'])
+
+def _after_commit(turn):
+    """Post-response work the reply doesn't depend on; queued once the turn is saved"""
+    jobs.enqueue('chat.enrich', message_id=turn['user_message'].id)
+    if turn['refresh_summary']:
+        jobs.enqueue('chat.summary', conversation_id=turn['conversation_id'])
+
+def _bot_message(conversation_id, content, language, user_id):
+    return ChatMessage(
+        conversation_id=conversation_id,
+        content=content,
+        is_bot=True,
+        user_id=user_id,
+        language=language
     )
-    db.session.add(user_chat)
+
+def _save_bot_message(conversation_id, content, language, user_id):
+    bot_chat = _bot_message(conversation_id, content, language, user_id)
+    db.session.add(bot_chat)
+    version = state_cache.touch(db.session, conversation_id)
     db.session.commit()
+    state_cache.commit_turn(conversation_id, version, [bot_chat])
+    return bot_chat
+
+def _respond_within_deadline(user_message, turn, deadline):
+    """
+    Race the LLM against `deadline` seconds. On a miss, return the rule-based
+    fallback right away and let the LLM call finish in the background.
+    Returns (response, late_future); the caller hands late_future to
+    _deliver_late_reply once the turn is committed.
+    """
+    language = turn['language']
+    future = llm_executor.submit(processor.llm_response, user_message, turn['chat_history'],
+                                 turn['context'], language, turn['summary'])
+    
+    try:
+        reply = future.result(timeout=deadline)
+    except FutureTimeout:
+        return processor.fallback_response(user_message, turn['context'], language), future
+    
+    if reply is None:
+        reply = processor.fallback_response(user_message, turn['context'], language)
+    return reply, None
+
+def _deliver_late_reply(app, future, conversation_id, language, user_id):
+    """Save an LLM answer that missed the deadline as an extra bot message"""
+    try:
+        reply = future.result()
+    except Exception as e:
+        print(f"Error generating late response: {str(e)}", file=sys.stderr)
+        return
+    if reply is None:
+        return
+    
+    with app.app_context():
+        _save_bot_message(conversation_id, reply, language, user_id)
+
+# -------------------------------
+# 🔹 Background jobs
+# -------------------------------
+@task('chat.enrich')
+def enrich_message(message_id):
+    """Intent, sentiment history, topics and analytics counters for a saved user message"""
+    message = db.session.get(ChatMessage, message_id)
+    if message is None:
+        return
+    language = message.language or 'en'
     
-    # Get conversation history
-    chat_history = ChatMessage.query.filter_by(
-        conversation_id=conversation_id
-    ).order_by(ChatMessage.created_at.asc()).limit(10).all()
+    message.intent = processor.detect_intent(message.content, language)
+    sentiment = processor.get_sentiment(message.content, language)
     
-    # Get current context and update it with information from this message
-    current_context = conversation.get_context()
-    updated_context = processor.update_context_from_message(user_message, current_context)
+    def enrich_context(context):
+        context = processor.update_context_topics(message.content, context)
+        # A retried job must not record the same reading twice
+        if not any(entry.get('message_id') == message_id for entry in context.get('sentiment_history', [])):
+            processor.record_sentiment(context, sentiment, message_id)
+        return context
     
-    # Update conversation context
-    conversation.context_data = json.dumps(updated_context)
+    # Through the state cache when this process holds the conversation, so the next turn's
+    # cached copy stays current; otherwise a versioned write to the row
+    if not state_cache.update_context(message.conversation_id, enrich_context):
+        conversation = Conversation.query.filter_by(conversation_id=message.conversation_id).first()
+        if conversation is not None:
+            conversation.context_data = json.dumps(enrich_context(conversation.get_context()))
+    recorded = message_entities.record_message(db.session, message, processor.fallback_engine.aliases)
+    symptom_trends.record_chat(db.session, message, [row['value'] for row in recorded if row['type'] == 'symptom'])
     db.session.commit()
     
+    # Counted only once the enrichment is saved, so a retried job doesn't count twice
+    jobs.increment('chat.messages')
+    jobs.increment(f'chat.language.{language}')
+    jobs.increment(f'chat.intent.{message.intent}')
+    for entity in message.get_entities():
+        if entity['type'] == 'symptom':
+            jobs.increment(f"chat.symptom.{entity['value']}")
+
+@task('chat.summary')
+def refresh_summary(conversation_id):
+    """Fold turns that left the prompt window into the conversation summary"""
+    conversation = Conversation.query.filter_by(conversation_id=conversation_id).first()
+    if conversation is None:
+        return
+    context_window.build(conversation)
+    db.session.commit()
+
+def _sse(event, data):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@chatbot.route('/send', methods=['POST'])
+@login_required
+def send_message():
+    """API endpoint to send a message to the chatbot"""
+    data = request.json
+    user_message = data.get('message')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    # The whole turn (conversation, both messages, context) is committed once
+    uow = UnitOfWork()
+    turn = _prepare_turn(user_message, data.get('conversation_id'), uow)
+    conversation_id = turn['conversation_id']
+    
     try:
-        # Generate bot response
-        bot_response = processor.generate_response(
-            user_message, 
-            chat_history, 
-            updated_context
-        )
+        # Generate bot response, bounded by the LLM deadline when one is configured
+        deadline = current_app.config.get('CHAT_LLM_DEADLINE')
+        late_future = None
+        if deadline:
+            bot_response, late_future = _respond_within_deadline(user_message, turn, deadline)
+        else:
+            bot_response = processor.generate_response(
+                user_message, 
+                turn['chat_history'], 
+                turn['context'],
+                turn['summary']
+            )
         
         # Save bot response to database
-        bot_chat = ChatMessage(
-            conversation_id=conversation_id,
-            content=bot_response,
-            is_bot=True,
-            user_id=current_user.id,
-            language=detected_language
+        bot_chat = uow.add(_bot_message(conversation_id, bot_response, turn['language'], current_user.id))
+        _commit_turn(uow, turn, bot_chat)
+    except Exception as e:
+        uow.rollback()
+        print(f"Error generating response: {str(e)}", file=sys.stderr)
+        return jsonify({'error': str(e)}), 500
+    
+    _after_commit(turn)
+    if late_future is not None:
+        # Attached after the commit so the late answer always lands after this one
+        app = current_app._get_current_object()
+        user_id = current_user.id
+        late_future.add_done_callback(
+            lambda f: _deliver_late_reply(app, f, conversation_id, turn['language'], user_id)
         )
-        db.session.add(bot_chat)
-        db.session.commit()
+    
+    # Return response to client
+    return jsonify({
+        'message': bot_response,
+        'message_id': bot_chat.id,
+        'pending_reply': late_future is not None,
+        'conversation_id': conversation_id,
+        'entities_detected': turn['entities'],
+        'language': turn['language']
+    })
+
+@chatbot.route('/send/stream', methods=['POST'])
+@login_required
+def send_message_stream():
+    """
+    Streaming variant of /send. Emits Server-Sent Events:
+    'meta' once, 'token' per chunk as it arrives from the model, then 'done'
+    after the turn has been saved (or 'error').
+    """
+    data = request.json
+    user_message = data.get('message')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    # Staged now, committed once the stream has completed
+    uow = UnitOfWork()
+    turn = _prepare_turn(user_message, data.get('conversation_id'), uow)
+    conversation_id = turn['conversation_id']
+    # Resolve now; the ORM user isn't usable once the response starts streaming
+    user_id = current_user.id
+    
+    def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        parts = []
         
-        # Return response to client
-        return jsonify({
-            'message': bot_response,
+        yield _sse('meta', {
             'conversation_id': conversation_id,
-            'entities_detected': entities,
-            'language': detected_language
+            'entities_detected': turn['entities'],
+            'language': turn['language']
         })
         
-    except Exception as e:
-        print(f"Error generating response: {str(e)}", file=sys.stderr)
-        return jsonify({'error': str(e)}), 500
+        try:
+            for token in processor.stream_response(user_message, turn['chat_history'], turn['context'],
+                                                   turn['summary']):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(token)
+                yield _sse('token', {'text': token})
+            
+            # Persist the turn once the stream has completed
+            bot_response = ''.join(parts).strip()
+            bot_chat = uow.add(_bot_message(conversation_id, bot_response, turn['language'], user_id))
+            _commit_turn(uow, turn, bot_chat)
+        except Exception as e:
+            uow.rollback()
+            print(f"Error streaming response: {str(e)}", file=sys.stderr)
+            yield _sse('error', {'error': str(e)})
+            return
+        finally:
+            # Client went away mid-stream: drop the staged turn
+            uow.close()
+        
+        _after_commit(turn)
+        db_ms, db_queries = db_timing()
+        yield _sse('done', {
+            'message': bot_response,
+            'message_id': bot_chat.id,
+            'first_token_ms': first_token_ms,
+            'db_ms': db_ms,
+            'db_queries': db_queries
+        })
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@chatbot.route('/replies/<conversation_id>')
+@login_required
+def get_replies(conversation_id):
+    """Poll for bot messages added after `after` (e.g. LLM answers that missed the deadline)"""
+    Conversation.query.filter_by(
+        conversation_id=conversation_id,
+        user_id=current_user.id
+    ).first_or_404()
+    
+    after = request.args.get('after', 0, type=int)
+    messages = ChatMessage.query.filter(
+        ChatMessage.conversation_id == conversation_id,
+        ChatMessage.is_bot.is_(True),
+        ChatMessage.id > after
+    ).order_by(ChatMessage.id.asc()).all()
+    
+    return jsonify({'messages': [msg.to_dict() for msg in messages]})
+
+@chatbot.route('/llm/metrics')
+@login_required
+def llm_metrics():
+    """Per-outcome LLM call metrics, circuit breaker state and response cache hits"""
+    stats = processor.llm.stats()
+    stats['cache'] = processor.response_cache.stats()
+    return jsonify(stats)
+
+@chatbot.route('/analytics/entities')
+@login_required
+def entity_analytics():
+    """
+    Entity aggregates over the last `days` days: the top `limit` values of
+    `type` (default symptom), or mentions, users and daily counts of `value`.
+    """
+    if current_user.role != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    kind = request.args.get('type', 'symptom')
+    days = min(max(request.args.get('days', 7, type=int), 1), 366)
+    since = datetime.utcnow() - timedelta(days=days)
+    value = request.args.get('value')
+    
+    result = {'type': kind, 'days': days, 'since': since.isoformat()}
+    if value:
+        canonical = processor.fallback_engine.canonical(value) if kind == 'symptom' else value.lower()
+        result.update(message_entities.value_summary(kind, canonical, since=since))
+    else:
+        result['top'] = message_entities.top_values(kind, since=since,
+                                                    limit=page_size(request.args.get('limit', type=int), 10, 100))
+    return jsonify(result)
+
+@chatbot.route('/analytics/trends')
+@login_required
+def symptom_trend_analytics():
+    """
+    Precomputed daily symptom counts over the last `days` days by `dimension`
+    (language, age_group or specialization): the top symptoms, optionally
+    within one `bucket`, or the per-bucket daily series of one `symptom`.
+    """
+    if current_user.role != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    dimension = request.args.get('dimension', 'language')
+    if dimension not in symptom_trends.DIMENSIONS:
+        return jsonify({'error': f"dimension must be one of {', '.join(symptom_trends.DIMENSIONS)}"}), 400
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    symptom = request.args.get('symptom')
+    
+    result = {'dimension': dimension, 'days': days, 'since': since.isoformat()}
+    if symptom:
+        result['symptom'] = processor.fallback_engine.canonical(symptom)
+        result['buckets'] = symptom_trends.series(dimension, result['symptom'], since)
+    else:
+        result['bucket'] = request.args.get('bucket')
+        result['top'] = symptom_trends.top_symptoms(dimension, since, bucket=result['bucket'],
+                                                    limit=page_size(request.args.get('limit', type=int), 10, 100))
+    return jsonify(result)
 
 @chatbot.route('/history/<conversation_id>')
 @login_required
 def get_history(conversation_id):
-    """Get chat history for a specific conversation"""
+    """
+    Get one page of chat history: the newest `limit` messages, or the ones
+    before the `before` cursor. Messages are in chronological order;
+    `next_cursor` fetches the page before them.
+    """
     # Verify the conversation belongs to the current user
     conversation = Conversation.query.filter_by(
         conversation_id=conversation_id,
         user_id=current_user.id
     ).first_or_404()
     
-    # Get chat messages
-    messages = ChatMessage.query.filter_by(
-        conversation_id=conversation_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    try:
+        # Continues into the cold-storage archive for old, archived conversations
+        messages, next_cursor = history_page(
+            conversation,
+            cursor=request.args.get('before'),
+            limit=page_size(request.args.get('limit', type=int))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    messages.reverse()
     
     return jsonify({
         'conversation_id': conversation_id,
         'language': conversation.language,
-        'messages': [msg.to_dict() for msg in messages],
-        'context': conversation.get_context()
+        'messages': messages,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        # The cached context may hold changes that haven't been written back yet
+        'context': state_cache.peek_context(conversation) or conversation.get_context()
     })
 
 @chatbot.route('/conversations')
 @login_required
 def list_conversations():
-    """List all conversations for the current user"""
-    conversations = Conversation.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Conversation.last_updated.desc()).all()
+    """
+    List the current user's conversations, most recently active first, as
+    summary rows (message count and last message preview, no context data).
+    Paginated with the `before` cursor from `next_cursor`.
+    """
+    messages = ChatMessage.conversation_id == Conversation.conversation_id
+    message_count = select(func.count(ChatMessage.id)).where(messages).scalar_subquery()
+    last_message = select(func.substr(ChatMessage.content, 1, PREVIEW_CHARS)).where(messages).order_by(
+        ChatMessage.created_at.desc(), ChatMessage.id.desc()
+    ).limit(1).scalar_subquery()
+    
+    query = db.session.query(
+        Conversation.id,
+        Conversation.conversation_id,
+        Conversation.language,
+        Conversation.created_at,
+        Conversation.last_updated,
+        Conversation.archived_at,
+        message_count.label('message_count'),
+        last_message.label('last_message')
+    ).filter(Conversation.user_id == current_user.id)
+    
+    try:
+        rows, next_cursor = keyset_page(
+            query, Conversation.last_updated, Conversation.id,
+            cursor=request.args.get('before'),
+            limit=page_size(request.args.get('limit', type=int))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
-        'conversations': [conv.to_dict() for conv in conversations]
+        'conversations': [{
+            'conversation_id': row.conversation_id,
+            'language': row.language,
+            'created_at': row.created_at.isoformat(),
+            'last_updated': row.last_updated.isoformat(),
+            # Live messages only; archived ones are still reachable through the history
+            'message_count': row.message_count,
+            'last_message': row.last_message,
+            'archived': row.archived_at is not None
+        } for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
     })
 
+@chatbot.route('/export')
+@login_required
+def export_chats():
+    """
+    Stream the current user's conversations, messages (live and archived) and
+    chat history as NDJSON (default) or CSV. Filters: `since` / `until` (ISO
+    timestamps), `language` and `type` (repeatable). Every record has a
+    `cursor`; pass the last one received back as `cursor` to resume.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    types = request.args.getlist('type') or list(export.TYPES)
+    cursor = request.args.get('cursor')
+    try:
+        if fmt not in export.FORMATS or not set(types) <= set(export.TYPES):
+            raise ValueError(f"format must be one of {', '.join(export.FORMATS)}, type one of {', '.join(export.TYPES)}")
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        if cursor:
+            export.decode_cursor(cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    records = export.records(user_id=current_user.id, since=since, until=until,
+                             language=request.args.get('language'), types=types, cursor=cursor)
+    # A resumed CSV export continues the first file, so it gets no second header
+    body = export.blocks(export.lines(records, fmt, header=not cursor))
+    return Response(stream_with_context(body),
+                    mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={
+                        'Content-Disposition': f'attachment; filename=chat-export.{fmt}',
+                        'X-Accel-Buffering': 'no'
+                    })
+
 @chatbot.route('/new_conversation', methods=['POST'])
 @login_required
 def new_conversation():
@@ -1,11 +1,26 @@
-from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash
+from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash, Response, current_app
 from flask_login import login_required, current_user
 from models import db, User, Question, Consultation, Appointment, MedicalReport
-from sqlalchemy import desc
-from datetime import datetime
+from sqlalchemy import desc, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+from pagination import keyset_page
+import symptom_trends
+import availability
+import question_feed
+from consultation_router import router
 
 doctors = Blueprint("doctors", __name__)
 
+DASHBOARD_PAGE_SIZE = 20
+# Question tabs of the dashboard and the rows each one shows
+QUESTION_TABS = (
+    ('urgent', {'answered': False, 'urgent': True}),
+    ('open', {'answered': False, 'urgent': False}),
+    ('answered', {'answered': True}),
+)
+
 # -------------------------------
 # 🔹 Doctor Dashboard
 # -------------------------------
@@ -16,24 +31,58 @@ def dashboard():
         flash('Access denied. Doctor privileges required.', 'danger')
         return redirect(url_for('index'))
     
-    # Get ALL questions for this doctor's specialization (both answered and unanswered)
-    # But order them with urgent unanswered first, then non-urgent unanswered, then answered ones
-    questions = Question.query.filter_by(
-        specialization=current_user.specialization
-    ).order_by(
-        Question.answered.asc(),  # Unanswered first
-        Question.urgent.desc(),   # Urgent first
-        Question.created_at.desc() # Most recent first
-    ).all()
-    
-    # Get appointments for this doctor
-    appointments = Appointment.query.filter_by(
-        doctor_id=current_user.id
-    ).order_by(Appointment.appointment_date.asc()).all()
+    # Questions for this doctor's specialization, one tab each for urgent unanswered,
+    # other unanswered and answered ones, newest first. Every tab is paged on its own
+    # and loads the patients' names in the same query.
+    question_tabs = {}
+    try:
+        for tab, filters in QUESTION_TABS:
+            query = Question.query.options(
+                joinedload(Question.patient).load_only(User.username)
+            ).filter_by(specialization=current_user.specialization, **filters)
+            question_tabs[tab] = keyset_page(query, Question.created_at, Question.id,
+                                             cursor=request.args.get(f'{tab}_before'), limit=DASHBOARD_PAGE_SIZE)
+        
+        # Appointments for this doctor, earliest first
+        appointments, next_appointments = keyset_page(
+            Appointment.query.options(
+                joinedload(Appointment.patient).load_only(User.username)
+            ).filter_by(doctor_id=current_user.id),
+            Appointment.appointment_date, Appointment.id,
+            cursor=request.args.get('appointments_after'), limit=DASHBOARD_PAGE_SIZE, ascending=True
+        )
+    except ValueError:
+        flash('That page link is no longer valid.', 'warning')
+        return redirect(url_for('doctors.dashboard'))
+    
+    # Consultations the router assigned to this doctor, oldest first
+    consultations = Consultation.query.filter_by(
+        doctor_id=current_user.id, status='pending'
+    ).order_by(Consultation.created_at.asc()).limit(DASHBOARD_PAGE_SIZE).all()
+    
+    # Tab sizes in one grouped query
+    question_counts = {tab: 0 for tab, _ in QUESTION_TABS}
+    for answered, urgent, count in db.session.query(
+        Question.answered, Question.urgent, func.count(Question.id)
+    ).filter_by(specialization=current_user.specialization).group_by(Question.answered, Question.urgent):
+        question_counts['answered' if answered else ('urgent' if urgent else 'open')] += count
+    
+    # Symptom trends of the last week, read from the precomputed daily rollups
+    since = datetime.utcnow().date() - timedelta(days=6)
+    trends = {
+        'specialization': symptom_trends.top_symptoms('specialization', since,
+                                                      bucket=current_user.specialization, limit=5),
+        'chat': symptom_trends.top_symptoms('language', since, limit=5)
+    }
     
     return render_template('doctor_dashboard.html',
-                         questions=questions,
-                         appointments=appointments)
+                         question_tabs=question_tabs,
+                         question_counts=question_counts,
+                         active_tab=request.args.get('tab', 'urgent'),
+                         appointments=appointments,
+                         next_appointments=next_appointments,
+                         consultations=consultations,
+                         trends=trends)
 
 # -------------------------------
 # 🔹 Fetch Unanswered Questions (Sorted by Urgency)
@@ -51,6 +100,32 @@ def get_questions():
     
     return jsonify({'questions': [q.to_dict() for q in questions]})
 
+# -------------------------------
+# 🔹 Live Question Feed (Server-Sent Events)
+# -------------------------------
+@doctors.route('/questions/stream')
+@login_required
+def question_stream():
+    """New and changed questions/consultations of the doctor's specialization as they happen"""
+    if current_user.role != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    # EventSource sends Last-Event-ID on reconnect; missed events are replayed first
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    # An open dashboard keeps the doctor in the consultation rotation
+    channel = question_feed.channel_for(current_user.specialization)
+    events = router.while_streaming(current_app._get_current_object(), current_user._get_current_object(),
+                                    question_feed.stream(channel, last_event_id))
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # -------------------------------
 # 🔹 Answer a Patient's Question
 # -------------------------------
@@ -139,12 +214,29 @@ def handle_consultation(consultation_id):
     if not response:
         return jsonify({'error': 'Response is required'}), 400
     
-    consultation.status = 'answered'
-    consultation.doctor_id = current_user.id
-    consultation.response = response
-    
+    # Only the assigned doctor (or anyone, while it is still queued) can answer,
+    # decided in the UPDATE itself so two doctors can't both take it
+    assigned_to = consultation.doctor_id
+    answered = db.session.execute(
+        update(Consultation).where(
+            Consultation.id == consultation.id,
+            Consultation.status == 'pending',
+            or_(Consultation.doctor_id.is_(None), Consultation.doctor_id == current_user.id)
+        ).values(status='answered', doctor_id=current_user.id, response=response, updated_at=datetime.utcnow())
+    ).rowcount
     db.session.commit()
     
+    if not answered:
+        flash('This consultation is being handled by another doctor.', 'warning')
+        return redirect(url_for('doctors.dashboard'))
+    
+    # A Core UPDATE isn't seen by the feed's session capture, so tell the dashboards here
+    question_feed.feed.publish(question_feed.channel_for(consultation.specialization), 'consultation.updated', {
+        'id': consultation.id, 'status': 'answered', 'previous_status': 'pending',
+        'doctor_id': current_user.id, 'previous_doctor_id': assigned_to
+    })
+    router.completed(current_user.id, current_user.specialization)
+    flash('Consultation answered successfully', 'success')
     return redirect(url_for('doctors.dashboard'))
 
 # -------------------------------
@@ -166,7 +258,14 @@ def update_appointment(appointment_id):
     
     appointment.status = status
     appointment.updated_at = datetime.utcnow()
+    # Cancelling frees the slot; re-confirming a cancelled one takes it back if it is still free
+    availability.assign_slot(appointment)
     
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('That time slot has been booked by another patient since', 'danger')
+        return redirect(url_for('doctors.dashboard'))
     flash(f'Appointment {status} successfully', 'success')
     return redirect(url_for('doctors.dashboard'))
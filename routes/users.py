@@ -1,9 +1,17 @@
-from flask import Blueprint, jsonify, render_template, request, send_file, redirect, url_for, flash
+from flask import Blueprint, Response, jsonify, render_template, request, send_file, redirect, url_for, flash, stream_with_context
 from flask_login import login_required, current_user
 from models import db, User, Question, Consultation, Appointment, ChatHistory, MedicalReport
-import io
-from reportlab.pdfgen import canvas
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from archive import archived_chat_history
+from pagination import keyset_page
+from doctor_directory import directory
+from chatbot_processor import load_fallback_engine
+import symptom_trends
+import availability
+import report_pdfs
+from consultation_router import router
 
 # ==============================
 # 🔹 prediction lib
@@ -20,6 +28,8 @@ from PCOS_Prediction.app import pcos_bp
 
 users = Blueprint("users", __name__)
 
+DASHBOARD_PAGE_SIZE = 20
+
 # ==============================
 # 🔹 User Dashboard
 # ==============================
@@ -30,24 +40,76 @@ def dashboard():
         flash('Access denied. Patient privileges required.', 'danger')
         return redirect(url_for('index'))
     
-    # Get user's questions
-    questions = Question.query.filter_by(
-        patient_id=current_user.id
-    ).order_by(Question.created_at.desc()).all()
-    
-    # Get user's appointments
-    appointments = Appointment.query.filter_by(
-        patient_id=current_user.id
-    ).order_by(Appointment.appointment_date.asc()).all()
+    try:
+        # User's questions, newest first, with the answering doctors' names in the same query
+        questions, next_questions = keyset_page(
+            Question.query.options(
+                joinedload(Question.doctor).load_only(User.username)
+            ).filter_by(patient_id=current_user.id),
+            Question.created_at, Question.id,
+            cursor=request.args.get('questions_before'), limit=DASHBOARD_PAGE_SIZE
+        )
+        
+        # User's appointments, earliest first
+        appointments, next_appointments = keyset_page(
+            Appointment.query.options(
+                joinedload(Appointment.doctor).load_only(User.username)
+            ).filter_by(patient_id=current_user.id),
+            Appointment.appointment_date, Appointment.id,
+            cursor=request.args.get('appointments_after'), limit=DASHBOARD_PAGE_SIZE, ascending=True
+        )
+    except ValueError:
+        flash('That page link is no longer valid.', 'warning')
+        return redirect(url_for('users.dashboard'))
     
-    # Get all doctors for appointment booking
-    doctors = User.query.filter_by(role='doctor').all()
+    # Doctors for appointment booking, grouped by specialization (cached, no users scan)
+    doctor_groups = directory.grouped()
     
     return render_template('patient_dashboard.html',
                          user=current_user,
                          questions=questions,
+                         next_questions=next_questions,
                          appointments=appointments,
-                         doctors=doctors)
+                         next_appointments=next_appointments,
+                         doctor_groups=doctor_groups)
+
+
+@users.route('/doctors')
+@login_required
+def doctor_directory():
+    """Doctors grouped by specialization; revalidate with If-None-Match"""
+    groups, etag = directory.snapshot()
+    response = jsonify({
+        'specializations': groups,
+        'count': sum(len(doctors) for doctors in groups.values())
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@users.route('/availability')
+@login_required
+def free_slots():
+    """Earliest free appointment slots of one doctor or of a specialization"""
+    doctor_id = request.args.get('doctor_id', type=int)
+    specialization = request.args.get('specialization')
+    limit = min(request.args.get('n', 10, type=int), DASHBOARD_PAGE_SIZE)
+    days = request.args.get('days', 30, type=int)
+
+    if (doctor_id is None) == (specialization is None):
+        return jsonify({'error': 'Pass either doctor_id or specialization'}), 400
+    try:
+        after = datetime.fromisoformat(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid after'}), 400
+    after = max(after, datetime.now()) if after else None
+
+    if doctor_id is not None:
+        slots = availability.free_slots_for_doctor(doctor_id, limit=max(limit, 1), after=after, days=days)
+    else:
+        slots = availability.free_slots_for_specialization(specialization, limit=max(limit, 1), after=after, days=days)
+    return jsonify({'slots': slots, 'slot_minutes': availability.calendar().slot_minutes})
 
 
 @users.route('/consult-doctor', methods=['GET'])
@@ -64,7 +126,8 @@ def chat_history():
     chats = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.created_at.desc()).all()
     return jsonify({
         'username': current_user.username,
-        'chat_history': [chat.to_dict() for chat in chats]
+        # Rows moved to cold storage are older than every live one
+        'chat_history': [chat.to_dict() for chat in chats] + archived_chat_history(current_user.id)
     })
 
 # ==============================
@@ -90,16 +153,25 @@ def download_report(report_id):
     if report.user_id != current_user.id:
         return jsonify({"error": "Unauthorized access"}), 403
 
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer)
-    p.drawString(100, 750, f"Report: {report.report_name}")
-    p.drawString(100, 730, f"Diagnosis: {report.diagnosis}")
-    p.drawString(100, 710, f"Doctor: {report.doctor_id if report.doctor_id else 'N/A'}")
-    p.showPage()
-    p.save()
-    buffer.seek(0)
+    # Rendered once per version by a background job; ETag / Last-Modified let browsers revalidate
+    path = report_pdfs.cache().pdf(report.to_dict())
+    return send_file(path, as_attachment=True, download_name=f"report_{report_id}.pdf",
+                     mimetype="application/pdf", conditional=True)
 
-    return send_file(buffer, as_attachment=True, download_name=f"report_{report_id}.pdf", mimetype="application/pdf")
+# ==============================
+# 🔹 Download All Medical Reports as ZIP
+# ==============================
+@users.route("/download-reports")
+@login_required
+def download_reports():
+    reports = [report.to_dict() for report in
+               MedicalReport.query.filter_by(user_id=current_user.id).order_by(MedicalReport.timestamp.asc())]
+    # Don't hold a read transaction open while the client downloads
+    db.session.rollback()
+
+    response = Response(stream_with_context(report_pdfs.zip_stream(reports)), mimetype="application/zip")
+    response.headers['Content-Disposition'] = f'attachment; filename="reports_{current_user.username}.zip"'
+    return response
 
 # ==============================
 # 🔹 Redirect to Old Project UI
@@ -141,10 +213,14 @@ def submit_consultation():
         user_id=current_user.id,
         problem_description=problem_description,
         specialization=doctor_specialization,
-        status='pending'  # Initial status
+        status='pending',  # Initial status
+        urgent='urgent' in request.form
     )
     db.session.add(new_consultation)
     db.session.commit()
+    
+    # Hand it to the least-loaded available doctor of the specialization
+    router.submit(new_consultation)
 
     return jsonify({'message': 'Consultation request submitted successfully!'})
 
@@ -174,8 +250,9 @@ def ask_question():
         answered=False
     )
     
-    # Save to database
+    # Save to database, with its symptoms counted in the same commit
     db.session.add(question)
+    symptom_trends.record_question(db.session, question, load_fallback_engine.get())
     db.session.commit()
     
     flash('Your question has been submitted successfully. A doctor will answer it soon.', 'success')
@@ -189,11 +266,13 @@ def book_consultation():
     new_consultation = Consultation(
         user_id=current_user.id,
         problem_description=data['problem_description'],
-        specialization=data['specialization']
+        specialization=data['specialization'],
+        urgent='urgent' in data
     )
     
     db.session.add(new_consultation)
     db.session.commit()
+    router.submit(new_consultation)
     
     return redirect(url_for('users.dashboard'))
 
@@ -220,31 +299,34 @@ def book_appointment():
         flash('Invalid date format', 'danger')
         return redirect(url_for('users.dashboard'))
     
+    grid = availability.calendar()
+    if not grid.is_bookable(appointment_date):
+        flash(f'Appointments start on {grid.slot_minutes}-minute slots within working hours '
+              f'({grid.opens:%H:%M}-{grid.closes:%H:%M})', 'danger')
+        return redirect(url_for('users.dashboard'))
+    
     # Check if doctor exists and is actually a doctor
     doctor = User.query.filter_by(id=doctor_id, role='doctor').first()
     if not doctor:
         flash('Invalid doctor selected', 'danger')
         return redirect(url_for('users.dashboard'))
     
-    # Check for conflicting appointments
-    existing_appointment = Appointment.query.filter_by(
-        doctor_id=doctor_id,
-        appointment_date=appointment_date,
-        status='confirmed'
-    ).first()
-    
-    if existing_appointment:
-        flash('This time slot is already booked', 'danger')
-        return redirect(url_for('users.dashboard'))
-    
     appointment = Appointment(
         patient_id=current_user.id,
-        doctor_id=doctor_id,
-        appointment_date=appointment_date
+        doctor_id=doctor.id,
+        appointment_date=appointment_date,
+        status='pending'
     )
+    availability.assign_slot(appointment)
     
+    # The unique (doctor_id, slot_key) index settles concurrent bookings of the same slot
     db.session.add(appointment)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('This time slot is already booked', 'danger')
+        return redirect(url_for('users.dashboard'))
     
     flash('Appointment booked successfully. Waiting for doctor confirmation.', 'success')
     return redirect(url_for('users.dashboard'))
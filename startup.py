@@ -0,0 +1,227 @@
+"""
+Startup resources for the AyushHealthBot app.
+
+Heavy objects (pickled ML models, NLP pipelines, the OpenAI key) are declared
+here as named resources instead of being loaded at import time. Each resource
+is loaded on first use, or ahead of time by the parallel warm-up phase that
+runs after the app is created. `/ready` only reports ready once warm-up is done.
+
+Nothing here ever touches the network: NLTK data is read from a vendored
+directory (see `flask provision-nltk`) and missing data only logs a warning.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import jsonify
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# Vendored / pre-provisioned NLTK data lives next to the app
+NLTK_DATA_DIR = os.environ.get('AYUSH_NLTK_DATA', os.path.join(BASE_DIR, 'nltk_data'))
+NLTK_PACKAGES = {
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+}
+
+_process_start = time.perf_counter()
+_registry = {}
+_ready = threading.Event()
+_warm_up_started = threading.Lock()
+_timings = {'app_created_ms': None, 'warm_up_ms': None}
+
+
+def serving():
+    """False in CLI commands (`flask db upgrade`, `flask archive-chats`, ...), which don't serve requests"""
+    cli = click.get_current_context(silent=True)
+    return cli is None or cli.info_name == 'run'
+
+
+class LazyResource:
+    """A named resource that is loaded once, on first use or during warm-up"""
+
+    def __init__(self, name, loader, warm=True):
+        self.name = name
+        self.loader = loader
+        self.warm = warm
+        self.load_ms = None
+        self.error = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        """Return the loaded value, loading it now if needed"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+        if self.error is not None:
+            raise self.error
+        return self._value
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self._value = self.loader()
+        except Exception as e:
+            self.error = e
+            print(f"Error loading resource '{self.name}': {e}")
+        self.load_ms = (time.perf_counter() - start) * 1000
+        self._loaded = True
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "loaded": self._loaded,
+            "load_ms": round(self.load_ms, 1) if self.load_ms is not None else None,
+            "error": str(self.error) if self.error else None
+        }
+
+
+def resource(name, loader=None, warm=True):
+    """
+    Declare a startup resource. Can be used directly or as a decorator:
+
+        model = resource('diabetes.model', lambda: pickle.load(...))
+
+        @resource('spacy.en')
+        def load_spacy(): ...
+    """
+    def register(fn):
+        res = LazyResource(name, fn, warm=warm)
+        _registry[name] = res
+        return res
+
+    if loader is not None:
+        return register(loader)
+    return register
+
+
+def get_resource(name):
+    return _registry[name]
+
+
+def warm_up(max_workers=None):
+    """Load every warm resource in parallel and mark the app as ready"""
+    start = time.perf_counter()
+    pending = [r for r in _registry.values() if r.warm and not r.loaded]
+    if pending:
+        workers = max_workers or min(8, len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warm-up') as pool:
+            # get() re-raises load errors; they are already recorded on the resource
+            list(pool.map(_load_quietly, pending))
+    _timings['warm_up_ms'] = (time.perf_counter() - start) * 1000
+    print(format_report())
+    _ready.set()
+
+
+def _load_quietly(res):
+    try:
+        res.get()
+    except Exception:
+        pass
+
+
+def start_warm_up(max_workers=None):
+    """Run warm_up() once in a daemon thread so the server can start listening"""
+    if not _warm_up_started.acquire(blocking=False):
+        return
+    thread = threading.Thread(target=warm_up, args=(max_workers,), name='startup-warm-up', daemon=True)
+    thread.start()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout=None):
+    return _ready.wait(timeout)
+
+
+def timing_report():
+    """Startup timings plus per-resource load times"""
+    return {
+        "ready": is_ready(),
+        "app_created_ms": _round(_timings['app_created_ms']),
+        "warm_up_ms": _round(_timings['warm_up_ms']),
+        "resources": [r.to_dict() for r in sorted(_registry.values(), key=lambda r: r.name)]
+    }
+
+
+def format_report():
+    report = timing_report()
+    lines = [f"Startup: app created in {report['app_created_ms']} ms, "
+             f"warm-up finished in {report['warm_up_ms']} ms"]
+    for r in report['resources']:
+        status = 'error: ' + r['error'] if r['error'] else ('ok' if r['loaded'] else 'not loaded')
+        lines.append(f"  {r['name']:<28} {str(r['load_ms']):>9} ms  {status}")
+    return "\n".join(lines)
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+# -------------------------------
+# 🔹 NLTK data (never downloaded at import)
+# -------------------------------
+def configure_nltk():
+    """Point NLTK at the vendored data directory and report missing packages"""
+    import nltk
+
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+    missing = []
+    for package, path in NLTK_PACKAGES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(package)
+
+    if missing:
+        print(f"WARNING: NLTK data missing ({', '.join(missing)}). "
+              f"Run `flask provision-nltk` to install it into {NLTK_DATA_DIR}")
+    return nltk
+
+
+nltk_data = resource('nltk.data', configure_nltk)
+
+
+# -------------------------------
+# 🔹 App integration
+# -------------------------------
+def init_app(app):
+    """Register readiness/report endpoints and CLI commands, then start warm-up"""
+    _timings['app_created_ms'] = (time.perf_counter() - _process_start) * 1000
+
+    @app.route('/ready')
+    def ready():
+        report = timing_report()
+        return jsonify(report), (200 if report['ready'] else 503)
+
+    @app.cli.command('startup-report')
+    def startup_report_command():
+        """Load all resources and print the startup timing report."""
+        start_warm_up()
+        wait_until_ready()
+
+    @app.cli.command('provision-nltk')
+    def provision_nltk_command():
+        """Download the NLTK data the chatbot needs into the vendored directory."""
+        import nltk
+
+        os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+        for package in NLTK_PACKAGES:
+            nltk.download(package, download_dir=NLTK_DATA_DIR)
+        click.echo(f"NLTK data installed in {NLTK_DATA_DIR}")
+
+    if serving() and app.config.get('STARTUP_WARM_UP', True):
+        start_warm_up(app.config.get('STARTUP_WARM_UP_WORKERS'))
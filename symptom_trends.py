@@ -0,0 +1,182 @@
+"""
+Daily symptom counts by language, age group and specialization.
+
+`symptom_daily_counts` holds one row per (dimension, bucket, symptom, day)
+and is kept current as events land, in the same transaction that saves them:
+chat messages add to the `language` dimension (from the chat.enrich job),
+/predict inputs to `age_group` and new questions to `specialization`.
+Dashboards and the trends API only ever read these rows.
+
+`flask rebuild-symptom-trends` recomputes the language and specialization
+rows from message_entities and questions. /predict inputs are not stored
+anywhere else, so the age_group rows are only ever built incrementally.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+
+import jobs
+from extensions import db
+from jobs import task
+from models import MessageEntity, Question, SymptomDailyCount
+
+DIMENSIONS = ('language', 'age_group', 'specialization')
+# Dimensions that can be recomputed from stored events
+REBUILDABLE = ('language', 'specialization')
+BUCKET_MAX_CHARS = 50
+
+
+def bucket_key(value, default='unknown'):
+    return ' '.join(str(value or '').lower().split())[:BUCKET_MAX_CHARS] or default
+
+
+def _upsert(session, counts):
+    """Add {(day, dimension, bucket, symptom): mentions} to the rollup"""
+    if not counts:
+        return
+    stmt = insert(SymptomDailyCount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['dimension', 'symptom', 'day', 'bucket'],
+        set_={'mentions': SymptomDailyCount.mentions + stmt.excluded.mentions}
+    )
+    session.execute(stmt, [
+        {'day': day, 'dimension': dimension, 'bucket': bucket, 'symptom': symptom, 'mentions': mentions}
+        for (day, dimension, bucket, symptom), mentions in counts.items()
+    ])
+
+
+def increment(session, dimension, bucket, symptoms, day=None):
+    """Stage one mention of each symptom on `session`; committed with the event that caused it"""
+    day = day or datetime.utcnow().date()
+    bucket = bucket_key(bucket)
+    _upsert(session, Counter((day, dimension, bucket, symptom) for symptom in set(symptoms) if symptom))
+
+
+# -------------------------------
+# 🔹 Event hooks
+# -------------------------------
+def record_chat(session, message, symptoms):
+    """Canonical symptoms newly extracted from a user message"""
+    increment(session, 'language', message.language or 'en', symptoms, message.created_at.date())
+
+
+def record_question(session, question, engine):
+    """Symptoms mentioned in a new question, counted under its specialization"""
+    symptoms = engine.match_symptoms(f"{question.title} {question.description}")
+    increment(session, 'specialization', question.specialization, symptoms,
+              (question.created_at or datetime.utcnow()).date())
+
+
+@task('trends.prediction')
+def record_prediction(age, symptoms):
+    """Symptoms a /predict request was made with, counted under its age group"""
+    from chatbot_processor import load_fallback_engine
+    engine = load_fallback_engine.get()
+    increment(db.session, 'age_group', age, [engine.canonical(s) for s in symptoms])
+    db.session.commit()
+
+
+def enqueue_prediction(age, symptoms):
+    jobs.enqueue('trends.prediction', age=age, symptoms=list(symptoms))
+
+
+# -------------------------------
+# 🔹 Reads
+# -------------------------------
+def top_symptoms(dimension, since, until=None, bucket=None, limit=10):
+    """Most mentioned symptoms in [since, until), optionally within one bucket"""
+    total = func.sum(SymptomDailyCount.mentions)
+    query = db.session.query(SymptomDailyCount.symptom, total.label('mentions')).filter(
+        SymptomDailyCount.dimension == dimension, SymptomDailyCount.day >= since
+    )
+    if until:
+        query = query.filter(SymptomDailyCount.day < until)
+    if bucket:
+        query = query.filter(SymptomDailyCount.bucket == bucket_key(bucket))
+    rows = query.group_by(SymptomDailyCount.symptom).order_by(total.desc()).limit(limit).all()
+    return [{'symptom': row.symptom, 'mentions': row.mentions} for row in rows]
+
+
+def series(dimension, symptom, since, until=None):
+    """Daily mentions of one symptom per bucket: {bucket: [{'day', 'mentions'}]}"""
+    query = db.session.query(SymptomDailyCount.day, SymptomDailyCount.bucket, SymptomDailyCount.mentions).filter(
+        SymptomDailyCount.dimension == dimension,
+        SymptomDailyCount.symptom == symptom,
+        SymptomDailyCount.day >= since
+    )
+    if until:
+        query = query.filter(SymptomDailyCount.day < until)
+
+    buckets = {}
+    for day, bucket, mentions in query.order_by(SymptomDailyCount.day.asc()):
+        buckets.setdefault(bucket, []).append({'day': day.isoformat(), 'mentions': mentions})
+    return buckets
+
+
+# -------------------------------
+# 🔹 Rebuild
+# -------------------------------
+def _rebuild_language(since):
+    day = func.date(MessageEntity.created_at)
+    language = func.coalesce(func.lower(MessageEntity.language), 'en')
+    source = select(
+        day, literal('language'), language, MessageEntity.value, func.count(MessageEntity.id)
+    ).where(MessageEntity.type == 'symptom')
+    if since:
+        source = source.where(MessageEntity.created_at >= datetime.combine(since, datetime.min.time()))
+    source = source.group_by(day, language, MessageEntity.value)
+
+    return db.session.execute(
+        insert(SymptomDailyCount).from_select(['day', 'dimension', 'bucket', 'symptom', 'mentions'], source)
+    ).rowcount
+
+
+def _rebuild_specialization(since, engine, batch_size=1000):
+    query = db.session.query(
+        Question.title, Question.description, Question.specialization, Question.created_at
+    ).order_by(Question.id.asc())
+    if since:
+        query = query.filter(Question.created_at >= datetime.combine(since, datetime.min.time()))
+
+    counts = Counter()
+    for title, description, specialization, created_at in query.yield_per(batch_size):
+        bucket = bucket_key(specialization)
+        for symptom in engine.match_symptoms(f"{title} {description}"):
+            counts[(created_at.date(), 'specialization', bucket, symptom)] += 1
+    _upsert(db.session, counts)
+    return len(counts)
+
+
+def rebuild(engine, since=None, dimensions=REBUILDABLE):
+    """Recompute the rollup rows of `dimensions` from `since` (a date; None for all); returns rows per dimension"""
+    written = {}
+    for dimension in dimensions:
+        cleared = delete(SymptomDailyCount).where(SymptomDailyCount.dimension == dimension)
+        if since:
+            cleared = cleared.where(SymptomDailyCount.day >= since)
+        # Delete and refill in one transaction, so readers never see a half-built dimension
+        db.session.execute(cleared.execution_options(synchronize_session=False))
+        if dimension == 'language':
+            written[dimension] = _rebuild_language(since)
+        else:
+            written[dimension] = _rebuild_specialization(since, engine)
+        db.session.commit()
+    return written
+
+
+def init_app(app):
+    @app.cli.command('rebuild-symptom-trends')
+    @click.option('--days', type=int, default=None, help='Only rebuild the last N days (default: everything).')
+    @click.option('--dimension', 'dimensions', multiple=True, type=click.Choice(REBUILDABLE),
+                  help='Dimension to rebuild (repeatable; default: all rebuildable ones).')
+    def rebuild_symptom_trends_command(days, dimensions):
+        """Recompute the daily symptom rollups from stored chat entities and questions."""
+        from chatbot_processor import load_fallback_engine
+        since = datetime.utcnow().date() - timedelta(days=days) if days else None
+        written = rebuild(load_fallback_engine.get(), since=since, dimensions=dimensions or REBUILDABLE)
+        for dimension, rows in written.items():
+            click.echo(f"{dimension}: {rows} row(s)")
+        click.echo("age_group rows are built from /predict requests as they arrive and were left as they are")
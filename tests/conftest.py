@@ -0,0 +1,53 @@
+"""
+The app under test runs against a throwaway database and side files, without
+warm-up or background threads.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix='ayush-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_tmp, 'database.db')}",
+    'JOB_QUEUE_PATH': os.path.join(_tmp, 'jobs.db'),
+    'QUESTION_FEED_PATH': os.path.join(_tmp, 'question_feed.db'),
+    'LLM_CACHE_PATH': os.path.join(_tmp, 'llm_cache.db'),
+    'MEDICAL_REPORT_DIR': os.path.join(_tmp, 'report_cache'),
+    'CHAT_ARCHIVE_DIR': os.path.join(_tmp, 'archive'),
+    'LLM_BASE_URL': 'http://127.0.0.1:9/v1',
+    'STARTUP_WARM_UP': '0',
+    'JOB_WORKERS': '0',
+    'QUESTION_FEED_RELAY_INTERVAL': '0',
+    'CONSULTATION_SWEEP_INTERVAL': '0',
+    'BCRYPT_LOG_ROUNDS': '4',
+})
+
+from app import app as flask_app  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def login(app):
+    """Test client with a Flask-Login session for a user id"""
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return client_for
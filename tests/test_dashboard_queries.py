@@ -0,0 +1,90 @@
+"""
+The doctor and patient dashboards load the names of the other side of every
+question and appointment with the rows themselves. The number of statements a
+dashboard issues must not grow with the number of rows (no N+1 lazy loads).
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import Appointment, Question, User
+
+# Statements one dashboard request may issue, whatever the data
+MAX_STATEMENTS = 15
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def add_user(name, role='patient'):
+    user = User(username=name, email=f'{name}@example.com', role=role,
+                specialization='general' if role == 'doctor' else None, password_hash='x')
+    db.session.add(user)
+    return user
+
+
+def seed(doctor, patient, count, batch):
+    """
+    `count` questions and appointments for each dashboard, every one with a
+    different patient or doctor, so a lazy load per row would show up
+    """
+    doctors = [add_user(f'dr{batch}_{i}', 'doctor') for i in range(count)]
+    patients = [add_user(f'pt{batch}_{i}') for i in range(count)]
+    db.session.flush()
+
+    start = datetime(2030, 1, 1) + timedelta(days=batch * 30)
+    for i in range(count):
+        answered = i % 3 == 2
+        db.session.add(Question(title=f'q{i}', description='d', specialization='general', urgent=i % 3 == 0,
+                                answered=answered, answer='a' if answered else None,
+                                answered_at=start if answered else None,
+                                patient_id=patients[i].id, doctor_id=doctors[i].id if answered else None))
+        db.session.add(Question(title=f'mine{i}', description='d', specialization='general', answered=True,
+                                answer='a', answered_at=start, patient_id=patient.id, doctor_id=doctors[i].id))
+        db.session.add(Appointment(appointment_date=start + timedelta(minutes=30 * i),
+                                   patient_id=patients[i].id, doctor_id=doctor.id))
+        db.session.add(Appointment(appointment_date=start + timedelta(minutes=30 * i),
+                                   patient_id=patient.id, doctor_id=doctors[i].id))
+    db.session.commit()
+
+
+def statements_for(client, url):
+    # The first request fills per-process caches (doctor directory, router heartbeat)
+    assert client.get(url).status_code == 200
+    with count_statements() as statements:
+        assert client.get(url).status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('role, url', [('doctor', '/doctors/dashboard'), ('patient', '/users/dashboard')])
+def test_dashboard_statements_do_not_grow_with_rows(app, login, role, url):
+    with app.app_context():
+        doctor, patient = add_user('Dr.Sharma', 'doctor'), add_user('Rahul')
+        db.session.commit()
+        user_id = doctor.id if role == 'doctor' else patient.id
+
+        seed(doctor, patient, 5, batch=0)
+        client = login(user_id)
+        few = statements_for(client, url)
+
+        # About 500 questions and 500 appointments across hundreds of patients and doctors
+        seed(doctor, patient, 250, batch=1)
+        many = statements_for(client, url)
+
+    assert many == few
+    assert many <= MAX_STATEMENTS
@@ -0,0 +1,99 @@
+"""
+Unit of work and per-request database timing.
+
+UnitOfWork stages every write of one request on its own session and commits
+them in a single transaction, with expire_on_commit turned off so staged
+objects stay readable afterwards without reloading. The session is not
+queried after staging, so nothing is flushed before commit() and no SQLite
+write lock is held while the request does slow work (like waiting for the LLM).
+
+SQLAlchemy cursor events add up the time and number of queries per app
+context; init_app() reports them in a Server-Timing header.
+"""
+import time
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from extensions import db
+
+
+def _record(elapsed_ms, queries=0):
+    if has_app_context():
+        g.db_ms = g.get('db_ms', 0.0) + elapsed_ms
+        g.db_queries = g.get('db_queries', 0) + queries
+
+
+# The start time lives on the statement's execution context, not the pooled
+# connection, so a statement that raises leaves nothing behind
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+def _finish(context):
+    started = getattr(context, 'query_started', None)
+    if started is not None:
+        del context.query_started
+        _record((time.perf_counter() - started) * 1000, queries=1)
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish(context)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # A failed statement (e.g. an IntegrityError on a double booking) still took database time
+    _finish(exception_context.execution_context)
+
+
+def db_timing():
+    """(milliseconds, queries) spent in the database so far in this app context"""
+    return round(g.get('db_ms', 0.0), 2), g.get('db_queries', 0)
+
+
+class UnitOfWork:
+    """
+    A private session for one request's writes, committed once. Being separate
+    from the request's scoped session, it also survives into streamed responses.
+    """
+
+    def __init__(self):
+        # Staged objects are still used after the commit (ids, content); don't expire them
+        self.session = db.session.session_factory(expire_on_commit=False)
+
+    def query(self, *entities):
+        return self.session.query(*entities)
+
+    def add(self, obj):
+        self.session.add(obj)
+        return obj
+
+    def commit(self):
+        # The flush's statements are timed by the cursor events
+        try:
+            self.session.commit()
+        finally:
+            self.session.close()
+
+    def rollback(self):
+        self.session.rollback()
+        self.session.close()
+
+    def close(self):
+        self.session.close()
+
+
+def init_app(app):
+    """Report per-request database time and query count as a Server-Timing header"""
+
+    @app.after_request
+    def add_server_timing(response):
+        if 'db_queries' in g or 'db_ms' in g:
+            ms, queries = db_timing()
+            response.headers.add('Server-Timing', f'db;dur={ms};desc="{queries} queries"')
+        return response